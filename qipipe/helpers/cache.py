@@ -0,0 +1,301 @@
+"""
+The qipipe on-disk result cache. Cached files are shared by
+successive pipeline runs and are organized by category under
+the cache directory, e.g.::
+
+    ~/.qipipe/cache/r1_0_lut/<key>.npy
+
+The cache directory is the :const:`CACHE_DIR_ENV_VAR` environment
+variable value, if it is set, otherwise :const:`DEF_CACHE_DIR`.
+Caching is disabled if that environment variable is set to the
+empty string or the cache directory cannot be written.
+
+The cache size is limited to the :const:`CACHE_SIZE_ENV_VAR`
+environment variable value in megabytes, if it is set, otherwise
+:const:`DEF_CACHE_SIZE`. When a store exceeds the limit, the least
+recently used cache entries are evicted, as described in
+:meth:`evict`. The cache can be cleared with :meth:`clear` or by
+removing the cache directory, e.g.::
+
+    rm -rf ~/.qipipe/cache
+"""
+import os
+import shutil
+import hashlib
+import tempfile
+from .logging import logger
+
+CACHE_DIR_ENV_VAR = 'QIPIPE_CACHE_DIR'
+"""The environment variable which overrides the cache directory."""
+
+DEF_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.qipipe', 'cache')
+"""The default cache directory."""
+
+CACHE_SIZE_ENV_VAR = 'QIPIPE_CACHE_SIZE'
+"""The environment variable which overrides the cache size in megabytes."""
+
+DEF_CACHE_SIZE = 10 << 30
+"""The default maximum cache size in bytes."""
+
+TMP_SUFFIXES = ('.tmp', '.old')
+"""The suffixes of the partial cache entries which are being written."""
+
+_input_checksums = {}
+"""The :meth:`input_checksum` {file stat key: checksum} memo."""
+
+
+def cache_dir(category):
+    """
+    :param category: the cache category, e.g. ``r1_0_lut``
+    :return: the category cache directory, or None if caching is
+        disabled or the directory cannot be created
+    """
+    root = _cache_root()
+    if not root:
+        return None
+    location = os.path.join(root, category)
+    if not os.path.exists(location):
+        try:
+            os.makedirs(location)
+        except OSError:
+            # Another process might have made the directory concurrently.
+            if not os.path.isdir(location):
+                logger(__name__).debug("The cache directory %s could not"
+                                       " be created." % location)
+                return None
+
+    return location
+
+
+def digest(*values):
+    """
+    :param values: the values which determine the key
+    :return: the SHA-1 hex digest of the value representations
+    """
+    sha = hashlib.sha1()
+    for value in values:
+        sha.update(repr(value).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+def file_signature(*locations):
+    """
+    Makes an inexpensive file identity signature from the file
+    real path, size and modification time. The file content is
+    not read.
+
+    :param locations: the file paths
+    :return: the signature digest
+    """
+    def stat_key(location):
+        real_path = os.path.realpath(location)
+        stat = os.stat(real_path)
+        return (real_path, stat.st_size, int(stat.st_mtime))
+
+    return digest(*[stat_key(location) for location in locations])
+
+
+def file_checksum(location, block_size=1 << 20):
+    """
+    :param location: the file path
+    :param block_size: the read block size in bytes
+    :return: the SHA-1 hex digest of the file content
+    """
+    sha = hashlib.sha1()
+    with open(location, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def input_checksum(location):
+    """
+    Returns the :meth:`file_checksum` of an input file. The checksum
+    is memoized within the process by the file real path, inode, size
+    and modification time, so that an unchanged input is read only
+    once when it contributes to several cache keys.
+
+    :param location: the file path
+    :return: the SHA-1 hex digest of the file content
+    """
+    real_path = os.path.realpath(location)
+    stat = os.stat(real_path)
+    memo_key = (real_path, stat.st_ino, stat.st_size, stat.st_mtime)
+    checksum = _input_checksums.get(memo_key)
+    if not checksum:
+        checksum = _input_checksums[memo_key] = file_checksum(real_path)
+
+    return checksum
+
+
+def lookup(category, key, suffix=''):
+    """
+    :param category: the cache category
+    :param key: the cache key
+    :param suffix: the cached file extension, e.g. ``.nii.gz``
+    :return: the cached file path, or None if there is no such
+        cached file
+    """
+    location = cache_dir(category)
+    if not location:
+        return None
+    cached = os.path.join(location, key + suffix)
+    if os.path.exists(cached):
+        touch(cached)
+        logger(__name__).debug("Found the cached %s file %s." %
+                               (category, cached))
+        return cached
+
+
+def store(in_file, category, key, suffix=''):
+    """
+    Copies the given file into the cache. The copy is atomic, i.e.
+    a concurrent :meth:`lookup` sees either no file or the complete
+    file. A cache write failure is logged and otherwise ignored.
+
+    :param in_file: the file to cache
+    :param category: the cache category
+    :param key: the cache key
+    :param suffix: the cached file extension, e.g. ``.nii.gz``
+    :return: the cached file path, or None if the file could not
+        be cached
+    """
+    location = cache_dir(category)
+    if not location:
+        return None
+    cached = os.path.join(location, key + suffix)
+    tmp_file = None
+    try:
+        fd, tmp_file = tempfile.mkstemp(dir=location, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(in_file, tmp_file)
+        os.rename(tmp_file, cached)
+    except (IOError, OSError) as e:
+        logger(__name__).debug("The %s file %s could not be cached: %s" %
+                               (category, in_file, e))
+        if tmp_file and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return None
+    logger(__name__).debug("Cached the %s file %s as %s." %
+                           (category, in_file, cached))
+    evict()
+
+    return cached
+
+
+def touch(location):
+    """
+    Marks the given cache entry as recently used, so that it is
+    evicted after the entries which were used less recently.
+
+    :param location: the cache entry file or directory path
+    """
+    try:
+        os.utime(location, None)
+    except OSError:
+        # The entry might have been evicted concurrently.
+        pass
+
+
+def evict(max_size=None):
+    """
+    Removes the least recently used cache entries until the cache
+    size does not exceed the given maximum. An entry is a cached
+    file or a cached directory, e.g. a
+    :mod:`qipipe.helpers.stage_cache` result. An entry is used
+    when it is stored or found.
+
+    :param max_size: the maximum cache size in bytes (default is
+        the :const:`CACHE_SIZE_ENV_VAR` setting or
+        :const:`DEF_CACHE_SIZE`)
+    :return: the number of evicted entries
+    """
+    root = _cache_root()
+    if not root or not os.path.isdir(root):
+        return 0
+    if max_size is None:
+        max_size = _max_cache_size()
+    # The (modification time, size, path) entries.
+    entries = []
+    for category in os.listdir(root):
+        cat_dir = os.path.join(root, category)
+        if not os.path.isdir(cat_dir):
+            continue
+        for name in os.listdir(cat_dir):
+            if name.endswith(TMP_SUFFIXES):
+                continue
+            location = os.path.join(cat_dir, name)
+            try:
+                mtime = os.path.getmtime(location)
+                size = _disk_size(location)
+            except OSError:
+                # The entry was evicted concurrently.
+                continue
+            entries.append((mtime, size, location))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, location in sorted(entries):
+        if total <= max_size:
+            break
+        if os.path.isdir(location):
+            shutil.rmtree(location, True)
+        elif os.path.exists(location):
+            os.remove(location)
+        total -= size
+        evicted += 1
+    if evicted:
+        logger(__name__).debug("Evicted %d least recently used cache"
+                               " entries from %s." % (evicted, root))
+
+    return evicted
+
+
+def clear(category=None):
+    """
+    Removes the cached entries.
+
+    :param category: the cache category to clear (default all
+        categories)
+    """
+    root = _cache_root()
+    if not root:
+        return
+    location = os.path.join(root, category) if category else root
+    shutil.rmtree(location, True)
+    logger(__name__).debug("Cleared the cache %s." % location)
+
+
+def _cache_root():
+    """
+    :return: the cache directory, or the empty string if caching
+        is disabled
+    """
+    return os.environ.get(CACHE_DIR_ENV_VAR, DEF_CACHE_DIR)
+
+
+def _max_cache_size():
+    """
+    :return: the maximum cache size in bytes
+    """
+    size_mb = os.environ.get(CACHE_SIZE_ENV_VAR)
+    if not size_mb:
+        return DEF_CACHE_SIZE
+
+    return int(float(size_mb) * (1 << 20))
+
+
+def _disk_size(location):
+    """
+    :param location: the cache entry file or directory path
+    :return: the total size in bytes of the entry files
+    """
+    if not os.path.isdir(location):
+        return os.path.getsize(location)
+    size = 0
+    for parent, _, files in os.walk(location):
+        for name in files:
+            size += os.path.getsize(os.path.join(parent, name))
+
+    return size
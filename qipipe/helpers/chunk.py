@@ -0,0 +1,99 @@
+"""
+Voxel chunking utilities. A modeling fit can be split into
+independent chunks of the masked voxels and the chunk results
+then stitched back into full-size parameter maps.
+"""
+import numpy as np
+import nibabel as nib
+from .header import load_header
+from .logging import logger
+
+
+def chunk_mask(in_mask, chunk, chunks):
+    """
+    Partitions the masked voxels into *chunks* spatially contiguous
+    chunks of nearly equal voxel count. The voxels are ordered by
+    slice, then row, then column, so that each chunk is a slab of
+    consecutive slices.
+
+    :param in_mask: the 3D boolean mask array
+    :param chunk: the zero-based chunk index
+    :param chunks: the number of chunks
+    :return: the 3D boolean array of the chunk voxels
+    """
+    if chunk < 0 or chunk >= chunks:
+        raise ValueError("The chunk index %d is not in the range [0, %d)" %
+                         (chunk, chunks))
+    # The masked voxel (z, y, x) coordinates in slice order.
+    z, y, x = np.nonzero(in_mask.T)
+    bounds = np.linspace(0, len(z), chunks + 1).astype(int)
+    start, end = bounds[chunk], bounds[chunk + 1]
+    out_mask = np.zeros(in_mask.shape, dtype=bool)
+    out_mask[x[start:end], y[start:end], z[start:end]] = True
+
+    return out_mask
+
+
+def make_chunk_mask(time_series, chunk, chunks, out_file, mask=None):
+    """
+    Makes the mask file for the given chunk of the masked time
+    series voxels, as described in :meth:`chunk_mask`. Only the
+    time series header is read.
+
+    :param time_series: the 4D NIfTI time series file path
+    :param chunk: the zero-based chunk index
+    :param chunks: the number of chunks
+    :param out_file: the output chunk mask file path
+    :param mask: the optional 3D NIfTI mask file path (default
+        is all voxels)
+    :return: the chunk mask file path
+    """
+    if mask:
+        mask_img = nib.load(mask)
+        in_mask = np.asanyarray(mask_img.dataobj) != 0
+        affine = mask_img.affine
+    else:
+        hdr = load_header(time_series)
+        in_mask = np.ones(hdr.get_data_shape()[:3], dtype=bool)
+        affine = hdr.get_best_affine()
+    out_mask = chunk_mask(in_mask, chunk, chunks).astype(np.uint8)
+    nib.save(nib.Nifti1Image(out_mask, affine), out_file)
+    logger(__name__).debug("Saved the %s chunk %d of %d mask with %d voxels"
+                           " as %s." % (time_series, chunk + 1, chunks,
+                                        np.count_nonzero(out_mask), out_file))
+
+    return out_file
+
+
+def stitch_chunks(in_files, masks, out_file):
+    """
+    Combines the chunk parameter maps into one map. Each output
+    voxel in a chunk mask is set to the corresponding chunk map
+    value. The other voxels are zero.
+
+    :param in_files: the chunk parameter map file paths
+    :param masks: the corresponding chunk mask file paths
+    :param out_file: the output map file path
+    :return: the output map file path
+    """
+    if len(in_files) != len(masks):
+        raise ValueError("The chunk map count %d differs from the chunk mask"
+                         " count %d" % (len(in_files), len(masks)))
+    data = None
+    for in_file, mask in zip(in_files, masks):
+        img = nib.load(in_file)
+        chunk_data = np.asanyarray(img.dataobj)
+        if data is None:
+            ref = img
+            data = np.zeros(chunk_data.shape, dtype=chunk_data.dtype)
+        in_mask = np.asanyarray(nib.load(mask).dataobj) != 0
+        data[in_mask] = chunk_data[in_mask]
+    hdr = ref.header.copy()
+    hdr.set_data_dtype(data.dtype)
+    # The chunk data is already scaled.
+    hdr.set_slope_inter(None, None)
+    nib.save(nib.Nifti1Image(data, ref.affine, hdr), out_file)
+    logger(__name__).debug("Stitched %d chunk maps into %s." %
+                           (len(in_files), out_file))
+
+    return out_file
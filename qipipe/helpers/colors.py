@@ -1,10 +1,13 @@
 import os
 import re
-from matplotlib import (pyplot, colors, cm)
+import multiprocessing
 import nibabel as nib
 from qiutil.file import splitexts
 from . import image
 
+DEF_WRITERS = 2
+"""The default maximum number of concurrent parallel colorize writes."""
+
 
 def create_lookup_table(ncolors, colormap='jet', out_file=None):
     """
@@ -23,6 +26,9 @@ def create_lookup_table(ncolors, colormap='jet', out_file=None):
     else:
         out_file = colormap + '_colors.txt'
 
+    # matplotlib is only loaded when a lookup table is generated.
+    from matplotlib import (pyplot, colors, cm)
+
     # The LUT reference values.
     values = range(ncolors)
     # The color map.
@@ -73,6 +79,11 @@ def colorize(lut_file, *inputs, **opts):
         (default current working directory)
     :option threshold: the threshold in the range 0 to nvalues
         (default 0)
+    :option jobs: the number of worker processes which read and
+        transform the inputs in parallel (default 1, i.e. serial)
+    :option writers: the maximum number of concurrent output file
+        writes when *jobs* is greater than one (default
+        :const:`DEF_WRITERS`)
     """
     dest = opts.pop('dest', None)
     if dest:
@@ -80,10 +91,16 @@ def colorize(lut_file, *inputs, **opts):
             os.makedirs(dest)
     else:
         dest = os.getcwd()
+    jobs = opts.pop('jobs', None) or 1
+    writers = opts.pop('writers', None) or DEF_WRITERS
+    # The LUT is parsed once and shared by every input.
     opts.update(_infer_range_parameters(lut_file))
     opts['normalizer'] = _normalize
-    for in_file in inputs:
-        _colorize(in_file, dest, **opts)
+    if jobs > 1 and len(inputs) > 1:
+        _colorize_parallel(inputs, dest, jobs, writers, **opts)
+    else:
+        for in_file in inputs:
+            _colorize(in_file, dest, **opts)
 
 
 def label_map_basename(location):
@@ -115,6 +132,64 @@ def _colorize(in_file, dest, **opts):
     image.discretize(in_file, out_file, **opts)
 
 
+def _colorize_parallel(inputs, dest, jobs, writers, **opts):
+    """
+    Distributes the inputs over a pool of *jobs* worker processes.
+    Each worker reads and transforms its input independently, but
+    at most *writers* workers save an output file at the same time.
+
+    :param inputs: the image files to transform
+    :param dest: the destination directory
+    :param jobs: the number of worker processes
+    :param writers: the maximum number of concurrent writes
+    :param opts: the :meth:`qipipe.helpers.image.discretize_image`
+        options
+    :return: the output file paths
+    """
+    write_slots = multiprocessing.BoundedSemaphore(writers)
+    pool = multiprocessing.Pool(processes=min(jobs, len(inputs)),
+                                initializer=_init_colorize_worker,
+                                initargs=(dest, write_slots, opts))
+    try:
+        out_files = pool.map(_colorize_worker, inputs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return out_files
+
+
+_worker_context = {}
+"""The per-process colorize worker {dest, write_slots, opts} context."""
+
+
+def _init_colorize_worker(dest, write_slots, opts):
+    """Sets the colorize worker process context."""
+    _worker_context.update(dest=dest, write_slots=write_slots, opts=opts)
+
+
+def _colorize_worker(in_file):
+    """
+    Colorizes the given input in a worker process.
+
+    :param in_file: the image file to transform
+    :return: the output file path
+    """
+    dest = _worker_context['dest']
+    write_slots = _worker_context['write_slots']
+    opts = _worker_context['opts']
+    # The output file location.
+    out_file = os.path.join(dest, label_map_basename(in_file))
+    # Read and transform in parallel with the other workers.
+    in_img = nib.load(in_file)
+    out_img = image.discretize_image(in_img, **opts)
+    # Throttle the writes.
+    with write_slots:
+        image.save_image(out_img, out_file)
+
+    return out_file
+
+
 def _infer_range_parameters(lut_file):
     with open(lut_file) as f:
         content = f.readlines()
@@ -0,0 +1,158 @@
+"""
+Mask-compacted image utilities. A compacted image holds only the
+voxels within a mask as a ``(voxel, time)`` array in a NumPy ``.npy``
+file, which can be memory-mapped. The voxel index is stored in a
+companion ``_index.npy`` file as the flat voxel offsets in NIfTI
+on-disk order, i.e. with the first axis varying fastest.
+
+A compacted image is expanded back to a full-size NIfTI image with
+a reference image header, which supplies the image shape, affine
+and meta-data.
+"""
+import os
+import numpy as np
+import nibabel as nib
+from nibabel.openers import Opener
+from .header import load_header
+from .logging import logger
+
+INDEX_SUFFIX = '_index.npy'
+"""The voxel index companion file name suffix."""
+
+
+def index_location(location):
+    """
+    :param location: the compacted image ``.npy`` file path
+    :return: the voxel index file path
+    """
+    base, _ = os.path.splitext(location)
+
+    return base + INDEX_SUFFIX
+
+
+def load(location, mmap_mode='r'):
+    """
+    :param location: the compacted image ``.npy`` file path
+    :param mmap_mode: the ``numpy.load`` memory-map mode
+    :return: the (data, index) tuple
+    """
+    data = np.load(location, mmap_mode=mmap_mode)
+    index = np.load(index_location(location))
+
+    return data, index
+
+
+def save(data, index, location):
+    """
+    :param data: the ``(voxel, ...)`` compacted data array
+    :param index: the flat voxel index array
+    :param location: the target ``.npy`` file path
+    :return: the target file path
+    """
+    np.save(location, data)
+    np.save(index_location(location), index)
+
+    return location
+
+
+def mask_index(mask):
+    """
+    :param mask: the 3D NIfTI mask file path
+    :return: the flat on-disk offsets of the nonzero mask voxels
+    """
+    data = np.asanyarray(nib.load(mask).dataobj)
+
+    return np.flatnonzero(data.ravel(order='F'))
+
+
+def compact(in_file, out_file, mask=None, dtype=np.float32):
+    """
+    Compacts the given NIfTI image. The image is read sequentially one
+    volume at a time, so that memory use is proportional to a volume
+    and the masked voxel count rather than the full 4D image. The
+    result is written directly to a memory-mapped ``.npy`` file.
+
+    :param in_file: the 3D or 4D NIfTI image file path
+    :param out_file: the target ``.npy`` file path
+    :param mask: the optional 3D NIfTI mask file path (default is
+        all voxels)
+    :param dtype: the compacted data type
+    :return: the target file path
+    """
+    hdr = load_header(in_file)
+    shape = hdr.get_data_shape()
+    vol_size = int(np.prod(shape[:3]))
+    vol_cnt = int(np.prod(shape[3:]))
+    if mask:
+        index = mask_index(mask)
+    else:
+        index = np.arange(vol_size)
+    data = np.lib.format.open_memmap(out_file, mode='w+', dtype=dtype,
+                                     shape=(len(index), vol_cnt))
+    in_dtype = hdr.get_data_dtype()
+    slope, inter = hdr.get_slope_inter()
+    vol_bytes = vol_size * in_dtype.itemsize
+    with Opener(in_file, 'rb') as f:
+        f.seek(int(hdr['vox_offset']))
+        for t in range(vol_cnt):
+            vol = np.frombuffer(f.read(vol_bytes), dtype=in_dtype)
+            values = vol[index].astype(dtype)
+            if slope is not None:
+                values *= slope
+            if inter:
+                values += inter
+            data[:, t] = values
+    data.flush()
+    np.save(index_location(out_file), index)
+    logger(__name__).debug("Compacted the %s %d of %d voxels into %s." %
+                           (in_file, len(index), vol_size, out_file))
+
+    return out_file
+
+
+def expand(data, index, reference, out_file):
+    """
+    Writes the compacted data as a full-size NIfTI image. The voxels
+    outside of the index are zero.
+
+    :param data: the ``(voxel,)`` or ``(voxel, time)`` data array
+    :param index: the flat voxel index array
+    :param reference: the reference NIfTI image file path whose
+        header supplies the output shape and affine. If the output has
+        the same dimensions as the reference, then the reference
+        header extensions are retained as well.
+    :param out_file: the target NIfTI file path
+    :return: the target file path
+    """
+    hdr = load_header(reference)
+    ref_shape = hdr.get_data_shape()
+    shape = ref_shape[:3] + data.shape[1:]
+    full = np.zeros((int(np.prod(ref_shape[:3])),) + data.shape[1:],
+                    dtype=data.dtype)
+    full[index] = data
+    full = full.reshape(shape, order='F')
+    out_hdr = hdr.copy()
+    if len(shape) != len(ref_shape):
+        # The reference meta-data does not apply.
+        del out_hdr.extensions[:]
+    out_hdr.set_data_shape(shape)
+    out_hdr.set_data_dtype(full.dtype)
+    out_hdr.set_slope_inter(None, None)
+    nib.save(nib.Nifti1Image(full, hdr.get_best_affine(), out_hdr), out_file)
+
+    return out_file
+
+
+def expand_file(location, reference, out_file):
+    """
+    Expands the given compacted image file, as described in
+    :meth:`expand`.
+
+    :param location: the compacted image ``.npy`` file path
+    :param reference: the reference NIfTI image file path
+    :param out_file: the target NIfTI file path
+    :return: the target file path
+    """
+    data, index = load(location)
+
+    return expand(data, index, reference, out_file)
@@ -0,0 +1,61 @@
+"""
+Mask bounding box cropping utilities. A cropped image retains the
+physical space of the source image, i.e. the cropped image affine maps
+each cropped voxel to the same scanner coordinate as the corresponding
+source voxel. A registration transform computed on cropped images
+therefore applies to the full images.
+"""
+import numpy as np
+import nibabel as nib
+from .logging import logger
+
+DEF_MARGIN = 10
+"""The default number of voxels which pad each side of the box."""
+
+
+def bounding_box(mask, margin=DEF_MARGIN):
+    """
+    :param mask: the 3D NIfTI mask file path
+    :param margin: the number of voxels which pad each side of the
+        box (default :const:`DEF_MARGIN`)
+    :return: the ``[(start, stop), ...]`` voxel bounds for each axis,
+        clipped to the image extent
+    :raise ValueError: if the mask has no nonzero voxel
+    """
+    data = np.asanyarray(nib.load(mask).dataobj)
+    nonzero = np.nonzero(data)
+    if not len(nonzero[0]):
+        raise ValueError("The mask %s is empty" % mask)
+
+    return [(max(int(ndx.min()) - margin, 0),
+             min(int(ndx.max()) + margin + 1, size))
+            for ndx, size in zip(nonzero, data.shape)]
+
+
+def crop(in_file, bounds, out_file):
+    """
+    Crops the given image to the given bounds. Only the cropped
+    region is read. The image axes beyond the bounds, e.g. the time
+    axis, are retained in full. The source header extensions are
+    not retained, since they describe the full image.
+
+    :param in_file: the 3D or 4D NIfTI image file path
+    :param bounds: the :meth:`bounding_box` voxel bounds
+    :param out_file: the target NIfTI file path
+    :return: the target file path
+    """
+    img = nib.load(in_file)
+    data = img.dataobj[tuple(slice(*b) for b in bounds)]
+    # The cropped origin is the scanner coordinate of the box corner.
+    offset = [start for start, _ in bounds]
+    affine = img.affine.copy()
+    affine[:3, 3] = img.affine[:3, :3].dot(offset) + img.affine[:3, 3]
+    hdr = img.header.copy()
+    del hdr.extensions[:]
+    hdr.set_data_dtype(data.dtype)
+    hdr.set_slope_inter(None, None)
+    nib.save(nib.Nifti1Image(data, affine, hdr), out_file)
+    logger(__name__).debug("Cropped %s to the %s voxel bounds as %s." %
+                           (in_file, bounds, out_file))
+
+    return out_file
@@ -0,0 +1,145 @@
+"""
+NIfTI header-only utilities. These functions read the NIfTI
+header and the dcmstack_ DcmMeta header extension without
+reading the image data.
+
+.. _dcmstack: https://github.com/moloney/dcmstack
+"""
+import os
+import shutil
+import tempfile
+from nibabel.nifti1 import Nifti1Header
+from nibabel.openers import Opener
+# Importing dcmmeta registers the DcmMeta NIfTI header extension
+# class with nibabel.
+from dcmstack.dcmmeta import NiftiWrapper
+
+COPY_BLOCK_SIZE = 1 << 20
+"""The :meth:`copy_meta` data block streaming buffer size in bytes."""
+
+
+class HeaderImage(object):
+    """
+    A header-only NIfTI image stand-in which supports the
+    dcmstack ``NiftiWrapper`` meta-data accessors. Accessing
+    the image data is not supported.
+    """
+
+    def __init__(self, header):
+        """
+        :param header: the nibabel NIfTI header
+        """
+        self._header = header
+
+    @property
+    def header(self):
+        return self._header
+
+    def get_header(self):
+        return self._header
+
+    @property
+    def shape(self):
+        return self._header.get_data_shape()
+
+    def get_shape(self):
+        return self.shape
+
+    @property
+    def affine(self):
+        return self._header.get_best_affine()
+
+    def get_affine(self):
+        return self.affine
+
+
+def load_header(location):
+    """
+    Reads the NIfTI header and header extensions from the given
+    single-file NIfTI image. A compressed file is decompressed only
+    as far as the end of the header extensions.
+
+    :param location: the ``.nii`` or ``.nii.gz`` file path
+    :return: the nibabel NIfTI header
+    """
+    with Opener(location, 'rb') as f:
+        return Nifti1Header.from_fileobj(f)
+
+
+def wrap_header(location, make_empty=False):
+    """
+    :param location: the ``.nii`` or ``.nii.gz`` file path
+    :param make_empty: flag indicating whether to add an empty
+        DcmMeta extension if the header does not have one
+    :return: the dcmstack ``NiftiWrapper`` on the image header
+    """
+    return NiftiWrapper(HeaderImage(load_header(location)),
+                        make_empty=make_empty)
+
+
+def copy_meta(src_file, dest_file, out_file, include_classes=None,
+              exclude_classes=None):
+    """
+    Copies the DcmMeta meta-data from the source image to a copy of
+    the destination image. The meta-data merge is the same as the
+    dcmstack ``CopyMeta`` Nipype interface merge. However, unlike
+    ``CopyMeta``, neither image data array is loaded. The output
+    file consists of the updated destination header followed by the
+    destination image data block, which is streamed unchanged.
+    Memory use is therefore independent of the image size.
+
+    :param src_file: the meta-data source NIfTI file path
+    :param dest_file: the meta-data destination NIfTI file path
+    :param out_file: the output NIfTI file path, which can differ
+        from the destination in compression
+    :param include_classes: the meta-data (dimension, class) tuples
+        to include (default all)
+    :param exclude_classes: the meta-data (dimension, class) tuples
+        to exclude (default none)
+    :return: the output file path
+    """
+    src = wrap_header(src_file, make_empty=True)
+    dest = wrap_header(dest_file, make_empty=True)
+    # Merge the meta-data classes as CopyMeta does.
+    classes = src.meta_ext.get_valid_classes()
+    if include_classes:
+        classes = [cls for cls in classes if cls in include_classes]
+    if exclude_classes:
+        classes = [cls for cls in classes if cls not in exclude_classes]
+    for cls in classes:
+        src_dict = src.meta_ext.get_class_dict(cls)
+        dest_dict = dest.meta_ext.get_class_dict(cls)
+        dest_dict.update(src_dict)
+    dest.meta_ext.slice_dim = src.meta_ext.slice_dim
+    dest.meta_ext.shape = src.meta_ext.shape
+
+    # The destination data block offset before the extension update.
+    dest_hdr = dest.nii_img.header
+    data_offset = int(dest_hdr['vox_offset'])
+    # Let nibabel place the data block after the updated extensions.
+    dest_hdr['vox_offset'] = 0
+    # Updating the destination in place writes to a temporary file
+    # which then replaces the destination.
+    in_place = (os.path.exists(out_file) and
+                os.path.samefile(dest_file, out_file))
+    if in_place:
+        out_dir, out_base = os.path.split(out_file)
+        # Preserve the file extension, which determines the compression.
+        fd, write_file = tempfile.mkstemp(dir=out_dir, prefix='.',
+                                          suffix='_' + out_base)
+        os.close(fd)
+    else:
+        write_file = out_file
+    with Opener(dest_file, 'rb') as src_f:
+        src_f.seek(data_offset)
+        with Opener(write_file, 'wb') as out_f:
+            dest_hdr.write_to(out_f)
+            # Pad to the new data block offset, if necessary.
+            pad = int(dest_hdr['vox_offset']) - out_f.tell()
+            if pad > 0:
+                out_f.write(b'\x00' * pad)
+            shutil.copyfileobj(src_f, out_f, COPY_BLOCK_SIZE)
+    if in_place:
+        os.rename(write_file, out_file)
+
+    return out_file
@@ -52,9 +52,32 @@ def discretize(in_file, out_file, nvalues, start=0, threshold=None,
       value (default :meth:`normalize`)
     :raise IndexError: if the threshold is not in the color range
     """
-    # If there is an output file argument, then ensure that there is an
-    # output parent directory. Otherwise, use the default output file.
+    # Load the NIfTI image.
+    in_img = nib.load(in_file)
+    logger(__name__).debug("Loaded %s." % in_file)
+    # Transform the image.
+    out_img = discretize_image(in_img, nvalues, start=start,
+                               threshold=threshold, normalizer=normalizer)
+    # Save the result.
+    save_image(out_img, out_file)
+
 
+def discretize_image(in_img, nvalues, start=0, threshold=None,
+                     normalizer=normalize):
+    """
+    Transforms the given input image to an integer range as described
+    in :meth:`discretize`. The input image is not modified.
+
+    :param in_img: the input nibabel image object
+    :param nvalues: the number of output entries
+    :param start: the starting output value (default 0)
+    :param threshold: the threshold in the range start to nvalues
+      (default start)
+    :param normalize: an optional function to normalize the input
+      value (default :meth:`normalize`)
+    :return: the discretized nibabel image object
+    :raise IndexError: if the threshold is not in the color range
+    """
     # The logger.
     log = logger(__name__)
 
@@ -70,9 +93,6 @@ def discretize(in_file, out_file, nvalues, start=0, threshold=None,
     log.debug("Color LUT start: %d end: %d threshold: %d" %
               (start, start + nvalues - 1, threshold))
 
-    # Load the NIfTI image.
-    in_img = nib.load(in_file)
-    log.debug("Loaded %s." % in_file)
     # The image data 3D array.
     in_data = in_img.get_data()
 
@@ -129,8 +149,18 @@ def discretize(in_file, out_file, nvalues, start=0, threshold=None,
               (value_cnt, start, start + nvalues - 1))
     log.debug("Mapped value decile count: %s." % decile_cnts)
 
-    log.debug("Saving the output as %s..." % out_file)
-    hdr = in_img.get_header()
+    hdr = in_img.get_header().copy()
     hdr.set_data_dtype(np.int16)
-    out_img = nib.Nifti1Image(out_data, in_img.get_affine(), hdr)
-    out_img.to_filename(out_file)
+
+    return nib.Nifti1Image(out_data, in_img.get_affine(), hdr)
+
+
+def save_image(img, out_file):
+    """
+    Saves the given image.
+
+    :param img: the nibabel image object
+    :param out_file: the output file path
+    """
+    logger(__name__).debug("Saving the output as %s..." % out_file)
+    img.to_filename(out_file)
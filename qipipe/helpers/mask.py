@@ -0,0 +1,152 @@
+"""In-process mask creation utilities."""
+import numpy as np
+import nibabel as nib
+from scipy import ndimage
+from .logging import logger
+
+
+def create_mask(time_series, out_file, crop_posterior=False, min_thresh=0.0,
+                max_thresh=None, min_size=None, min_voxels=None):
+    """
+    Creates a mask which excludes the large clusters of low-intensity
+    voxels in the given time series. This function is the in-process
+    equivalent of the :class:`qipipe.pipeline.mask.MaskWorkflow`
+    ``fsl`` node chain:
+
+    1. If *crop_posterior* is set, then take the time series mean
+       image and zero every voxel posterior to the mean image
+       intensity-weighted center of gravity. Otherwise, take the
+       first volume, which is the ``mri_volcluster`` default frame.
+
+    2. Label the connected clusters of voxels with intensity in the
+       inclusive range [*min_thresh*, *max_thresh*].
+
+    3. Discard the clusters which are smaller than *min_voxels* or
+       *min_size*.
+
+    4. The mask is the complement of the remaining clusters.
+
+    The time series is read once. If the file is uncompressed, then
+    the image data is memory-mapped rather than loaded. Only the
+    final mask is written.
+
+    :param time_series: the input 4D NIfTI time series file path
+    :param out_file: the output mask file path
+    :param crop_posterior: flag indicating whether to crop the image
+        posterior to the center of gravity, e.g. for a breast tumor
+    :param min_thresh: the cluster minimum intensity (default 0)
+    :param max_thresh: the cluster maximum intensity (default no
+        maximum)
+    :param min_size: the minimum cluster size in mm\ :sup:`3`
+    :param min_voxels: the minimum number of voxels in a cluster
+    :return: the mask file path
+    """
+    _logger = logger(__name__)
+    img = nib.load(time_series)
+    # The image data. An uncompressed file is memory-mapped.
+    data = np.asanyarray(img.dataobj)
+    if data.ndim == 4:
+        if crop_posterior:
+            base = data.mean(axis=-1, dtype=np.float64)
+        else:
+            base = np.asarray(data[..., 0], dtype=np.float64)
+    else:
+        base = np.asarray(data, dtype=np.float64)
+    _logger.debug("Loaded the %s time series base image with shape %s." %
+                  (time_series, base.shape))
+
+    # Zero everything posterior to the center of gravity.
+    if crop_posterior:
+        cog = center_of_gravity(base)
+        # fslmaths -roi truncates the center of gravity to a voxel index.
+        y_start = int(cog[1])
+        base[:, :y_start, ...] = 0
+        _logger.debug("Cropped the %s mean image posterior to the center"
+                      " of gravity %s." % (time_series, cog))
+
+    # The candidate cluster voxels.
+    in_range = base >= min_thresh
+    if max_thresh is not None:
+        in_range &= base <= max_thresh
+    labels, label_cnt = ndimage.label(in_range)
+    # The voxel count of each label, including the zero background label.
+    counts = np.bincount(labels.ravel(), minlength=label_cnt + 1)
+    # The minimum cluster voxel count.
+    min_cnt = min_voxels or 0
+    if min_size:
+        voxel_size = np.prod(img.header.get_zooms()[:3])
+        min_cnt = max(min_cnt, int(np.ceil(min_size / voxel_size)))
+    keep = counts >= min_cnt
+    # The zero label is not a cluster.
+    keep[0] = False
+    _logger.debug("Found %d of %d %s clusters with at least %d voxels." %
+                  (np.count_nonzero(keep), label_cnt, time_series, min_cnt))
+
+    # The mask is the complement of the retained clusters.
+    mask = np.logical_not(keep[labels]).astype(np.uint8)
+    hdr = img.header.copy()
+    hdr.set_data_shape(mask.shape)
+    hdr.set_data_dtype(np.uint8)
+    mask_img = nib.Nifti1Image(mask, img.affine, hdr)
+    nib.save(mask_img, out_file)
+    _logger.debug("Saved the %s mask as %s." % (time_series, out_file))
+
+    return out_file
+
+
+def center_of_gravity(data):
+    """
+    Returns the intensity-weighted center of gravity voxel
+    coordinates, as calculated by ``fslstats -C``.
+
+    :param data: the 3D image data array
+    :return: the (x, y, z) center of gravity tuple
+    """
+    total = data.sum(dtype=np.float64)
+    if not total:
+        return tuple((n - 1) / 2.0 for n in data.shape)
+    cog = []
+    for axis, size in enumerate(data.shape):
+        # The marginal intensity along this axis.
+        other_axes = tuple(i for i in range(data.ndim) if i != axis)
+        marginal = data.sum(axis=other_axes, dtype=np.float64)
+        cog.append(np.dot(np.arange(size), marginal) / total)
+
+    return tuple(cog)
+
+
+def roi_mask(in_files, out_file, margin=0):
+    """
+    Creates a mask from the union of the given ROI masks, optionally
+    dilated by *margin* voxels.
+
+    :param in_files: the 3D NIfTI ROI mask file path or paths
+    :param out_file: the output mask file path
+    :param margin: the number of voxels to dilate the ROI union
+        (default 0)
+    :return: the mask file path
+    """
+    if isinstance(in_files, basestring):
+        in_files = [in_files]
+    if not in_files:
+        raise ValueError('The ROI mask input files are missing')
+    union = None
+    for in_file in in_files:
+        img = nib.load(in_file)
+        roi = np.asanyarray(img.dataobj) != 0
+        if union is None:
+            ref = img
+            union = roi
+        else:
+            union |= roi
+    if margin:
+        union = ndimage.binary_dilation(union, iterations=margin)
+    mask = union.astype(np.uint8)
+    mask_img = nib.Nifti1Image(mask, ref.affine)
+    nib.save(mask_img, out_file)
+    logger(__name__).debug("Saved the %d ROI mask union with %d voxels and"
+                           " margin %d as %s." %
+                           (len(in_files), np.count_nonzero(mask), margin,
+                            out_file))
+
+    return out_file
@@ -0,0 +1,102 @@
+"""
+Affine transform motion estimates. The motion of a volume relative
+to the registration reference is summarized as the root mean square
+(RMS) displacement of the points within a sphere, as described in
+Jenkinson, M., *Measuring transformation error by RMS deviation*,
+FMRIB Technical Report TR99MJ1 (1999). The sphere approximates the
+imaged anatomy.
+
+The transforms are the ITK affine ``.mat`` files written by ANTs
+registration. ITK transforms operate on LPS physical coordinates.
+"""
+import numpy as np
+import nibabel as nib
+
+DEF_RADIUS = 80
+"""The default sphere radius in millimeters."""
+
+RAS_TO_LPS = np.array([-1, -1, 1])
+"""The RAS to LPS physical coordinate sign flips."""
+
+
+def read_affine(location):
+    """
+    Reads an ITK affine transform file. The ITK transform maps a
+    point *x* to *A (x - c) + t + c*, where *A* is the matrix, *t* is
+    the translation and *c* is the center of rotation.
+
+    :param location: the ITK affine ``.mat`` file path
+    :return: the (matrix, translation, center) tuple
+    :raise ValueError: if the file does not contain a 3D affine
+        transform
+    """
+    from scipy.io import loadmat
+
+    content = loadmat(location)
+    param_key = next((k for k in content if k.endswith('_3_3')), None)
+    if not param_key:
+        raise ValueError("The file does not contain a 3D affine transform:"
+                         " %s" % location)
+    params = content[param_key].ravel()
+    matrix = params[:9].reshape(3, 3)
+    translation = params[9:12]
+    center = content['fixed'].ravel() if 'fixed' in content else np.zeros(3)
+
+    return matrix, translation, center
+
+
+def image_center(location):
+    """
+    :param location: the 3D NIfTI image file path
+    :return: the LPS physical coordinates of the image center
+    """
+    image = nib.load(location)
+    voxel = (np.array(image.shape[:3]) - 1) / 2.0
+    ras = image.affine.dot(np.append(voxel, 1))[:3]
+
+    return ras * RAS_TO_LPS
+
+
+def rms_displacement(matrix, translation, center=None, origin=None,
+                     radius=DEF_RADIUS):
+    """
+    Computes the RMS displacement of the points within a sphere
+    under the given affine transform.
+
+    :param matrix: the 3x3 transform matrix
+    :param translation: the transform translation
+    :param center: the transform center of rotation (default origin)
+    :param origin: the sphere center (default the center of rotation)
+    :param radius: the sphere radius
+    :return: the RMS displacement
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    translation = np.asarray(translation, dtype=float)
+    if center is None:
+        center = np.zeros(3)
+    if origin is None:
+        origin = center
+    deform = matrix - np.eye(3)
+    # The displacement of the sphere center.
+    shift = deform.dot(np.subtract(origin, center)) + translation
+    # The mean squared displacement of the sphere points relative to
+    # the center is r^2/5 times the trace of M^T M.
+    spread = radius ** 2 / 5.0 * np.trace(deform.T.dot(deform))
+
+    return float(np.sqrt(shift.dot(shift) + spread))
+
+
+def transform_displacement(location, origin=None, radius=DEF_RADIUS):
+    """
+    Computes the :meth:`rms_displacement` of the given ITK affine
+    transform file.
+
+    :param location: the ITK affine ``.mat`` file path
+    :param origin: the sphere center LPS coordinates (default the
+        transform center of rotation)
+    :param radius: the sphere radius
+    :return: the RMS displacement
+    """
+    matrix, translation, center = read_affine(location)
+
+    return rms_displacement(matrix, translation, center, origin, radius)
@@ -0,0 +1,159 @@
+"""
+Pre-contrast R1 (R1\ :sub:`0`) map utilities. The R1\ :sub:`0` map is
+computed from a proton density weighted (PDW) image and a
+T1-weighted image acquired with the same spoiled gradient echo
+sequence but different repetition times or flip angles.
+
+The T1-weighted to PDW signal ratio is a function of R1 alone. That
+function is tabulated once for each acquisition parameter set, cached
+as described in :mod:`qipipe.helpers.cache`, and inverted for each
+voxel by linear interpolation.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+from . import (cache, compact)
+from .header import wrap_header
+from .logging import logger
+
+LUT_CACHE = 'r1_0_lut'
+"""The :mod:`qipipe.helpers.cache` lookup table category."""
+
+DEF_R1_STEP = 0.01
+"""The default lookup table R1 increment in sec\ :sup:`-1`."""
+
+
+def spgr_signal(r1, repetition_time, flip_angle):
+    """
+    :param r1: the R1 value or array in sec\ :sup:`-1`
+    :param repetition_time: the repetition time in milliseconds
+    :param flip_angle: the flip angle in degrees
+    :return: the spoiled gradient echo signal per unit M0
+    """
+    e1 = np.exp(-np.asarray(r1, dtype=np.float64) * repetition_time / 1000.0)
+    angle = np.radians(flip_angle)
+
+    return np.sin(angle) * (1 - e1) / (1 - np.cos(angle) * e1)
+
+
+def make_lookup_table(pdw_params, t1w_params, max_r1_0, step=DEF_R1_STEP):
+    """
+    Tabulates the T1-weighted to PDW signal ratio for the R1 values in
+    the range (0, *max_r1_0*).
+
+    :param pdw_params: the PDW (repetition time, flip angle) tuple
+    :param t1w_params: the T1-weighted (repetition time, flip angle)
+        tuple
+    :param max_r1_0: the R1 range maximum
+    :param step: the R1 increment
+    :return: the (2, n) array of the increasing signal ratios and the
+        corresponding R1 values
+    :raise ValueError: if the signal ratio is not a monotonic function
+        of R1 for the given acquisition parameters
+    """
+    r1_space = np.arange(step, max_r1_0, step)
+    ratios = spgr_signal(r1_space, *t1w_params) / spgr_signal(r1_space,
+                                                              *pdw_params)
+    diffs = np.diff(ratios)
+    if np.all(diffs < 0):
+        ratios, r1_space = ratios[::-1], r1_space[::-1]
+    elif not np.all(diffs > 0):
+        raise ValueError("The signal ratio is not monotonic in R1 for the"
+                         " PDW parameters %s and T1-weighted parameters %s" %
+                         (pdw_params, t1w_params))
+
+    return np.vstack([ratios, r1_space])
+
+
+def lookup_table(pdw_params, t1w_params, max_r1_0, step=DEF_R1_STEP):
+    """
+    Returns the :meth:`make_lookup_table` result for the given
+    parameters. The table is computed once per parameter set and
+    cached.
+
+    :param pdw_params: the PDW (repetition time, flip angle) tuple
+    :param t1w_params: the T1-weighted (repetition time, flip angle)
+        tuple
+    :param max_r1_0: the R1 range maximum
+    :param step: the R1 increment
+    :return: the (2, n) (ratio, R1) lookup table array
+    """
+    key = cache.digest(tuple(pdw_params), tuple(t1w_params),
+                       float(max_r1_0), float(step))
+    cached = cache.lookup(LUT_CACHE, key, '.npy')
+    if cached:
+        return np.load(cached)
+    lut = make_lookup_table(pdw_params, t1w_params, max_r1_0, step)
+    fd, tmp_file = tempfile.mkstemp(suffix='.npy')
+    os.close(fd)
+    try:
+        np.save(tmp_file, lut)
+        cache.store(tmp_file, LUT_CACHE, key, '.npy')
+    finally:
+        os.remove(tmp_file)
+
+    return lut
+
+
+def _acquisition_parameters(location):
+    """
+    :param location: the NIfTI image file path
+    :return: the (repetition time, flip angle) tuple
+    :raise ValueError: if the image meta-data does not include
+        the parameters
+    """
+    nw = wrap_header(location)
+    params = (nw.get_meta('RepetitionTime'), nw.get_meta('FlipAngle'))
+    if None in params:
+        raise ValueError("The %s repetition time or flip angle meta-data is"
+                         " missing" % location)
+
+    return tuple(float(p) for p in params)
+
+
+def make_r1_0_map(pdw_file, t1w_file, out_file, max_r1_0, mask=None,
+                  step=DEF_R1_STEP):
+    """
+    Makes the R1\ :sub:`0` map from the given PDW and T1-weighted
+    images. The acquisition parameters are read from the image DcmMeta
+    header extensions. The input images are compacted as described in
+    :mod:`qipipe.helpers.compact`, so that only the masked voxels are
+    read and the voxel ratios are computed on memory-mapped arrays.
+    The unmasked voxels, as well as the voxels whose signal ratio is
+    outside of the lookup table range, are zero.
+
+    :param pdw_file: the PDW NIfTI image file path
+    :param t1w_file: the T1-weighted NIfTI image file path. A 4D image
+        is averaged over time.
+    :param out_file: the output R1\ :sub:`0` map file path
+    :param max_r1_0: the R1\ :sub:`0` range maximum
+    :param mask: the optional mask file path
+    :param step: the lookup table R1 increment
+    :return: the R1\ :sub:`0` map file path
+    """
+    lut = lookup_table(_acquisition_parameters(pdw_file),
+                       _acquisition_parameters(t1w_file), max_r1_0, step)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        pdw_npy = compact.compact(pdw_file, os.path.join(tmp_dir, 'pdw.npy'),
+                                  mask=mask)
+        t1w_npy = compact.compact(t1w_file, os.path.join(tmp_dir, 't1w.npy'),
+                                  mask=mask)
+        pdw, index = compact.load(pdw_npy)
+        t1w, _ = compact.load(t1w_npy)
+        pdw = pdw.mean(axis=1)
+        t1w = t1w.mean(axis=1)
+        # The voxels without a PDW signal are excluded.
+        valid = pdw != 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(valid, t1w / pdw, 0)
+        r1_0 = np.interp(ratios, lut[0], lut[1], left=0, right=0)
+        r1_0[~valid] = 0
+        compact.expand(r1_0.astype(np.float32), index, pdw_file, out_file)
+    finally:
+        shutil.rmtree(tmp_dir, True)
+    logger(__name__).debug("Saved the %d voxel R1_0 map as %s." %
+                           (np.count_nonzero(r1_0), out_file))
+
+    return out_file
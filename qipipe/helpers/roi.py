@@ -1,11 +1,8 @@
 """ROI utility functions."""
 import itertools
+import numpy as np
 from collections import defaultdict
 import nibabel as nib
-from scipy.spatial import ConvexHull
-from scipy.spatial.kdtree import minkowski_distance
-from mpl_toolkits.mplot3d import Axes3D
-import matplotlib.pyplot as plt
 from qiutil.collections import concat
 
 
@@ -35,6 +32,63 @@ def reorder_bolero_mask(in_file, out_file=None):
     return flipped
 
 
+def read_bolero_mask(location):
+    """
+    Reads an OHSU Bolero ROI ``.bqf`` file. The file is a MATLAB
+    ASCII list of the one-based indexes of the ROI pixels in the
+    row-major order of the displayed DICOM slice.
+
+    :param location: the Bolero ``.bqf`` file path
+    :return: the zero-based ROI pixel index array
+    """
+    indexes = np.loadtxt(location, ndmin=1)
+
+    return indexes.astype(np.intp) - 1
+
+
+def bolero_mask(time_series, slices, out_file=None):
+    """
+    Rasterizes the Bolero ROI slices of one lesion into a 3D mask
+    which conforms to the time series. The result is the same as
+    converting each slice with ``bolero_mask_conv``, reordering the
+    slice with :meth:`reorder_bolero_mask` and placing the slice in
+    the volume, but the ``.bqf`` files are read in-process.
+
+    :param time_series: the 4D time series file path
+    :param slices: the (one-based slice sequence number, ``.bqf``
+        file path) tuples
+    :param out_file: the optional output file path
+    :return: the 3D mask ndarray data
+    :raise ValueError: if a ROI pixel or slice is outside of the
+        time series volume
+    """
+    img = nib.load(time_series)
+    x_size, y_size, z_size = img.shape[:3]
+    data = np.zeros((x_size, y_size, z_size), dtype=np.uint8)
+    for slice_seq_nbr, location in slices:
+        if not 0 < slice_seq_nbr <= z_size:
+            raise ValueError("The Bolero ROI %s slice %d is outside of the"
+                             " %d time series slices" %
+                             (location, slice_seq_nbr, z_size))
+        indexes = read_bolero_mask(location)
+        if not len(indexes):
+            continue
+        # The displayed slice width is the time series x size.
+        rows, columns = np.divmod(indexes, x_size)
+        if indexes.min() < 0 or rows.max() >= y_size:
+            raise ValueError("The Bolero ROI %s pixels are outside of the"
+                             " %d x %d time series slice" %
+                             (location, x_size, y_size))
+        # The displayed rows are the time series y axis and the
+        # displayed columns are the reversed x axis.
+        data[x_size - 1 - columns, rows, slice_seq_nbr - 1] = 1
+    if out_file:
+        out_img = nib.Nifti1Image(data, affine=img.affine)
+        nib.save(out_img, out_file)
+
+    return data
+
+
 def load(location, scale=None):
     """
     Loads a ROI mask file.
@@ -124,6 +178,7 @@ class Extent(object):
             self._volume = area_or_volume
         else:
             raise ExtentError("%d-dimensional extent is not supported" % dim)
+        from scipy.spatial import ConvexHull
         vertices = ConvexHull(points).vertices
         self.boundary = points[vertices]
         """The convex hull boundary in image space."""
@@ -151,6 +206,11 @@ class Extent(object):
 
     def show(self):
         """Displays the ROI boundary points and extent segments."""
+        # The plot modules are only loaded for display, since
+        # importing pyplot initializes the matplotlib backend.
+        # Axes3D registers the 3d projection.
+        from mpl_toolkits.mplot3d import Axes3D
+        import matplotlib.pyplot as plt
         # The boundary points.
         bnd_pts = np.asarray(concat(self.boundary))
         # Scale the points, if necessary.
@@ -498,5 +558,12 @@ class ExtentSegmentFactory(object):
         return np.asarray(dists)
 
 
-# Convenient distance alias.
-distance = minkowski_distance
+def distance(p, q):
+    """
+    :param p: the first point
+    :param q: the second point
+    :return: the Euclidean distance between the points
+    """
+    from scipy.spatial.kdtree import minkowski_distance
+
+    return minkowski_distance(p, q)
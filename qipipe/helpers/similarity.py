@@ -0,0 +1,212 @@
+"""
+Registration quality metrics. Each realigned volume is compared to
+the registration reference by the following measures:
+
+- *mi*: the intensity mutual information in nats
+
+- *ncc*: the normalized cross-correlation
+
+- *dice*: the Dice overlap of the foreground, i.e. the voxels whose
+  intensity exceeds the reference mean intensity
+
+- *shift*: the distance in millimeters between the reference and
+  volume foreground centroids
+
+The comparison is restricted to the optional mask. The reference
+statistics are computed once. Each volume is read once, and the
+measures are computed on the volume array in place. An uncompressed
+NIfTI volume is memory-mapped by nibabel.
+"""
+import os
+import csv
+import numpy as np
+import nibabel as nib
+
+DEF_BINS = 32
+"""The default mutual information histogram bin count."""
+
+METRICS = ['mi', 'ncc', 'dice', 'shift']
+"""The metric table columns in addition to the volume file name."""
+
+
+class Reference(object):
+    """The reference statistics which are shared by the volumes."""
+
+    def __init__(self, location, mask=None, bins=DEF_BINS):
+        """
+        :param location: the reference image file path
+        :param mask: the optional mask file path
+        :param bins: the mutual information histogram bin count
+        """
+        image = nib.load(location)
+        data = np.asanyarray(image.dataobj)
+
+        self.bins = bins
+        """The histogram bin count."""
+
+        self.spacing = image.affine[:3, :3]
+        """The voxel to millimeter scaling matrix."""
+
+        if mask:
+            self.region = np.asanyarray(nib.load(mask).dataobj) != 0
+        else:
+            self.region = None
+        """The mask region, or None to compare all voxels."""
+
+        values = self.values(data)
+        self.threshold = values.mean()
+        """The foreground intensity threshold."""
+
+        self.indexes = _bin_indexes(values, bins)
+        """The reference intensity histogram bin indexes."""
+
+        self.zscores = _standardize(values)
+        """The standardized reference intensities."""
+
+        self.foreground = self.select_foreground(data)
+        """The reference foreground."""
+
+        self.centroid = _centroid(self.foreground)
+        """The reference foreground voxel centroid."""
+
+    def values(self, data):
+        """
+        :param data: the image data array
+        :return: the intensities in the :attr:`region` as a 1D float
+            array
+        """
+        if self.region is None:
+            return data.ravel().astype(np.float64)
+        else:
+            return data[self.region].astype(np.float64)
+
+    def select_foreground(self, data):
+        """
+        :param data: the image data array
+        :return: the boolean foreground array
+        """
+        foreground = data > self.threshold
+        if self.region is not None:
+            foreground &= self.region
+
+        return foreground
+
+
+def measure(reference, location):
+    """
+    Compares the given volume to the reference.
+
+    :param reference: the :class:`Reference`
+    :param location: the realigned volume image file path
+    :return: the {metric: value} dictionary for the :const:`METRICS`
+    """
+    data = np.asanyarray(nib.load(location).dataobj)
+    values = reference.values(data)
+    # The mutual information from the joint histogram.
+    bins = reference.bins
+    indexes = _bin_indexes(values, bins)
+    joint = np.bincount(reference.indexes * bins + indexes,
+                        minlength=bins * bins).reshape(bins, bins)
+    joint = joint / float(joint.sum())
+    outer = np.outer(joint.sum(axis=1), joint.sum(axis=0))
+    nonzero = joint > 0
+    mi = np.sum(joint[nonzero] * np.log(joint[nonzero] / outer[nonzero]))
+    # The normalized cross-correlation.
+    ncc = reference.zscores.dot(_standardize(values)) / len(values)
+    # The foreground overlap.
+    foreground = reference.select_foreground(data)
+    area = reference.foreground.sum() + foreground.sum()
+    if area:
+        overlap = np.logical_and(reference.foreground, foreground).sum()
+        dice = 2.0 * overlap / area
+    else:
+        dice = 0.0
+    # The foreground centroid shift.
+    offset = reference.spacing.dot(_centroid(foreground) - reference.centroid)
+    shift = np.sqrt(offset.dot(offset))
+
+    return dict(mi=float(mi), ncc=float(ncc), dice=float(dice),
+                shift=float(shift))
+
+
+def measure_volumes(reference, in_files, mask=None, bins=DEF_BINS):
+    """
+    Compares each of the given volumes to the reference.
+
+    :param reference: the reference image file path
+    :param in_files: the realigned volume image file paths
+    :param mask: the optional mask file path
+    :param bins: the mutual information histogram bin count
+    :return: the [(volume file, :meth:`measure` result)] list
+    """
+    ref = Reference(reference, mask, bins)
+
+    return [(location, measure(ref, location)) for location in in_files]
+
+
+def write_table(results, dest):
+    """
+    Writes the :meth:`measure_volumes` results as a CSV table with a
+    row for each volume. The first column is the volume file name.
+    The remaining columns are the :const:`METRICS`.
+
+    :param results: the :meth:`measure_volumes` result
+    :param dest: the target CSV file path
+    :return: the target file path
+    """
+    with open(dest, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['volume'] + METRICS)
+        for location, metrics in results:
+            row = ["%.4f" % metrics[metric] for metric in METRICS]
+            writer.writerow([os.path.basename(location)] + row)
+
+    return dest
+
+
+def _bin_indexes(values, bins):
+    """
+    :param values: the intensity array
+    :param bins: the histogram bin count
+    :return: the histogram bin index of each value
+    """
+    lower = values.min() if len(values) else 0
+    span = values.max() - lower if len(values) else 0
+    if not span:
+        return np.zeros(len(values), dtype=np.intp)
+    indexes = ((values - lower) * (bins / span)).astype(np.intp)
+
+    return np.minimum(indexes, bins - 1)
+
+
+def _standardize(values):
+    """
+    :param values: the intensity array
+    :return: the zero-mean, unit variance intensities, or zeros if
+        the intensities are constant
+    """
+    centered = values - values.mean()
+    sd = centered.std()
+
+    return centered / sd if sd else centered
+
+
+def _centroid(foreground):
+    """
+    :param foreground: the boolean foreground array
+    :return: the foreground voxel centroid, or the array center if
+        the foreground is empty
+    """
+    total = foreground.sum()
+    if not total:
+        return (np.array(foreground.shape) - 1) / 2.0
+    # Each axis coordinate is the mean of the foreground profile along
+    # that axis, which avoids making a voxel coordinate array.
+    axes = range(foreground.ndim)
+    centroid = []
+    for axis in axes:
+        others = tuple(a for a in axes if a != axis)
+        profile = foreground.sum(axis=others)
+        centroid.append(profile.dot(np.arange(len(profile))) / float(total))
+
+    return np.array(centroid)
@@ -0,0 +1,208 @@
+"""
+The pipeline stage result cache. A stage result is retained across
+pipeline runs in the :mod:`qipipe.helpers.cache` directory, e.g.::
+
+    ~/.qipipe/cache/stage_modeling/<key>/
+
+The key is a digest of the stage input file contents, the effective
+stage configuration and the stage options. A rerun on unchanged
+input with an unchanged configuration therefore reuses the prior
+result rather than recomputing it.
+
+A result is a file path, a non-file value, or a list or dictionary
+of results. The result files are copied into the cache entry
+directory. The result structure and the file checksums are recorded
+in the entry :const:`MANIFEST` file. A :meth:`lookup` with the
+*verify* flag set rejects an entry whose files no longer match the
+recorded checksums.
+
+The stage results count toward the :mod:`qipipe.helpers.cache` size
+limit. The least recently used stage results are evicted first.
+"""
+import os
+import json
+import shutil
+import tempfile
+from . import cache
+from .logging import logger
+
+CATEGORY_PREFIX = 'stage_'
+"""The stage cache category prefix."""
+
+MANIFEST = 'manifest.json'
+"""The cache entry result structure file name."""
+
+EXCLUDED_SECTIONS = ['Execution']
+"""The configuration sections which do not affect a stage result."""
+
+EXCLUDED_OPTIONS = ['plugin_args']
+"""The configuration options which do not affect a stage result."""
+
+
+def stage_key(stage, in_files, configuration, *values):
+    """
+    Makes the stage cache key. The configuration contributes all of
+    its sections and options except for the execution and cluster
+    submission settings, which do not affect the result. The
+    configuration therefore includes the sections recorded in a
+    stage profile. Each input file is read at most once per process,
+    as described in :meth:`qipipe.helpers.cache.input_checksum`.
+
+    :param stage: the stage name
+    :param in_files: the stage input files
+    :param configuration: the stage workflow configuration dictionary
+    :param values: the additional stage option values
+    :return: the cache key
+    """
+    checksums = [cache.input_checksum(location) for location in in_files]
+    effective = []
+    for section in sorted(configuration):
+        if section in EXCLUDED_SECTIONS:
+            continue
+        options = configuration[section]
+        if isinstance(options, dict):
+            options = sorted((opt, value) for opt, value in options.iteritems()
+                             if opt not in EXCLUDED_OPTIONS)
+        effective.append((section, options))
+
+    return cache.digest(stage, checksums, effective, *values)
+
+
+def lookup(stage, key, verify=False):
+    """
+    :param stage: the stage name
+    :param key: the :meth:`stage_key` cache key
+    :param verify: flag indicating whether to check the cached file
+        content against the recorded checksums
+    :return: the cached result, or None if there is no such result
+        or, if the *verify* flag is set, a cached file was modified
+    """
+    location = cache.cache_dir(CATEGORY_PREFIX + stage)
+    if not location:
+        return None
+    entry = os.path.join(location, key)
+    manifest = os.path.join(entry, MANIFEST)
+    if not os.path.exists(manifest):
+        return None
+    with open(manifest) as f:
+        result = _decode(json.load(f), entry, verify)
+    if result is None:
+        logger(__name__).debug("The cached %s stage result %s is"
+                               " incomplete." % (stage, entry))
+        return None
+    cache.touch(entry)
+    logger(__name__).debug("Found the cached %s stage result %s." %
+                           (stage, entry))
+
+    return result
+
+
+def store(stage, key, result):
+    """
+    Caches the given stage result. The cache entry is created
+    atomically, i.e. a concurrent :meth:`lookup` sees either no
+    entry or a complete entry. An existing entry with the same key,
+    e.g. from a run before a forced recomputation, is replaced. A
+    cache write failure is logged and otherwise ignored.
+
+    :param stage: the stage name
+    :param key: the :meth:`stage_key` cache key
+    :param result: the stage result
+    :return: the cached result, or None if the result could not
+        be cached
+    """
+    location = cache.cache_dir(CATEGORY_PREFIX + stage)
+    if not location:
+        return None
+    entry = os.path.join(location, key)
+    tmp_dir = old_dir = None
+    try:
+        tmp_dir = tempfile.mkdtemp(dir=location, suffix='.tmp')
+        manifest = _encode(result, tmp_dir, [0])
+        with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+        if os.path.exists(entry):
+            # A directory cannot be renamed onto a non-empty directory,
+            # so move the prior entry aside first.
+            old_dir = tempfile.mkdtemp(dir=location, suffix='.old')
+            os.rename(entry, old_dir)
+        os.rename(tmp_dir, entry)
+    except (IOError, OSError) as e:
+        logger(__name__).debug("The %s stage result could not be cached:"
+                               " %s" % (stage, e))
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, True)
+        if old_dir:
+            shutil.rmtree(old_dir, True)
+        return None
+    if old_dir:
+        shutil.rmtree(old_dir, True)
+    logger(__name__).debug("Cached the %s stage result as %s." %
+                           (stage, entry))
+    cache.evict()
+
+    return lookup(stage, key)
+
+
+def _encode(value, dest, counter):
+    """
+    Copies the result files into the cache entry directory.
+
+    :param value: the result value
+    :param dest: the cache entry directory
+    :param counter: the single-item file counter list
+    :return: the manifest value
+    """
+    if isinstance(value, dict):
+        return {k: _encode(v, dest, counter) for k, v in value.iteritems()}
+    elif isinstance(value, (list, tuple)):
+        return [_encode(v, dest, counter) for v in value]
+    elif isinstance(value, basestring) and os.path.isfile(value):
+        # Each file is copied into a numbered subdirectory, so that
+        # the cached file retains the result file base name.
+        counter[0] += 1
+        rel_path = os.path.join(str(counter[0]), os.path.basename(value))
+        os.mkdir(os.path.join(dest, str(counter[0])))
+        shutil.copyfile(value, os.path.join(dest, rel_path))
+        checksum = cache.file_checksum(os.path.join(dest, rel_path))
+        return dict(file=rel_path, checksum=checksum)
+    else:
+        return value
+
+
+def _decode(value, entry, verify=False):
+    """
+    :param value: the manifest value
+    :param entry: the cache entry directory
+    :param verify: flag indicating whether to check the file checksums
+    :return: the result value, or None if a cached file is missing
+        or does not match its checksum
+    """
+    if isinstance(value, dict):
+        if 'file' in value and set(value) <= {'file', 'checksum'}:
+            location = str(os.path.join(entry, value['file']))
+            if not os.path.exists(location):
+                return None
+            checksum = value.get('checksum')
+            if verify and checksum:
+                if cache.file_checksum(location) != checksum:
+                    logger(__name__).debug("The cached file %s does not"
+                                           " match its checksum." % location)
+                    return None
+            return location
+        result = {}
+        for k, v in value.iteritems():
+            decoded = _decode(v, entry, verify)
+            if decoded is None and v is not None:
+                return None
+            result[str(k)] = decoded
+        return result
+    elif isinstance(value, list):
+        result = [_decode(v, entry, verify) for v in value]
+        if any(r is None and v is not None for r, v in zip(result, value)):
+            return None
+        return result
+    elif isinstance(value, unicode):
+        return str(value)
+    else:
+        return value
@@ -0,0 +1,75 @@
+"""
+Local thread budget scheduling. Concurrent multi-threaded jobs, e.g.
+ANTs volume registrations, share a CPU budget on the local host. The
+budget is divided among the jobs, so that the host is neither
+oversubscribed nor underused. The concurrency is further limited by
+the host memory and the per-job memory estimate.
+
+The job thread count is applied by the caller, e.g. as the Nipype ANTs
+interface *num_threads* input, which sets the job
+``ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS`` environment variable.
+"""
+import os
+import multiprocessing
+
+
+def available_cpus():
+    """
+    :return: the number of local CPUs
+    """
+    return multiprocessing.cpu_count()
+
+
+def available_memory():
+    """
+    :return: the local physical memory in GB, or None if it cannot be
+        determined
+    """
+    try:
+        pages = os.sysconf('SC_PHYS_PAGES')
+        page_size = os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+    return float(pages) * page_size / 2 ** 30
+
+
+def schedule(jobs, cpus=None, job_memory=None, memory=None,
+             threads_per_job=None):
+    """
+    Divides the CPU budget among the given number of jobs. The
+    concurrency is the least of the following:
+
+    * the number of jobs
+
+    * the CPU budget divided by *threads_per_job*, if that option is
+      set, otherwise the CPU budget
+
+    * the memory divided by *job_memory*, if that option is set
+
+    If *threads_per_job* is not set, then the CPU budget is divided
+    evenly among the concurrent jobs.
+
+    :param jobs: the number of jobs to run
+    :param cpus: the CPU budget (default :meth:`available_cpus`)
+    :param job_memory: the estimated memory in GB per job
+    :param memory: the memory budget in GB (default
+        :meth:`available_memory`)
+    :param threads_per_job: the fixed number of threads per job
+    :return: the (concurrency, threads per job) tuple
+    """
+    cpus = cpus or available_cpus()
+    if threads_per_job:
+        concurrency = max(cpus // threads_per_job, 1)
+    else:
+        concurrency = cpus
+    concurrency = max(min(concurrency, jobs), 1)
+    if job_memory:
+        if not memory:
+            memory = available_memory()
+        if memory:
+            concurrency = min(concurrency, max(int(memory // job_memory), 1))
+    if not threads_per_job:
+        threads_per_job = max(cpus // concurrency, 1)
+
+    return concurrency, threads_per_job
@@ -0,0 +1,411 @@
+"""
+Vectorized extended Tofts pharmacokinetic modeling. This module
+converts a DCE time series to R1 and fits the extended Tofts model
+to every masked voxel at once with a batched Levenberg-Marquardt
+optimizer. It is the in-process equivalent of the proprietary
+``dce_to_r1`` and ``fastfit`` ``ext_tofts`` model programs.
+
+The model time unit is minutes, so |Ktrans| and the AIF rate
+constants are per minute. The file-level functions take times in
+seconds, as recorded in the DICOM meta-data.
+
+.. reST substitutions:
+.. |Ktrans| replace:: K\ :sup:`trans`
+"""
+import numpy as np
+import nibabel as nib
+from dcmstack import dcm_time_to_sec
+from . import compact
+from .header import wrap_header
+from .logging import logger
+
+SECONDS_PER_MINUTE = 60.0
+
+PARAMS = ['k_trans', 'k_ep', 'v_p']
+"""The extended Tofts optimization parameters."""
+
+DEF_INITIAL = (0.1, 0.5, 0.01)
+"""The default (k_trans, k_ep, v_p) starting point."""
+
+LOWER_BOUNDS = (0.0, 1e-3, 0.0)
+"""The (k_trans, k_ep, v_p) lower bounds."""
+
+UPPER_BOUNDS = (5.0, 50.0, 1.0)
+"""The (k_trans, k_ep, v_p) upper bounds."""
+
+DEF_MAX_ITER = 50
+"""The default maximum number of Levenberg-Marquardt iterations."""
+
+DEF_TOLERANCE = 1e-6
+"""The default relative sum of squares convergence tolerance."""
+
+MAX_DAMPING = 1e10
+"""The damping factor beyond which a voxel fit is abandoned."""
+
+DEF_BLOCK_SIZE = 1 << 16
+"""The default number of voxels to convert to R1 at a time."""
+
+DEF_FIT_BLOCK_SIZE = 1 << 14
+"""
+The default number of voxels to fit at a time. The fit working
+memory is dominated by the float64 (voxel, time, parameter) Jacobian
+and its trial copy, i.e. roughly 100 bytes per block voxel and time
+point, or about 80 MB for this block size and 50 time points.
+"""
+
+
+def signal_to_r1(signal, r1_0, base_end, repetition_time, flip_angle):
+    """
+    Converts the spoiled gradient echo signal intensities to R1 values.
+    The signal is scaled so that the baseline mean signal corresponds
+    to the pre-contrast *r1_0*.
+
+    :param signal: the (voxel, time) signal intensity array
+    :param r1_0: the pre-contrast R1 in sec\ :sup:`-1`, either a scalar
+        or a per-voxel array
+    :param base_end: the number of baseline time points
+    :param repetition_time: the repetition time in milliseconds
+    :param flip_angle: the flip angle in degrees
+    :return: the (r1, valid) tuple, where *r1* is the (voxel, time)
+        R1 array and *valid* is the voxel array flag which is False if
+        the signal could not be converted. The invalid voxel R1 values
+        are zero.
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    tr = repetition_time / 1000.0
+    cos_a = np.cos(np.radians(flip_angle))
+    e1_0 = np.exp(-tr * np.asarray(r1_0, dtype=np.float64))
+    # The baseline signal.
+    s_0 = signal[..., :base_end].mean(axis=-1)
+    # The M0 sin(flip angle) signal scale factor.
+    scale = s_0 * (1 - cos_a * e1_0) / (1 - e1_0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = signal / scale[..., np.newaxis]
+        e1 = (1 - ratio) / (1 - ratio * cos_a)
+        valid = (s_0 > 0) & np.all((e1 > 0) & (e1 < 1), axis=-1)
+        r1 = -np.log(e1) / tr
+    r1[~valid] = 0
+
+    return r1, valid
+
+
+def aif(times, params, scale=1.0, shift=0.0):
+    """
+    Calculates the arterial input function plasma concentration as
+    the sum of exponentials:
+
+    *scale* * (|sum| *a*\ :sub:`i` exp(-*m*\ :sub:`i` (*t* - *shift*)) + *c*)
+
+    for *t* >= *shift* and zero before the shift.
+
+    :param times: the time points
+    :param params: the [*a*\ :sub:`1`, *m*\ :sub:`1`, ...,
+        *a*\ :sub:`n`, *m*\ :sub:`n`] amplitude and rate pairs,
+        optionally followed by the constant term *c*
+    :param scale: the concentration scale factor
+    :param shift: the bolus arrival time
+    :return: the concentration array
+    """
+    times = np.asarray(times, dtype=np.float64) - shift
+    pair_cnt = len(params) // 2
+    const = params[-1] if len(params) % 2 else 0.0
+    cp = np.empty(times.shape)
+    cp.fill(const)
+    for i in range(pair_cnt):
+        amplitude, rate = params[2 * i], params[2 * i + 1]
+        cp += amplitude * np.exp(-rate * times)
+    cp[times < 0] = 0
+
+    return scale * cp
+
+
+def ext_tofts(times, cp, k_trans, k_ep, v_p, jacobian=False):
+    """
+    Calculates the extended Tofts tissue concentration:
+
+    *v*\ :sub:`p` *C*\ :sub:`p`\ (*t*) + |Ktrans| |int| *C*\ :sub:`p`\ (|tau|)
+    exp(-*k*\ :sub:`ep` (*t* - |tau|)) d\ |tau|
+
+    The convolution is integrated by the trapezoid rule, recursively
+    in time and vectorized over the voxels.
+
+    :param times: the time points
+    :param cp: the plasma concentration at the time points
+    :param k_trans: the voxel |Ktrans| array
+    :param k_ep: the voxel *k*\ :sub:`ep` array
+    :param v_p: the voxel *v*\ :sub:`p` array
+    :param jacobian: flag indicating whether to return the
+        (voxel, time, parameter) Jacobian as well
+    :return: the (voxel, time) concentration array, or the
+        (concentration, Jacobian) tuple if *jacobian* is set
+    """
+    times = np.asarray(times, dtype=np.float64)
+    cp = np.asarray(cp, dtype=np.float64)
+    k_trans = np.asarray(k_trans, dtype=np.float64)
+    k_ep = np.asarray(k_ep, dtype=np.float64)
+    v_p = np.asarray(v_p, dtype=np.float64)
+    shape = (len(k_trans), len(times))
+    # The convolution and its negated k_ep derivative.
+    conv = np.zeros(shape)
+    conv_d = np.zeros(shape)
+    for i, dt in enumerate(np.diff(times), start=1):
+        decay = np.exp(-k_ep * dt)
+        conv[:, i] = (decay * (conv[:, i - 1] + 0.5 * dt * cp[i - 1]) +
+                      0.5 * dt * cp[i])
+        if jacobian:
+            conv_d[:, i] = decay * (conv_d[:, i - 1] + dt * conv[:, i - 1] +
+                                    0.5 * dt * dt * cp[i - 1])
+    conc = k_trans[:, np.newaxis] * conv + v_p[:, np.newaxis] * cp
+    if not jacobian:
+        return conc
+    d_v_p = np.broadcast_to(cp, shape)
+    jac = np.stack([conv, -k_trans[:, np.newaxis] * conv_d, d_v_p], axis=-1)
+
+    return conc, jac
+
+
+def fit_ext_tofts(times, cp, conc, initial=DEF_INITIAL, max_iter=DEF_MAX_ITER,
+                  tolerance=DEF_TOLERANCE):
+    """
+    Fits the extended Tofts model to each voxel concentration curve
+    with a batched Levenberg-Marquardt optimizer. Every iteration
+    solves the damped normal equations for all unconverged voxels
+    at once. Each voxel has its own damping factor.
+
+    The working memory is proportional to the number of voxels times
+    the number of time points. Large voxel sets should be fit in
+    blocks, as in :meth:`fit_r1_series`.
+
+    :param times: the time points
+    :param cp: the plasma concentration at the time points
+    :param conc: the (voxel, time) tissue concentration array
+    :param initial: the (k_trans, k_ep, v_p) starting point, either
+        a tuple or a (voxel, parameter) array
+    :param max_iter: the maximum number of iterations
+    :param tolerance: the relative sum of squares convergence tolerance
+    :return: the {parameter: voxel array} dictionary for parameters
+        ``k_trans``, ``v_e``, ``v_p`` and ``chisq``
+    """
+    conc = np.asarray(conc, dtype=np.float64)
+    voxel_cnt = conc.shape[0]
+    lower = np.array(LOWER_BOUNDS)
+    upper = np.array(UPPER_BOUNDS)
+    params = np.empty((voxel_cnt, len(PARAMS)))
+    params[:] = initial
+    params = np.clip(params, lower, upper)
+    damping = np.empty(voxel_cnt)
+    damping.fill(1e-2)
+    model, jac = ext_tofts(times, cp, *params.T, jacobian=True)
+    resid = conc - model
+    sse = np.einsum('nt,nt->n', resid, resid)
+    active = np.ones(voxel_cnt, dtype=bool)
+    diag_ndx = np.arange(len(PARAMS))
+    for _ in range(max_iter):
+        ndx = np.flatnonzero(active)
+        if not len(ndx):
+            break
+        # The damped normal equations.
+        jac_a = jac[ndx]
+        jtj = np.einsum('ntp,ntq->npq', jac_a, jac_a)
+        jtr = np.einsum('ntp,nt->np', jac_a, resid[ndx])
+        diag = jtj[:, diag_ndx, diag_ndx] + 1e-12
+        jtj[:, diag_ndx, diag_ndx] += damping[ndx, np.newaxis] * diag
+        step = np.linalg.solve(jtj, jtr[..., np.newaxis])[..., 0]
+        trial = np.clip(params[ndx] + step, lower, upper)
+        trial_model, trial_jac = ext_tofts(times, cp, *trial.T, jacobian=True)
+        trial_resid = conc[ndx] - trial_model
+        trial_sse = np.einsum('nt,nt->n', trial_resid, trial_resid)
+        # Accept the improved voxel fits and relax their damping.
+        better = trial_sse < sse[ndx]
+        improvement = (sse[ndx] - trial_sse) / np.maximum(sse[ndx], 1e-30)
+        converged = better & (improvement < tolerance)
+        accepted = ndx[better]
+        params[accepted] = trial[better]
+        jac[accepted] = trial_jac[better]
+        resid[accepted] = trial_resid[better]
+        sse[accepted] = trial_sse[better]
+        damping[accepted] /= 10
+        damping[ndx[~better]] *= 10
+        # Stop fitting the converged or stalled voxels.
+        active[ndx[converged]] = False
+        active[ndx[damping[ndx] > MAX_DAMPING]] = False
+
+    k_trans, k_ep, v_p = params.T
+
+    return dict(k_trans=k_trans, v_e=k_trans / k_ep, v_p=v_p, chisq=sse)
+
+
+def acquisition_times(time_series, delta_t=None):
+    """
+    Returns the time series volume acquisition times relative to the
+    first volume. The times are read from the DcmMeta header
+    extension ``AcquisitionTime``. If the acquisition time is not
+    available, then the volumes are assumed to be *delta_t* seconds
+    apart.
+
+    :param time_series: the 4D NIfTI time series file path
+    :param delta_t: the volume acquisition interval in seconds
+    :return: the acquisition time array in seconds
+    :raise ValueError: if the acquisition times are not available and
+        *delta_t* is not set
+    """
+    nw = wrap_header(time_series, make_empty=True)
+    vol_cnt = nw.nii_img.shape[3]
+    acq_times = [nw.get_meta('AcquisitionTime', (0, 0, 0, i))
+                 for i in range(vol_cnt)]
+    if all(acq_times):
+        secs = np.array([dcm_time_to_sec(t) for t in acq_times])
+        return secs - secs[0]
+    if not delta_t:
+        raise ValueError("The %s acquisition times are missing and the"
+                         " acquisition interval was not specified" %
+                         time_series)
+
+    return np.arange(vol_cnt) * float(delta_t)
+
+
+def make_r1_series(time_series, in_file, out_file, r1_0, base_end,
+                   block_size=DEF_BLOCK_SIZE):
+    """
+    Converts the compacted DCE time series to a compacted R1 series,
+    as described in :meth:`signal_to_r1`. The repetition time and flip
+    angle are read from the time series DcmMeta header extension. The
+    voxels which cannot be converted are zero.
+
+    The compacted time series is memory-mapped and converted in blocks
+    of *block_size* voxels.
+
+    :param time_series: the 4D NIfTI time series file path
+    :param in_file: the :mod:`qipipe.helpers.compact` time series
+        file path
+    :param out_file: the output compacted R1 series file path
+    :param r1_0: the pre-contrast R1 in sec\ :sup:`-1`
+    :param base_end: the number of baseline volumes
+    :param block_size: the number of voxels to convert at a time
+    :return: the compacted R1 series file path
+    """
+    nw = wrap_header(time_series)
+    repetition_time = nw.get_meta('RepetitionTime')
+    flip_angle = nw.get_meta('FlipAngle')
+    if repetition_time is None or flip_angle is None:
+        raise ValueError("The %s repetition time or flip angle meta-data is"
+                         " missing" % time_series)
+    signal, index = compact.load(in_file)
+    r1 = np.lib.format.open_memmap(out_file, mode='w+', dtype=np.float32,
+                                   shape=signal.shape)
+    valid_cnt = 0
+    for start in range(0, len(signal), block_size):
+        end = start + block_size
+        r1[start:end], valid = signal_to_r1(signal[start:end], r1_0, base_end,
+                                            repetition_time, flip_angle)
+        valid_cnt += np.count_nonzero(valid)
+    r1.flush()
+    np.save(compact.index_location(out_file), index)
+    logger(__name__).debug("Converted %d of %d %s masked voxels to R1." %
+                           (valid_cnt, len(signal), time_series))
+
+    return out_file
+
+
+def initial_parameters(prior_maps, index, default=DEF_INITIAL):
+    """
+    Makes the per-voxel :meth:`fit_ext_tofts` starting point from a
+    prior fit. The voxels whose prior parameters are missing or out of
+    bounds start from the *default* parameters instead. A standard
+    Tofts prior fit has no ``v_p`` map. In that case, every voxel
+    starts from the *default* ``v_p``.
+
+    :param prior_maps: the prior {parameter: file path} NIfTI map
+        dictionary for parameters ``k_trans``, ``v_e`` and, optionally,
+        ``v_p``
+    :param index: the flat on-disk offsets of the voxels to fit, as
+        described in :mod:`qipipe.helpers.compact`
+    :param default: the default (k_trans, k_ep, v_p) starting point
+    :return: the (voxel, parameter) starting point array
+    """
+    def prior_values(param):
+        data = np.asanyarray(nib.load(prior_maps[param]).dataobj)
+        return data.ravel(order='F')[index].astype(np.float64)
+
+    k_trans = prior_values('k_trans')
+    v_e = prior_values('v_e')
+    if 'v_p' in prior_maps:
+        v_p = prior_values('v_p')
+    else:
+        v_p = np.empty(len(k_trans))
+        v_p.fill(default[2])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        initial = np.column_stack([k_trans, k_trans / v_e, v_p])
+    valid = (np.all(np.isfinite(initial), axis=1) & (k_trans > 0) &
+             np.all(initial >= LOWER_BOUNDS, axis=1) &
+             np.all(initial <= UPPER_BOUNDS, axis=1))
+    initial[~valid] = default
+    logger(__name__).debug("Initialized %d of %d voxels from the prior fit." %
+                           (np.count_nonzero(valid), len(index)))
+
+    return initial
+
+
+def fit_r1_series(in_file, reference, times, r1_0, r1_cr, aif_params,
+                  out_files, aif_scale=1.0, aif_shift=0.0, prior_maps=None,
+                  block_size=DEF_FIT_BLOCK_SIZE, **opts):
+    """
+    Fits the extended Tofts model to the compacted R1 series voxels.
+    The R1 values are converted to contrast agent concentration with
+    the relaxivity *r1_cr*. The parameter maps are expanded to
+    full-size NIfTI images, where the voxels outside of the compacted
+    index or with a zero R1 series are zero.
+
+    The memory-mapped R1 series is fit in blocks of *block_size*
+    voxels, so that the fit working memory does not grow with the
+    mask size, as described in :const:`DEF_FIT_BLOCK_SIZE`.
+
+    :param in_file: the :mod:`qipipe.helpers.compact` R1 series file
+        path
+    :param reference: the NIfTI image whose header supplies the
+        parameter map shape and affine
+    :param times: the volume acquisition times in seconds
+    :param r1_0: the pre-contrast R1 in sec\ :sup:`-1`
+    :param r1_cr: the contrast agent relaxivity in
+        mM\ :sup:`-1` sec\ :sup:`-1`
+    :param aif_params: the :meth:`aif` parameters
+    :param out_files: the {parameter: file path} output dictionary for
+        parameters ``k_trans``, ``v_e``, ``v_p`` and ``chisq``
+    :param aif_scale: the :meth:`aif` scale factor
+    :param aif_shift: the bolus arrival offset in seconds
+    :param prior_maps: the optional :meth:`initial_parameters` prior
+        fit maps which warm-start the fit
+    :param block_size: the number of voxels to fit at a time
+    :param opts: the additional :meth:`fit_ext_tofts` options
+    :return: the *out_files* dictionary
+    """
+    _logger = logger(__name__)
+    r1, index = compact.load(in_file)
+    # Skip the voxels which could not be converted to R1.
+    fit_ndx = np.flatnonzero(np.any(r1 != 0, axis=-1))
+    minutes = np.asarray(times, dtype=np.float64) / SECONDS_PER_MINUTE
+    cp = aif(minutes, aif_params, scale=aif_scale,
+             shift=aif_shift / SECONDS_PER_MINUTE)
+    if prior_maps:
+        opts['initial'] = initial_parameters(prior_maps, index[fit_ndx])
+    initial = np.asarray(opts.pop('initial', DEF_INITIAL))
+    fitted = {param: np.zeros(len(fit_ndx), dtype=np.float32)
+              for param in out_files}
+    _logger.debug("Fitting the extended Tofts model to %d %s voxels..." %
+                  (len(fit_ndx), in_file))
+    for start in range(0, len(fit_ndx), block_size):
+        end = start + block_size
+        block_ndx = fit_ndx[start:end]
+        conc = (np.asarray(r1[block_ndx], dtype=np.float64) - r1_0) / r1_cr
+        # A voxel-wise starting point is sliced to the block.
+        block_initial = initial[start:end] if initial.ndim > 1 else initial
+        block_fit = fit_ext_tofts(minutes, cp, conc, initial=block_initial,
+                                  **opts)
+        for param, values in fitted.iteritems():
+            values[start:end] = block_fit[param]
+    _logger.debug("Fit the extended Tofts model to %d %s voxels." %
+                  (len(fit_ndx), in_file))
+    for param, out_file in out_files.iteritems():
+        compact.expand(fitted[param], index[fit_ndx], reference, out_file)
+
+    return out_files
@@ -15,10 +15,10 @@ fastfit application will raise an ImportError.
 
 from .compress import Compress
 from .copy import Copy
+from .copy_header_meta import CopyHeaderMeta
 from .convert_bolero_mask import ConvertBoleroMask
 from .dce_to_r1 import DceToR1
 from .fix_dicom import FixDicom
-from .fastfit import Fastfit
 from .sticky_identity import StickyIdentityInterface
 from .group_dicom import GroupDicom
 from .lookup import Lookup
@@ -1 +1,2 @@
 from .utils import AffineInitializer
+from .resampling import ApplyTransforms
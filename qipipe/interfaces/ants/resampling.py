@@ -0,0 +1,58 @@
+"""
+ANTs resampling interface which writes the resampled image with the
+input image data type in one pass.
+"""
+from nipype.interfaces.ants import resampling
+from nipype.interfaces.base import (traits, isdefined)
+from ...helpers.header import load_header
+
+ANTS_DATA_TYPES = dict(int8='char', uint8='uchar', int16='short',
+                       uint16='short', int32='int', float32='float',
+                       float64='double')
+"""
+The {NumPy data type name: antsApplyTransforms output data type}
+dictionary. An input data type which is not supported by ANTs is
+resampled to the default ANTs float type. ANTs does not have an
+unsigned 16-bit type, so a ``uint16`` image is resampled to a signed
+16-bit ``short`` image, as the prior separate data type conversion
+did. The DICOM-derived MR intensities fit in that range. Set the
+*output_data_type* input to ``int`` if they do not.
+"""
+
+
+class ApplyTransformsInputSpec(resampling.ApplyTransformsInputSpec):
+    output_data_type = traits.Enum(
+        'char', 'uchar', 'short', 'int', 'float', 'double', 'default',
+        argstr='--output-data-type %s',
+        desc='the output data type (default is the input image data type)'
+    )
+
+
+class ApplyTransforms(resampling.ApplyTransforms):
+    """
+    ApplyTransforms extends the Nipype ANTs ApplyTransforms interface
+    with an *output_data_type* input. If that input is not set, then
+    the output image has the input image data type rather than the
+    antsApplyTransforms float default. The resampled image is
+    therefore written in its final form by a single command, without
+    a separate data type conversion.
+    """
+
+    input_spec = ApplyTransformsInputSpec
+
+    def _parse_inputs(self, skip=None):
+        args = super(ApplyTransforms, self)._parse_inputs(skip=skip)
+        if not isdefined(self.inputs.output_data_type):
+            args.append('--output-data-type %s' % self._input_data_type())
+
+        return args
+
+    def _input_data_type(self):
+        """
+        :return: the :const:`ANTS_DATA_TYPES` output data type for the
+            input image, or ``default`` if the input data type is not
+            supported by ANTs
+        """
+        dtype = load_header(self.inputs.input_image).get_data_dtype()
+
+        return ANTS_DATA_TYPES.get(dtype.name, 'default')
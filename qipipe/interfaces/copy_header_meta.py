@@ -0,0 +1,68 @@
+"""
+This module copies the DcmMeta meta-data from one NIfTI image
+to another without loading the image data.
+"""
+import os
+from nipype.interfaces.base import (
+    traits, isdefined, BaseInterfaceInputSpec, BaseInterface, TraitedSpec,
+    File
+)
+from ..helpers import header
+
+
+class CopyHeaderMetaInputSpec(BaseInterfaceInputSpec):
+    src_file = File(exists=True, mandatory=True,
+                    desc='The source image with the meta-data to copy')
+
+    dest_file = File(exists=True, mandatory=True,
+                     desc='The destination image')
+
+    include_classes = traits.List(
+        desc='The meta-data (dimension, class) tuples to include'
+             ' (default all)'
+    )
+
+    exclude_classes = traits.List(
+        desc='The meta-data (dimension, class) tuples to exclude'
+             ' (default none)'
+    )
+
+
+class CopyHeaderMetaOutputSpec(TraitedSpec):
+    dest_file = File(exists=True,
+                     desc='The destination image copy with the merged'
+                          ' meta-data')
+
+
+class CopyHeaderMeta(BaseInterface):
+    """
+    Copies the DcmMeta header extension meta-data from the source
+    image to a copy of the destination image in the current directory.
+    This interface is a drop-in replacement for the dcmstack
+    ``CopyMeta`` interface. However, only the image headers are read
+    and the destination image data block is streamed to the output
+    file unchanged. See :meth:`qipipe.helpers.header.copy_meta`.
+    """
+
+    input_spec = CopyHeaderMetaInputSpec
+
+    output_spec = CopyHeaderMetaOutputSpec
+
+    def _run_interface(self, runtime):
+        dest_file = self.inputs.dest_file
+        self._out_file = os.path.join(os.getcwd(), os.path.basename(dest_file))
+        opts = {}
+        if isdefined(self.inputs.include_classes):
+            opts['include_classes'] = self.inputs.include_classes
+        if isdefined(self.inputs.exclude_classes):
+            opts['exclude_classes'] = self.inputs.exclude_classes
+        header.copy_meta(self.inputs.src_file, dest_file, self._out_file,
+                         **opts)
+
+        return runtime
+
+    def _list_outputs(self):
+        outputs = self._outputs().get()
+        outputs['dest_file'] = self._out_file
+
+        return outputs
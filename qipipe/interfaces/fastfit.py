@@ -47,7 +47,6 @@ from __future__ import absolute_import
 import os
 from os import path
 from glob import glob
-from twisted.python.procutils import which
 from nipype.interfaces.base import (
     traits, DynamicTraitedSpec, CommandLine, CommandLineInputSpec,
     isdefined
@@ -115,6 +114,7 @@ class Fastfit(CommandLine):
     #     # Delay until this last possible moment the fastfit existence
     #     # check. This delay allows Fastfit interface creation without
     #     # the fastfit executable, e.g. in a dry run.
+    #     from twisted.python.procutils import which
     #     matches = which('fastfit')
     #     if matches:
     #         logger(__name__).debug("The fastfit executable is %s" %
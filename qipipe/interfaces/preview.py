@@ -1,6 +1,5 @@
 import os
 import dicom
-from matplotlib import (image, cm)
 from nipype.interfaces.base import (traits, BaseInterfaceInputSpec,
                                     TraitedSpec, BaseInterface)
 
@@ -78,6 +77,8 @@ class Preview(BaseInterface):
             crop_xmin, crop_xmax = crop_x
             crop_ymin, crop_ymax = crop_y
             data = data[crop_xmin:crop_xmax, crop_ymin:crop_ymax]
+        # matplotlib is only loaded when a preview is made.
+        from matplotlib import (image, cm)
         image.imsave(out_file, data, cmap=cm.jet)
 
         return out_file
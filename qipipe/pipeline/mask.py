@@ -5,10 +5,21 @@ from nipype.pipeline import engine as pe
 from nipype.interfaces.utility import (IdentityInterface, Function)
 from nipype.interfaces import fsl
 from ..helpers.constants import MASK_RESOURCE
+from ..helpers import stage_cache
 from ..interfaces import (XNATUpload, MriVolCluster)
 from .workflow_base import WorkflowBase
+from .pipeline_error import PipelineError
 from ..helpers.logging import logger
 
+DEF_TECHNIQUE = 'fsl'
+"""The default mask technique."""
+
+MRI_VOLCLUSTER_PARAMS = ['min_thresh', 'max_thresh', 'min_size', 'min_voxels']
+"""
+The :class:`qipipe.interfaces.mri_volcluster.MriVolCluster` cluster
+parameters which are shared by the ``numpy`` technique.
+"""
+
 
 def run(subject, session, scan, time_series, **opts):
     """
@@ -20,13 +31,38 @@ def run(subject, session, scan, time_series, **opts):
     :param scan: the input scan number
     :param time_series: the input 4D NIfTI time series to mask
     :param opts: additional :class:`MaskWorkflow` initialization
-        parameters
+        parameters, as well as the following keyword option:
+    :keyword force: flag indicating whether to make the mask even if
+         there is a :mod:`qipipe.helpers.stage_cache` result for the
+         same input (default False). A reused mask is uploaded to the
+         XNAT mask resource again, if it is no longer there.
     :return: the mask file location
     """
+    force = opts.pop('force', False)
     workflow = MaskWorkflow(**opts)
-
+    if workflow.dry_run:
+        return workflow.run(subject, session, scan, time_series)
+
+    # Reuse the prior mask of the same input, if possible.
+    key_opts = sorted(item for item in opts.iteritems()
+                      if item[0] != 'base_dir')
+    cache_key = stage_cache.stage_key(
+        'mask', [time_series], workflow.configuration, workflow.project,
+        subject, session, scan, workflow.technique, key_opts
+    )
+    cached = None if force else stage_cache.lookup('mask', cache_key)
+    if cached:
+        workflow.logger.debug("Reusing the %s %s scan %d mask %s." %
+                              (subject, session, scan, cached))
+        # Restore the XNAT mask resource, if necessary.
+        workflow._restore_resource(subject, session, scan, MASK_RESOURCE,
+                                   [cached])
+        return cached
     # Run the workflow.
-    return workflow.run(subject, session, scan, time_series)
+    mask = workflow.run(subject, session, scan, time_series)
+    stage_cache.store('mask', cache_key, mask)
+
+    return mask
 
 
 class MaskWorkflow(WorkflowBase):
@@ -53,12 +89,25 @@ class MaskWorkflow(WorkflowBase):
 
     - `mask`: the mask file
 
+    Two mask techniques are supported:
+
+    - ``fsl``: a chain of FSL and ``mri_volcluster`` command nodes
+      (default)
+
+    - ``numpy``: a single in-process node which reads the time series
+      once and writes only the mask, as described in
+      :meth:`qipipe.helpers.mask.create_mask`
+
+    The technique is set by the *technique* initialization option or
+    the configuration ``Mask`` section ``technique`` option.
+
     The optional workflow configuration file can contain the following
     sections:
 
     - ``fsl.MriVolCluster``: the
         :class:`qipipe.interfaces.mri_volcluster.MriVolCluster`
-        interface options
+        interface options, which are also the ``numpy`` technique
+        cluster parameters
     """
 
     def __init__(self, **opts):
@@ -70,11 +119,19 @@ class MaskWorkflow(WorkflowBase):
             initializer keyword arguments, as well as the following keyword arguments:
         :option crop_posterior: crop posterior to the center of gravity,
             e.g. for a breast tumor
+        :option technique: the mask :attr:`technique`
         """
         super(MaskWorkflow, self).__init__(__name__, **opts)
 
+        technique_opt = opts.pop('technique', None)
+        if not technique_opt:
+            mask_cfg = self.configuration.get('Mask', {})
+            technique_opt = mask_cfg.get('technique', DEF_TECHNIQUE)
+        self.technique = technique_opt.lower()
+        """The mask technique (default :const:`DEF_TECHNIQUE`)."""
+
         wf_kws = ['crop_posterior']
-        wf_opts = {k: opts.pop(k) for k in wf_kws if k in wf_kws}
+        wf_opts = {k: opts.pop(k) for k in wf_kws if k in opts}
         self.workflow = self._create_workflow(**wf_opts)
         """The mask creation workflow."""
 
@@ -127,7 +184,7 @@ class MaskWorkflow(WorkflowBase):
             (default False)
         :return: the Workflow object
         """
-        self.logger.debug('Building the mask workflow...')
+        self.logger.debug("Building the %s mask workflow..." % self.technique)
         workflow = pe.Workflow(name='mask', base_dir=self.base_dir)
 
         # The workflow input.
@@ -135,6 +192,48 @@ class MaskWorkflow(WorkflowBase):
         input_spec = pe.Node(IdentityInterface(fields=in_fields),
                              name='input_spec')
 
+        # The mask creation subgraph.
+        if self.technique == 'fsl':
+            mask = self._create_fsl_mask(workflow, input_spec, **opts)
+        elif self.technique == 'numpy':
+            mask = self._create_numpy_mask(workflow, input_spec, **opts)
+        else:
+            raise PipelineError("Mask technique not recognized: %s" %
+                                self.technique)
+
+        # Upload the mask to XNAT.
+        upload_mask_xfc = XNATUpload(project=self.project, resource=MASK_RESOURCE,
+                                     modality='MR')
+        upload_mask = pe.Node(upload_mask_xfc, name='upload_mask')
+        workflow.connect(input_spec, 'subject', upload_mask, 'subject')
+        workflow.connect(input_spec, 'session', upload_mask, 'session')
+        workflow.connect(input_spec, 'scan', upload_mask, 'scan')
+        workflow.connect(mask, 'out_file', upload_mask, 'in_files')
+
+        # The output is the mask file path.
+        output_spec = pe.Node(IdentityInterface(fields=['out_file']),
+                                                name='output_spec')
+        workflow.connect(mask, 'out_file', output_spec, 'out_file')
+
+        self._configure_nodes(workflow)
+
+        self.logger.debug("Created the %s workflow." % workflow.name)
+        # If debug is set, then diagram the workflow graph.
+        if self.logger.level <= logging.DEBUG:
+            self.depict_workflow(workflow)
+
+        return workflow
+
+    def _create_fsl_mask(self, workflow, input_spec, **opts):
+        """
+        Adds the FSL and ``mri_volcluster`` mask nodes to the given
+        workflow.
+
+        :param workflow: the mask workflow
+        :param input_spec: the mask workflow input node
+        :param opts: the :meth:`_create_workflow` options
+        :return: the node with the mask *out_file* output field
+        """
         # The node to find large clusters of empty space.
         cluster_mask = pe.Node(MriVolCluster(), name='cluster_mask')
 
@@ -173,28 +272,34 @@ class MaskWorkflow(WorkflowBase):
         workflow.connect(input_spec, 'out_file', inv_mask, 'out_file')
         workflow.connect(binarize, 'out_file', inv_mask, 'in_file')
 
-        # Upload the mask to XNAT.
-        upload_mask_xfc = XNATUpload(project=self.project, resource=MASK_RESOURCE,
-                                     modality='MR')
-        upload_mask = pe.Node(upload_mask_xfc, name='upload_mask')
-        workflow.connect(input_spec, 'subject', upload_mask, 'subject')
-        workflow.connect(input_spec, 'session', upload_mask, 'session')
-        workflow.connect(input_spec, 'scan', upload_mask, 'scan')
-        workflow.connect(inv_mask, 'out_file', upload_mask, 'in_files')
-
-        # The output is the mask file path.
-        output_spec = pe.Node(IdentityInterface(fields=['out_file']),
-                                                name='output_spec')
-        workflow.connect(inv_mask, 'out_file', output_spec, 'out_file')
+        return inv_mask
 
-        self._configure_nodes(workflow)
-
-        self.logger.debug("Created the %s workflow." % workflow.name)
-        # If debug is set, then diagram the workflow graph.
-        if self.logger.level <= logging.DEBUG:
-            self.depict_workflow(workflow)
-
-        return workflow
+    def _create_numpy_mask(self, workflow, input_spec, **opts):
+        """
+        Adds the in-process mask node to the given workflow. The
+        cluster parameters are taken from the ``MriVolCluster``
+        configuration, so that both techniques share the same
+        settings.
+
+        :param workflow: the mask workflow
+        :param input_spec: the mask workflow input node
+        :param opts: the :meth:`_create_workflow` options
+        :return: the node with the mask *out_file* output field
+        """
+        in_fields = ['time_series', 'out_file', 'crop_posterior']
+        in_fields.extend(MRI_VOLCLUSTER_PARAMS)
+        create_mask_xfc = Function(input_names=in_fields,
+                                   output_names=['out_file'],
+                                   function=_create_mask)
+        create_mask = pe.Node(create_mask_xfc, name='create_mask')
+        create_mask.inputs.crop_posterior = not not opts.get('crop_posterior')
+        cluster_cfg = self._interface_configuration(MriVolCluster) or {}
+        for param in MRI_VOLCLUSTER_PARAMS:
+            setattr(create_mask.inputs, param, cluster_cfg.get(param))
+        workflow.connect(input_spec, 'time_series', create_mask, 'time_series')
+        workflow.connect(input_spec, 'out_file', create_mask, 'out_file')
+
+        return create_mask
 
 
 def _gen_crop_option_string(cog):
@@ -203,3 +308,27 @@ def _gen_crop_option_string(cog):
     :return: the crop -roi option
     """
     return "-roi 0 -1 %d -1 0 -1 0 -1" % cog[1]
+
+
+def _create_mask(time_series, out_file, crop_posterior, min_thresh=None,
+                 max_thresh=None, min_size=None, min_voxels=None):
+    """
+    :meth:`qipipe.helpers.mask.create_mask` wrapper.
+
+    :param time_series: the input 4D NIfTI time series
+    :param out_file: the output mask file path
+    :param crop_posterior: the crop posterior flag
+    :param min_thresh: the cluster minimum intensity (default 0)
+    :param max_thresh: the cluster maximum intensity
+    :param min_size: the minimum cluster size in mm\ :sup:`3`
+    :param min_voxels: the minimum number of voxels in a cluster
+    :return: the mask file path
+    """
+    from qipipe.helpers.mask import create_mask
+
+    if min_thresh is None:
+        min_thresh = 0.0
+
+    return create_mask(time_series, out_file, crop_posterior=crop_posterior,
+                       min_thresh=min_thresh, max_thresh=max_thresh,
+                       min_size=min_size, min_voxels=min_voxels)
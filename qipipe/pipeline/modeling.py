@@ -19,14 +19,15 @@ on_rtd = os.environ.get('READTHEDOCS') == 'True'
 if not on_rtd:
     from nipype.pipeline import engine as pe
     from nipype.interfaces import fsl
-    from nipype.interfaces.dcmstack import CopyMeta
     from nipype.interfaces.utility import (IdentityInterface, Function, Merge)
 import qiutil
 from ..helpers.bolus_arrival import (bolus_arrival_index, BolusArrivalError)
+from ..helpers import stage_cache
 from ..helpers.logging import logger
 from ..helpers.constants import CONF_DIR
 from ..interfaces import (
-    DceToR1, Fastfit, StickyIdentityInterface, Copy, XNATUpload, XNATFind
+    DceToR1, StickyIdentityInterface, Copy, CopyHeaderMeta,
+    XNATUpload, XNATDownload, XNATFind
 )
 from .workflow_base import WorkflowBase
 from .pipeline_error import PipelineError
@@ -49,6 +50,12 @@ FASTFIT_CONF_PROPS = ['model_name', 'optimization_params', 'optional_outs']
 FXL_MODEL_PREFIX = 'ext_tofts.'
 """The Fastfit Standard TOFTS model prefix."""
 
+DEF_CHUNKS = 1
+"""The default number of independently fit Fastfit voxel chunks."""
+
+PRIOR_FILE_PAT = 'fxl_*.nii.gz'
+"""The warm start prior modeling resource parameter map file pattern."""
+
 class ModelingError(Exception):
     pass
 
@@ -63,16 +70,52 @@ def run(subject, session, scan, time_series, **opts):
     :param scan: input scan
     :param time_series: the input 4D NIfTI time series
     :param opts: the :class:`qipipe.pipeline.modeling.ModelingWorkflow`
-        initializer and run options
+        initializer and run options, as well as the following keyword
+        option:
+    :keyword force: flag indicating whether to model the time series
+         even if there is a :mod:`qipipe.helpers.stage_cache` result
+         for the same input (default False). A reused result is
+         uploaded to its prior XNAT modeling resource again, if it
+         is no longer there.
     :return: the :meth:`qipipe.pipeline.modeling.ModelingWorkflow.run`
         result
     """
     run_opts = {key: opts.pop(key)
                 for key in ['bolus_arrival_index', 'mask', 'registration']
                 if key in opts}
+    force = opts.pop('force', False)
     wf = ModelingWorkflow(**opts)
-
-    return wf.run(subject, session, scan, time_series, **run_opts)
+    # Reuse the prior model of the same input, if possible.
+    if wf.dry_run:
+        return wf.run(subject, session, scan, time_series, **run_opts)
+    mask = run_opts.get('mask')
+    in_files = [time_series] + ([mask] if mask else [])
+    key_opts = sorted(item for item in opts.iteritems()
+                      if item[0] != 'base_dir')
+    cache_key = stage_cache.stage_key(
+        'modeling', in_files, wf.configuration, wf.project, subject,
+        session, scan, run_opts.get('bolus_arrival_index'), key_opts
+    )
+    cached = None if force else stage_cache.lookup('modeling', cache_key)
+    if cached:
+        resource = cached['resource']
+        wf.logger.debug("Reusing the %s %s scan %d modeling resource %s." %
+                        (subject, session, scan, resource))
+        # Restore the XNAT modeling resource, if necessary.
+        profile = os.path.join(wf.base_dir, "%s.cfg" % resource)
+        create_profile(wf.technique, time_series, wf.configuration,
+                       wf.profile_sections, profile)
+        rsc_files = [profile] + [value for value in
+                                 cached['results'].itervalues()
+                                 if os.path.isfile(value)]
+        wf._restore_resource(subject, session, scan, resource, rsc_files)
+        return cached['results']
+    results = wf.run(subject, session, scan, time_series, **run_opts)
+    if results:
+        stage_cache.store('modeling', cache_key,
+                          dict(resource=wf.resource, results=results))
+
+    return results
 
 
 class ModelingWorkflow(WorkflowBase):
@@ -194,6 +237,9 @@ class ModelingWorkflow(WorkflowBase):
             fixed |R10| option is not set
         :keyword base_end: the number of volumes to merge into a R1
             series baseline image (default is 1)
+        :keyword chunks: the number of voxel :attr:`chunks`
+        :keyword warm_start: the prior modeling XNAT resource name
+            described in :attr:`warm_start`
         """
         super(ModelingWorkflow, self).__init__(__name__, **opts)
 
@@ -201,7 +247,48 @@ class ModelingWorkflow(WorkflowBase):
         if not technique_opt:
             raise PipelineError('The modeling technique was not specified.')
         self.technique = technique_opt.lower()
-        """The modeling technique. Built-in techniques include ``mock``."""
+        """
+        The modeling technique. Built-in techniques include ``airc``,
+        ``numpy`` and ``mock``.
+        """
+
+        chunks_opt = opts.pop('chunks', None)
+        if not chunks_opt:
+            mdl_cfg = self.configuration.get('Modeling', {})
+            chunks_opt = mdl_cfg.get('chunks', DEF_CHUNKS)
+        if chunks_opt < 1:
+            raise PipelineError("The modeling chunk count is not a positive"
+                                " number: %s" % chunks_opt)
+        self.chunks = chunks_opt
+        """
+        The number of masked voxel chunks which are fit independently
+        by the ``airc`` technique (default :const:`DEF_CHUNKS`). The
+        chunk count is set by the *chunks* initialization option or
+        the configuration ``Modeling`` section ``chunks`` option.
+        If there is more than one chunk, then each chunk is fit in a
+        separate ``fastfit`` node and the chunk parameter maps are
+        stitched back into full-size maps.
+        """
+
+        warm_start_opt = opts.pop('warm_start', None)
+        if warm_start_opt and not warm_start_opt.startswith(MODELING_PREFIX):
+            raise PipelineError("The warm start resource is not a modeling"
+                                " resource: %s" % warm_start_opt)
+        self.warm_start = warm_start_opt
+        """
+        The optional prior modeling XNAT resource of the modeled scan.
+        If this option is set, then the prior fit parameter maps are
+        the per-voxel starting point of the ``numpy`` technique fit.
+        A refit after a small change, e.g. to the AIF parameters,
+        then converges in a few iterations. The prior resource can be
+        either an ``airc`` standard Tofts or a ``numpy`` extended Tofts
+        fit.
+
+        The prior resource is looked up in the same subject, session
+        and scan as the modeled time series. A prior fit of another
+        visit, e.g. the previous session, is not supported, since its
+        voxels are not registered to the modeled scan.
+        """
 
         self.resource = self._generate_resource_name()
         """
@@ -341,6 +428,8 @@ class ModelingWorkflow(WorkflowBase):
         #
         if self.technique == 'airc':
             child_wf = self._create_airc_workflow(**opts)
+        elif self.technique == 'numpy':
+            child_wf = self._create_numpy_workflow(**opts)
         elif self.technique == 'mock':
             child_wf = self._create_mock_workflow(**opts)
         elif self.technique:
@@ -363,6 +452,19 @@ class ModelingWorkflow(WorkflowBase):
         exec_wf.connect(input_spec, 'bolus_arrival_index',
                         child_wf, 'input_spec.bolus_arrival_index')
 
+        # Download the warm start prior fit parameter maps. The mock
+        # technique ignores the warm start.
+        if self.warm_start and self.technique != 'mock':
+            dl_prior_xfc = XNATDownload(project=self.project,
+                                        resource=self.warm_start,
+                                        file=PRIOR_FILE_PAT)
+            dl_prior = pe.Node(dl_prior_xfc, name='download_prior')
+            exec_wf.connect(input_spec, 'subject', dl_prior, 'subject')
+            exec_wf.connect(input_spec, 'session', dl_prior, 'session')
+            exec_wf.connect(input_spec, 'scan', dl_prior, 'scan')
+            exec_wf.connect(dl_prior, 'out_files',
+                            child_wf, 'input_spec.prior_maps')
+
         # Make the profile.
         cr_prf_fields = ['technique', 'time_series', 'configuration',
                          'sections', 'dest']
@@ -455,6 +557,13 @@ class ModelingWorkflow(WorkflowBase):
         """
         self.logger.debug('Building the AIRC modeling workflow...')
         workflow = pe.Workflow(name='airc', base_dir=self.base_dir)
+        if self.warm_start:
+            raise ModelingError('The airc modeling technique does not'
+                                ' support a warm start, since fastfit'
+                                ' does not accept per-voxel initial values')
+        # The proprietary Fastfit interface is only imported for
+        # this technique, as described in qipipe.interfaces.
+        from ..interfaces.fastfit import Fastfit
 
         # The modeling profile configuration sections.
         self.profile_sections = OHSU_CONF_SECTIONS
@@ -514,7 +623,7 @@ class ModelingWorkflow(WorkflowBase):
             #workflow.connect(get_r1_0, 'r1_0_map', r1_series, 'r1_0')
 
         # Copy the time series meta-data to the R1 series.
-        copy_meta = pe.Node(CopyMeta(), name='copy_meta')
+        copy_meta = pe.Node(CopyHeaderMeta(), name='copy_meta')
         copy_meta.inputs.include_classes = [('global', 'const'),
                                             ('time', 'samples')]
         workflow.connect(input_spec, 'time_series', copy_meta, 'src_file')
@@ -552,27 +661,66 @@ class ModelingWorkflow(WorkflowBase):
                                 ' Fastfit topic')
         fastfit_opts = {opt: fastfit_cfg[opt] for opt in FASTFIT_CONF_PROPS
                         if opt in fastfit_cfg}
+        # The mandatory fastfit output fields.
+        mandatory_outs = fastfit_opts.get('optimization_params', [])
+        # The optional fastfit output fields.
+        optional_outs = fastfit_opts.get('optional_outs', [])
+        # All fastfit output fields.
+        fastfit_outs = mandatory_outs + optional_outs
+
         # The pharmacokinetic model optimizer.
         fastfit = pe.Node(Fastfit(**fastfit_opts), name='fastfit')
         workflow.connect(copy_meta, 'dest_file', fastfit, 'in_file')
-        workflow.connect(input_spec, 'mask', fastfit, 'mask')
         workflow.connect(fit_params, 'params_csv', fastfit, 'other_params_csv')
+        if self.chunks > 1:
+            # Fit each masked voxel chunk in a separate fastfit node.
+            iter_chunk_xfc = IdentityInterface(fields=['chunk'])
+            iter_chunk = pe.Node(iter_chunk_xfc, name='iter_chunk')
+            iter_chunk.iterables = ('chunk', range(self.chunks))
+            chunk_mask_flds = ['time_series', 'chunk', 'chunks', 'mask']
+            chunk_mask_xfc = Function(input_names=chunk_mask_flds,
+                                      output_names=['out_file'],
+                                      function=make_chunk_mask)
+            chunk_mask = pe.Node(chunk_mask_xfc, name='chunk_mask')
+            chunk_mask.inputs.chunks = self.chunks
+            workflow.connect(input_spec, 'time_series',
+                             chunk_mask, 'time_series')
+            workflow.connect(input_spec, 'mask', chunk_mask, 'mask')
+            workflow.connect(iter_chunk, 'chunk', chunk_mask, 'chunk')
+            workflow.connect(chunk_mask, 'out_file', fastfit, 'mask')
+            # Stitch the chunk maps together. The {fastfit output:
+            # (node, field)} dictionary holds the full-size map sources.
+            fit_srcs = {}
+            for fld in fastfit_outs:
+                stitch_xfc = Function(
+                    input_names=['in_files', 'masks', 'out_base_name'],
+                    output_names=['out_file'], function=stitch_chunks
+                )
+                # Nipype node names cannot include a period.
+                stitch_name = "stitch_%s" % fld.replace('.', '_')
+                stitch = pe.JoinNode(stitch_xfc, joinsource='iter_chunk',
+                                     joinfield=['in_files', 'masks'],
+                                     name=stitch_name)
+                stitch.inputs.out_base_name = "%s_map.nii.gz" % fld
+                workflow.connect(fastfit, fld, stitch, 'in_files')
+                workflow.connect(chunk_mask, 'out_file', stitch, 'masks')
+                fit_srcs[fld] = (stitch, 'out_file')
+        else:
+            workflow.connect(input_spec, 'mask', fastfit, 'mask')
+            fit_srcs = {fld: (fastfit, fld) for fld in fastfit_outs}
 
         # Compute the Ktrans difference.
         delta_k_trans = pe.Node(fsl.ImageMaths(), name='delta_k_trans')
         delta_k_trans.inputs.op_string = '-sub'
-        workflow.connect(fastfit, 'k_trans', delta_k_trans, 'in_file')
-        workflow.connect(fastfit, 'ext_tofts.k_trans',
+        fxr_k_trans_node, fxr_k_trans_fld = fit_srcs['k_trans']
+        workflow.connect(fxr_k_trans_node, fxr_k_trans_fld,
+                         delta_k_trans, 'in_file')
+        fxl_k_trans_node, fxl_k_trans_fld = fit_srcs['ext_tofts.k_trans']
+        workflow.connect(fxl_k_trans_node, fxl_k_trans_fld,
                          delta_k_trans, 'in_file2')
 
         # The non-fastfit output fields.
         non_fastfit_outs = ['r1_series', 'params_csv', 'delta_k_trans']
-        # The mandatory fastfit output fields.
-        mandatory_outs = fastfit_opts.get('optimization_params', [])
-        # The optional fastfit output fields.
-        optional_outs = fastfit_opts.get('optional_outs', [])
-        # All fastfit output fields.
-        fastfit_outs = mandatory_outs + optional_outs
         # All upstream output fields.
         upsteam_outs = non_fastfit_outs + fastfit_outs
 
@@ -613,11 +761,134 @@ class ModelingWorkflow(WorkflowBase):
             out_base_name = "%s.nii.gz" % out_fld
             copy_xfc = Copy(out_base_name=out_base_name)
             copy = pe.Node(copy_xfc, name=node_name)
-            workflow.connect(fastfit, fastfit_fld, copy, 'in_file')
+            src_node, src_fld = fit_srcs[fastfit_fld]
+            workflow.connect(src_node, src_fld, copy, 'in_file')
             workflow.connect(copy, 'out_file', output_spec, out_fld)
         # Collect the other fastfit outputs.
         for fld in other_fastfit_outs:
-            workflow.connect(fastfit, fld, output_spec, fld)
+            src_node, src_fld = fit_srcs[fld]
+            workflow.connect(src_node, src_fld, output_spec, fld)
+
+        self._configure_nodes(workflow)
+
+        return workflow
+
+    def _create_numpy_workflow(self, **opts):
+        """
+        Creates the in-process extended Tofts modeling base workflow.
+        This workflow is the counterpart of the ``airc`` workflow
+        standard Tofts model fit which does not require the proprietary
+        OHSU ``dce_to_r1`` and ``fastfit`` programs, as described in
+        :mod:`qipipe.helpers.tofts`. The shutter speed model is not
+        supported. Consequently, the outputs are the following subset
+        of the ``airc`` outputs:
+
+        - `r1_series`, `params_csv`, `fxl_k_trans`, `fxl_v_e` and
+          `fxl_chisq`
+
+        as well as the extended Tofts `fxl_v_p` plasma volume fraction.
+
+        The intermediate time series and R1 series are
+        :mod:`qipipe.helpers.compact` mask-compacted arrays, so that
+        the intermediate I/O and memory use are proportional to the
+        masked tissue volume rather than the field of view. Only the
+        workflow outputs are expanded to full-size NIfTI images.
+
+        :param opts: the PK modeling parameters
+        :return: the Nipype Workflow
+        """
+        self.logger.debug('Building the numpy modeling workflow...')
+        workflow = pe.Workflow(name='numpy', base_dir=self.base_dir)
+
+        # The modeling profile configuration sections.
+        self.profile_sections = ['R1', 'AIF']
+
+        # The PK modeling parameters.
+        r1_opts = self._r1_parameters(**opts)
+        if r1_opts.get('r1_0_val') == None:
+            raise ModelingError('The numpy modeling technique requires a'
+                                ' fixed r1_0_val')
+
+        # Set up the input node. The prior_maps input is the
+        # warm start prior fit parameter maps.
+        non_r1_flds = ['time_series', 'mask', 'bolus_arrival_index',
+                       'prior_maps']
+        in_fields = non_r1_flds + r1_opts.keys()
+        input_xfc = IdentityInterface(fields=in_fields)
+        input_spec = pe.Node(input_xfc, name='input_spec')
+        for field in non_r1_flds:
+            if field in opts:
+                setattr(input_spec.inputs, field, opts[field])
+        for field, value in r1_opts.iteritems():
+            setattr(input_spec.inputs, field, value)
+
+        # Compact the masked time series voxels.
+        compact_ts_xfc = Function(input_names=['in_file', 'mask'],
+                                  output_names=['out_file'],
+                                  function=compact_image)
+        compact_ts = pe.Node(compact_ts_xfc, name='compact_time_series')
+        workflow.connect(input_spec, 'time_series', compact_ts, 'in_file')
+        workflow.connect(input_spec, 'mask', compact_ts, 'mask')
+
+        # Convert the compacted DCE time series to R1.
+        r1_series_flds = ['time_series', 'in_file', 'r1_0_val', 'base_end']
+        r1_series_xfc = Function(input_names=r1_series_flds,
+                                 output_names=['out_file'],
+                                 function=make_r1_series)
+        r1_series = pe.Node(r1_series_xfc, name='r1_series')
+        workflow.connect(input_spec, 'time_series', r1_series, 'time_series')
+        workflow.connect(compact_ts, 'out_file', r1_series, 'in_file')
+        workflow.connect(input_spec, 'r1_0_val', r1_series, 'r1_0_val')
+        workflow.connect(input_spec, 'base_end', r1_series, 'base_end')
+
+        # Expand the R1 series for upload. The expanded R1 series
+        # retains the time series meta-data.
+        expand_r1_xfc = Function(input_names=['in_file', 'reference'],
+                                 output_names=['out_file'],
+                                 function=expand_image)
+        expand_r1 = pe.Node(expand_r1_xfc, name='expand_r1_series')
+        workflow.connect(r1_series, 'out_file', expand_r1, 'in_file')
+        workflow.connect(input_spec, 'time_series', expand_r1, 'reference')
+
+        # Get the pharmacokinetic mapping parameters.
+        aif_shift_flds = ['time_series', 'bolus_arrival_index']
+        aif_shift_xfc = Function(input_names=aif_shift_flds,
+                                 output_names=['aif_shift'],
+                                 function=get_aif_shift)
+        aif_shift = pe.Node(aif_shift_xfc, name='get_aif_shift')
+        workflow.connect(input_spec, 'time_series', aif_shift, 'time_series')
+        workflow.connect(input_spec, 'bolus_arrival_index',
+                         aif_shift, 'bolus_arrival_index')
+        fit_params_flds = ['cfg_file', 'aif_shift']
+        fit_params_xfc = Function(input_names=fit_params_flds,
+                                  output_names=['params_csv'],
+                                  function=get_fit_params)
+        fit_params = pe.Node(fit_params_xfc, name='fit_params')
+        fit_params.inputs.cfg_file = os.path.join(CONF_DIR, MODELING_CONF_FILE)
+        workflow.connect(aif_shift, 'aif_shift', fit_params, 'aif_shift')
+
+        # Fit the extended Tofts model.
+        fit_flds = ['time_series', 'r1_series', 'params_csv', 'r1_0_val',
+                    'prior_maps']
+        fit_outs = ['fxl_k_trans', 'fxl_v_e', 'fxl_v_p', 'fxl_chisq']
+        fit_xfc = Function(input_names=fit_flds, output_names=fit_outs,
+                           function=fit_tofts)
+        fit = pe.Node(fit_xfc, name='fit_tofts')
+        workflow.connect(input_spec, 'time_series', fit, 'time_series')
+        workflow.connect(r1_series, 'out_file', fit, 'r1_series')
+        workflow.connect(fit_params, 'params_csv', fit, 'params_csv')
+        workflow.connect(input_spec, 'r1_0_val', fit, 'r1_0_val')
+        if self.warm_start:
+            workflow.connect(input_spec, 'prior_maps', fit, 'prior_maps')
+
+        # Collect the outputs.
+        output_fields = ['r1_series', 'params_csv'] + fit_outs
+        output_spec = pe.Node(IdentityInterface(fields=output_fields),
+                              name='output_spec')
+        workflow.connect(expand_r1, 'out_file', output_spec, 'r1_series')
+        workflow.connect(fit_params, 'params_csv', output_spec, 'params_csv')
+        for field in fit_outs:
+            workflow.connect(fit, field, output_spec, field)
 
         self._configure_nodes(workflow)
 
@@ -783,6 +1054,11 @@ def make_baseline(time_series, base_end):
     """
     Makes the R1_0 computation baseline NIfTI file.
 
+    Only the first *base_end* volumes are read from the time series.
+    The baseline is not cached, since a cache key which detects a
+    changed time series would read at least as much of the time
+    series as the baseline itself.
+
     :param time_series: the modeling input 4D NIfTI image file path
     :param base_end: the exclusive limit of the baseline
         computation input series
@@ -791,27 +1067,42 @@ def make_baseline(time_series, base_end):
     """
     import os
     import nibabel as nb
+    import numpy as np
     from dcmstack.dcmmeta import NiftiWrapper
+    from qipipe.pipeline.modeling import ModelingError
 
     if base_end <= 0:
         raise ModelingError("The R1_0 computation baseline end index"
                             " input value is not a positive number:"
                             " %s" % base_end)
+
+    out_file = os.path.join(os.getcwd(), 'baseline.nii.gz')
+    # Wrapping the time series parses the header DcmMeta extension
+    # but does not read the image data.
     ts_nii = nb.load(time_series)
     ts_nw = NiftiWrapper(ts_nii)
-
+    # The volume header template without the time series extension.
+    vol_hdr = ts_nii.header.copy()
+    vol_hdr.set_data_shape(ts_nii.shape[:3])
+    del vol_hdr.extensions[:]
+
+    # Read only the baseline volumes. The volumes are at the start of
+    # the data block, so a compressed image is decompressed only as far
+    # as the last baseline volume.
     baselines = []
-    for idx, split_nii in enumerate(ts_nw.split()):
-        if idx == base_end:
-            break
-        baselines.append(split_nii)
+    for idx in range(min(base_end, ts_nii.shape[3])):
+        vol_data = np.asanyarray(ts_nii.dataobj[..., idx])
+        vol_nii = nb.Nifti1Image(vol_data, ts_nii.affine, vol_hdr.copy())
+        vol_nw = NiftiWrapper(vol_nii, make_empty=True)
+        if ts_nw.meta_ext:
+            vol_nw.replace_extension(ts_nw.meta_ext.get_subset(3, idx))
+        baselines.append(vol_nw)
 
     if len(baselines) == 1:
         baseline_nw = baselines[0]
     else:
         baseline_nw = NiftiWrapper.from_sequence(baselines)
 
-    out_file = os.path.join(os.getcwd(), 'baseline.nii.gz')
     nb.save(baseline_nw, out_file)
 
     return out_file
@@ -819,9 +1110,8 @@ def make_baseline(time_series, base_end):
 def get_r1_0(pdw_file, t1w_file, max_r1_0, mask=None):
     """
     Returns the R1_0 map NIfTI file from the given proton density
-    and T1-weighted images. The R1_0 map is computed using the
-    ``pdw_t1w_to_r1`` function. The ``pdw_t1w_to_r1`` module
-    must be in the Python path.
+    and T1-weighted images. The R1_0 map is computed as described
+    in :meth:`qipipe.helpers.r1.make_r1_0_map`.
 
     :param pdw_file: the proton density NIfTI image file path
     :param t1w_file: the T1-weighted image file path
@@ -830,26 +1120,11 @@ def get_r1_0(pdw_file, t1w_file, max_r1_0, mask=None):
     :return: the R1_0 map NIfTI image file path
     """
     import os
-    import nibabel as nb
-    import numpy as np
-    from pdw_t1w_to_r1 import pdw_t1w_to_r1
-    from dcmstack.dcmmeta import NiftiWrapper
+    from qipipe.helpers.r1 import make_r1_0_map
 
-    pdw_nii = nb.load(pdw_file)
-    pdw_nw = NiftiWrapper(pdw_nii, make_empty=True)
-    t1w_nw = NiftiWrapper(nb.load(t1w_file), make_empty=True)
-    r1_space = np.arange(0.01, max_r1_0, 0.01)
-    pdw_opts = {}
-    if mask:
-        pdw_opts['mask'] = nb.load(mask).get_data()
-    r1_0_arr = pdw_t1w_to_r1(pdw_nw, t1w_nw, r1_space=r1_space, **pdw_opts)
+    out_file = os.path.join(os.getcwd(), 'r1_0_map.nii.gz')
 
-    cwd = os.getcwd()
-    r1_0_nii = nb.Nifti1Image(r1_0_arr, pdw_nii.affine)
-    out_file = os.path.join(cwd, 'r1_0_map.nii.gz')
-    nb.save(r1_0_nii, out_file)
-
-    return out_file
+    return make_r1_0_map(pdw_file, t1w_file, out_file, max_r1_0, mask=mask)
 
 
 def get_aif_shift(time_series, bolus_arrival_index):
@@ -862,20 +1137,18 @@ def get_aif_shift(time_series, bolus_arrival_index):
     and *t*\ :sub:`arrival` averages the acquisition times at
     and immediately following bolus arrival.
 
+    Only the NIfTI header and DcmMeta extension are read, as described
+    in :meth:`qipipe.helpers.header.wrap_header`.
+
     :param time_series: the modeling input 4D NIfTI image file path
     :param bolus_arrival_index: the bolus uptake series index
     :return: the parameter CSV file path
     """
-    import os
-    import csv
-    import nibabel as nb
-    import numpy as np
-    from dcmstack.dcmmeta import NiftiWrapper
     from dcmstack import dcm_time_to_sec
+    from qipipe.helpers.header import wrap_header
 
-    # Load the time series into a NIfTI wrapper.
-    ts_nii = nb.load(time_series)
-    ts_nw = NiftiWrapper(ts_nii)
+    # Wrap the time series header meta-data.
+    ts_nw = wrap_header(time_series)
 
     # The AIF shift parameter is the offset of the bolus arrival
     # series mid-point acquisition time from the MR session start
@@ -946,6 +1219,151 @@ def get_fit_params(cfg_file, aif_shift):
     return os.path.join(os.getcwd(), FASTFIT_PARAMS_FILE)
 
 
+def compact_image(in_file, mask=None):
+    """
+    :meth:`qipipe.helpers.compact.compact` wrapper.
+
+    :param in_file: the NIfTI image file path
+    :param mask: the optional mask file path
+    :return: the compacted image file path
+    """
+    import os
+    from qipipe.helpers import compact
+
+    out_file = os.path.join(os.getcwd(), 'compact.npy')
+
+    return compact.compact(in_file, out_file, mask=mask)
+
+
+def expand_image(in_file, reference):
+    """
+    :meth:`qipipe.helpers.compact.expand_file` wrapper.
+
+    :param in_file: the compacted image file path
+    :param reference: the reference NIfTI image file path
+    :return: the expanded NIfTI image file path
+    """
+    import os
+    from qipipe.helpers import compact
+
+    base_name, _ = os.path.splitext(os.path.basename(in_file))
+    out_file = os.path.join(os.getcwd(), base_name + '.nii.gz')
+
+    return compact.expand_file(in_file, reference, out_file)
+
+
+def make_r1_series(time_series, in_file, r1_0_val, base_end):
+    """
+    :meth:`qipipe.helpers.tofts.make_r1_series` wrapper.
+
+    :param time_series: the modeling input time series file path
+    :param in_file: the compacted time series file path
+    :param r1_0_val: the fixed pre-contrast R1 value
+    :param base_end: the number of baseline volumes
+    :return: the compacted R1 series file path
+    """
+    import os
+    from qipipe.helpers import tofts
+
+    out_file = os.path.join(os.getcwd(), 'r1_series.npy')
+
+    return tofts.make_r1_series(time_series, in_file, out_file, r1_0_val,
+                                base_end)
+
+
+def fit_tofts(time_series, r1_series, params_csv, r1_0_val,
+              prior_maps=None):
+    """
+    Fits the extended Tofts model to the R1 series, as described in
+    :meth:`qipipe.helpers.tofts.fit_r1_series`. The AIF and contrast
+    agent parameters are read from the :meth:`get_fit_params` CSV
+    file.
+
+    :param time_series: the modeling input time series file path
+    :param r1_series: the compacted R1 series file path
+    :param params_csv: the fit parameters CSV file path
+    :param r1_0_val: the fixed pre-contrast R1 value
+    :param prior_maps: the optional warm start prior ``fxl_k_trans``,
+        ``fxl_v_e`` and, if available, ``fxl_v_p`` map file paths
+    :return: the (k_trans, v_e, v_p, chisq) map file paths
+    """
+    import os
+    import csv
+    from qipipe.helpers import tofts
+
+    # The {name: values} parameter dictionary.
+    params = {}
+    with open(params_csv) as csv_file:
+        for row in csv.reader(csv_file):
+            if row:
+                params[row[0]] = row[1:]
+
+    def param_value(name, default=None):
+        values = params.get(name)
+        return float(values[0]) if values else default
+
+    aif_params = [float(v) for v in params['aif_params']]
+    times = tofts.acquisition_times(time_series,
+                                    delta_t=param_value('aif_delta_t'))
+    cwd = os.getcwd()
+    out_files = {param: os.path.join(cwd, "fxl_%s.nii.gz" % param)
+                 for param in ['k_trans', 'v_e', 'v_p', 'chisq']}
+    # The prior {parameter: map} dictionary.
+    priors = {}
+    for location in prior_maps or []:
+        param = os.path.basename(location).split('.')[0][len('fxl_'):]
+        if param in ['k_trans', 'v_e', 'v_p']:
+            priors[param] = location
+    # A standard Tofts prior fit has no v_p map.
+    if prior_maps and not {'k_trans', 'v_e'} <= set(priors):
+        raise ValueError("The warm start prior maps are incomplete: %s" %
+                         prior_maps)
+    tofts.fit_r1_series(
+        r1_series, time_series, times, r1_0_val, param_value('r1_cr'),
+        aif_params, out_files, aif_scale=param_value('aif_scale', 1.0),
+        aif_shift=param_value('aif_shift', 0.0), prior_maps=priors
+    )
+
+    return tuple(out_files[param]
+                 for param in ['k_trans', 'v_e', 'v_p', 'chisq'])
+
+
+def make_chunk_mask(time_series, chunk, chunks, mask=None):
+    """
+    :meth:`qipipe.helpers.chunk.make_chunk_mask` wrapper.
+
+    :param time_series: the modeling input time series file path
+    :param chunk: the zero-based chunk index
+    :param chunks: the number of chunks
+    :param mask: the optional modeling mask file path
+    :return: the chunk mask file path
+    """
+    import os
+    from qipipe.helpers import chunk as chunking
+
+    out_file = os.path.join(os.getcwd(), "chunk_%d_mask.nii.gz" % chunk)
+
+    return chunking.make_chunk_mask(time_series, chunk, chunks, out_file,
+                                    mask=mask)
+
+
+def stitch_chunks(in_files, masks, out_base_name):
+    """
+    :meth:`qipipe.helpers.chunk.stitch_chunks` wrapper.
+
+    :param in_files: the chunk Fastfit parameter map file paths
+    :param masks: the corresponding chunk mask file paths
+    :param out_base_name: the output file base name
+    :return: the stitched parameter map file path
+    """
+    import os
+    from qipipe.helpers import chunk as chunking
+
+    out_file = os.path.join(os.getcwd(), out_base_name)
+
+    return chunking.stitch_chunks(in_files, masks, out_file)
+
+
 def associate(names, values):
     """
     Captures the synchronized *names* and *values* in a
@@ -19,6 +19,7 @@ import qixnat
 from qixnat.helpers import path_hierarchy
 from ..helpers.logging import logger
 from . import (staging, registration, modeling)
+from .roi import ROI_RESOURCE
 from .pipeline_error import PipelineError
 from .workflow_base import WorkflowBase
 from . import staging
@@ -39,6 +40,21 @@ MULTI_VOLUME_ACTIONS = (SINGLE_VOLUME_ACTIONS +
                         ['roi', 'register', 'model'])
 """The workflow actions which apply to a multi-volume scan."""
 
+MODELING_REGIONS = ['mask', 'roi']
+"""
+The modeling regions. The ``mask`` region is the scan mask. The
+``roi`` region is the union of the lesion ROI masks.
+"""
+
+ROI_FILE_PAT = 'lesion*.nii.gz'
+"""The XNAT ROI resource lesion mask file name pattern."""
+
+CACHED_STAGES = ['mask', 'bolus_arrival', 'register', 'model']
+"""
+The stages whose results are reused by a rerun on the same input,
+as described in :mod:`qipipe.helpers.stage_cache`.
+"""
+
 
 def run(*inputs, **opts):
     """
@@ -213,35 +229,95 @@ def _run_with_xnat_input(actions, *inputs, **opts):
     :param opts: the :class:`QIPipelineWorkflow` initializer options
     """
     for path in inputs:
-        hierarchy = dict(path_hierarchy(path))
-        prj = hierarchy.pop('project', None)
-        if not prj:
-            raise PipelineError("The XNAT path is missing a project: %s" % path)
-        # There might be a --pipeline command option.
-        # If so, it is either extraneous or conflicting.
-        prj_opt = opts.pop('project', None)
-        if prj_opt and prj_opt != prj:
-            raise PipelineError("The --project option %s conflicts with the"
-                                " XNAT path project %s" % (prj_opt, prj))
-        sbj = hierarchy.pop('subject', None)
-        if not sbj:
-            raise PipelineError("The XNAT path is missing a subject: %s" % path)
-        sess = hierarchy.pop('experiment', None)
-        if not sess:
-            raise PipelineError("The XNAT path is missing a session: %s" % path)
-        scan_s = hierarchy.pop('scan', None)
-        if not scan_s:
-            raise PipelineError("The XNAT path is missing a scan: %s" % path)
-        scan = int(scan_s)
-
-        # Fashion a scan_input from the hierarchy.
-        scan_input = Bunch(subject=sbj, session=sess, scan=scan)
+        prj, scan_input = _parse_scan_path(path, opts)
         # Make the workflow.
         workflow = QIPipelineWorkflow(prj, scan_input, actions, **opts)
         # Run the workflow.
         workflow.run_with_scan_download(prj, scan_input, actions)
 
 
+def quick_look(*inputs, **opts):
+    """
+    Estimates the motion of each given XNAT scan with the
+    :class:`qipipe.pipeline.registration.QuickLookWorkflow`, in order
+    to decide whether to run the full registration. Each input is a
+    XNAT scan path, e.g. ``/QIN/Breast012/Session03/scan/1``. The
+    scan NIfTI volumes and, if it exists, the scan mask are
+    downloaded from XNAT. Nothing is uploaded to XNAT.
+
+    :param inputs: the XNAT scan paths
+    :param opts: the :meth:`qipipe.pipeline.registration.quick_look`
+        options
+    :return: the {scan path: quick-look result} dictionary
+    """
+    # The work directory.
+    base_dir_opt = opts.pop('base_dir', None)
+    if base_dir_opt:
+        base_dir = os.path.abspath(base_dir_opt)
+    else:
+        base_dir = tempfile.mkdtemp()
+    results = {}
+    for path in inputs:
+        prj, scan_input = _parse_scan_path(path, opts)
+        dest = os.path.join(base_dir, scan_input.subject, scan_input.session,
+                            str(scan_input.scan))
+        with qixnat.connect() as xnat:
+            volumes = xnat.download(prj, scan_input.subject,
+                                    scan_input.session, scan=scan_input.scan,
+                                    resource='NIFTI', file='volume*.nii.gz',
+                                    dest=dest)
+            if not volumes:
+                raise PipelineError("The XNAT scan does not have NIfTI"
+                                    " volumes: %s" % path)
+            if _scan_file_exists(xnat, prj, scan_input, MASK_RESOURCE,
+                                 MASK_FILE):
+                mask = xnat.download(prj, scan_input.subject,
+                                     scan_input.session,
+                                     scan=scan_input.scan,
+                                     resource=MASK_RESOURCE, file=MASK_FILE,
+                                     dest=dest)[0]
+            else:
+                mask = None
+        results[path] = registration.quick_look(
+            volumes, project=prj, mask=mask, base_dir=dest, **opts
+        )
+
+    return results
+
+
+def _parse_scan_path(path, opts):
+    """
+    :param path: the XNAT scan path
+    :param opts: the pipeline options, whose *project* option, if
+        any, is removed
+    :return: the (project, scan_input) tuple
+    :raise PipelineError: if the path is not a XNAT scan path or
+        conflicts with the *project* option
+    """
+    hierarchy = dict(path_hierarchy(path))
+    prj = hierarchy.pop('project', None)
+    if not prj:
+        raise PipelineError("The XNAT path is missing a project: %s" % path)
+    # There might be a --pipeline command option.
+    # If so, it is either extraneous or conflicting.
+    prj_opt = opts.pop('project', None)
+    if prj_opt and prj_opt != prj:
+        raise PipelineError("The --project option %s conflicts with the"
+                            " XNAT path project %s" % (prj_opt, prj))
+    sbj = hierarchy.pop('subject', None)
+    if not sbj:
+        raise PipelineError("The XNAT path is missing a subject: %s" % path)
+    sess = hierarchy.pop('experiment', None)
+    if not sess:
+        raise PipelineError("The XNAT path is missing a session: %s" % path)
+    scan_s = hierarchy.pop('scan', None)
+    if not scan_s:
+        raise PipelineError("The XNAT path is missing a scan: %s" % path)
+    scan = int(scan_s)
+
+    # Fashion a scan_input from the hierarchy.
+    return prj, Bunch(subject=sbj, session=sess, scan=scan)
+
 
 def _scan_file_exists(xnat, project, scan_input, resource, file_pat=None):
     """
@@ -331,6 +407,13 @@ class QIPipelineWorkflow(WorkflowBase):
       resource is found, then that resource file is downloaded.
       Otherwise, the mask is created from the staged images.
 
+    - If the ``modeling_region`` option is ``roi``, then modeling is
+      restricted to the union of the lesion ROI masks, optionally
+      dilated by the ``roi_margin`` option. The ROI masks are created
+      by the ``roi`` action, if enabled, or downloaded from the XNAT
+      ``roi`` resource. The modeling outputs are full-size maps which
+      are zero outside of the ROI region.
+
     The workflow input node is *input_spec* with the following
     fields:
 
@@ -370,9 +453,29 @@ class QIPipelineWorkflow(WorkflowBase):
         :keyword registration_technique: the
             class:`qipipe.pipeline.registration.RegistrationWorkflow`
             technique
+        :keyword recursive_registration: flag indicating whether to
+            perform the chained registration described in
+            :class:`qipipe.pipeline.registration.RegisterScanWorkflow`
+        :keyword crop_registration: flag indicating whether to register
+            the images cropped to the mask bounding box, as described in
+            :class:`qipipe.pipeline.registration.RegisterImageWorkflow`
+        :keyword registration_cpus: the local registration CPU budget
+            described in
+            :class:`qipipe.pipeline.registration.RegisterScanWorkflow`
+        :keyword pipelined_registration: flag indicating whether to
+            register each volume as soon as it is staged, as described
+            in :class:`qipipe.pipeline.staging.ScanStagingWorkflow`
         :keyword modeling_resource: the modeling resource name
         :keyword modeling_technique: the
             class:`qipipe.pipeline.modeling.ModelingWorkflow` technique
+        :keyword modeling_region: the :const:`MODELING_REGIONS` voxels
+            to model (default ``mask``)
+        :keyword roi_margin: the number of voxels to dilate the ``roi``
+            modeling region (default 0)
+        :keyword warm_start: the prior modeling resource name to
+            warm-start the modeling fit
+        :keyword force_stages: the :const:`CACHED_STAGES` to recompute
+            even if there is a cached result for the same input
         :keyword scan_time_series: the scan time series resource name
         :keyword realigned_time_series: the registered time series resource
             name
@@ -405,6 +508,21 @@ class QIPipelineWorkflow(WorkflowBase):
         self.registration_technique = reg_tech
         """The registration technique."""
 
+        self.recursive_registration = opts.pop('recursive_registration',
+                                               False)
+        """Flag indicating whether to perform chained registration."""
+
+        self.crop_registration = opts.pop('crop_registration', False)
+        """Flag indicating whether to register the cropped images."""
+
+        reg_cpus_opt = opts.pop('registration_cpus', None)
+        self.registration_cpus = int(reg_cpus_opt) if reg_cpus_opt else None
+        """The local registration CPU budget."""
+
+        self.pipelined_registration = opts.pop('pipelined_registration',
+                                               False)
+        """Flag indicating whether to register the volumes during staging."""
+
         self.modeling_resource = opts.pop('modeling_resource', None)
         """The modeling XNAT resource name."""
 
@@ -416,6 +534,38 @@ class QIPipelineWorkflow(WorkflowBase):
         if 'model' in actions and not self.modeling_technique:
             raise PipelineError('The modeling technique was not specified.')
 
+        mdl_region_opt = opts.pop('modeling_region', None)
+        mdl_region = mdl_region_opt.lower() if mdl_region_opt else 'mask'
+        if mdl_region not in MODELING_REGIONS:
+            raise PipelineError("The modeling region is not supported: %s" %
+                                mdl_region_opt)
+        self.modeling_region = mdl_region
+        """
+        The modeling region. If the region is ``roi``, then modeling is
+        restricted to the lesion ROI masks, which is much faster than
+        whole-mask modeling.
+        """
+
+        self.roi_margin = int(opts.pop('roi_margin', 0))
+        """The number of voxels to dilate the ``roi`` modeling region."""
+
+        force_stages_opt = opts.pop('force_stages', None) or []
+        unsupported = set(force_stages_opt).difference(CACHED_STAGES)
+        if unsupported:
+            raise PipelineError("The forced stages are not supported: %s" %
+                                list(unsupported))
+        self.force_stages = set(force_stages_opt)
+        """
+        The :const:`CACHED_STAGES` which are recomputed even if there
+        is a cached result for the same input.
+        """
+
+        self.warm_start = opts.pop('warm_start', None)
+        """
+        The prior modeling resource name described in
+        :attr:`qipipe.pipeline.modeling.ModelingWorkflow.warm_start`.
+        """
+
         self.workflow = self._create_workflow(scan_input, actions, **opts)
         """
         The pipeline execution workflow. The execution workflow is executed
@@ -513,6 +663,10 @@ class QIPipelineWorkflow(WorkflowBase):
             model = pe.Node(mdl_xfc, name='model')
             mdl_opts = self._child_options()
             mdl_opts['technique'] = self.modeling_technique
+            if self.warm_start:
+                mdl_opts['warm_start'] = self.warm_start
+            if 'model' in self.force_stages:
+                mdl_opts['force'] = True
             model.inputs.opts = mdl_opts
             self.logger.info("Enabled modeling with options %s." % mdl_opts)
         else:
@@ -529,6 +683,14 @@ class QIPipelineWorkflow(WorkflowBase):
             # primitive.
             reg_opts = self._child_options()
             reg_opts['technique'] = self.registration_technique
+            if self.recursive_registration:
+                reg_opts['recursive'] = True
+            if self.crop_registration:
+                reg_opts['crop'] = True
+            if self.registration_cpus:
+                reg_opts['cpu_budget'] = self.registration_cpus
+            if 'register' in self.force_stages:
+                reg_opts['force'] = True
             # The registration function.
             reg_xfc = Function(input_names=reg_inputs,
                                output_names=['time_series'],
@@ -550,7 +712,7 @@ class QIPipelineWorkflow(WorkflowBase):
             roi_flds = ['subject', 'session', 'scan', 'time_series',
                           'in_rois', 'opts']
             roi_xfc = Function(input_names=roi_flds,
-                               output_names=['volume'],
+                               output_names=['out_files'],
                                function=_roi)
             roi = pe.Node(roi_xfc, name='roi')
             roi.inputs.in_rois = self.roi_files
@@ -564,7 +726,8 @@ class QIPipelineWorkflow(WorkflowBase):
 
         # The staging workflow.
         if 'stage' in actions:
-            stg_inputs = ['subject', 'session', 'scan', 'in_dirs', 'opts']
+            stg_inputs = ['subject', 'session', 'scan', 'in_dirs', 'opts',
+                          'mask']
             stg_xfc = Function(input_names=stg_inputs,
                                output_names=['time_series', 'volume_files'],
                                function=_stage)
@@ -593,16 +756,19 @@ class QIPipelineWorkflow(WorkflowBase):
         if not any([stage, roi, register, model]):
             raise PipelineError("No workflow was enabled.")
 
-        # Registration and modeling require a mask.
+        # Registration and modeling require a mask. ROI modeling
+        # uses the ROI masks instead.
         is_mask_required = (
             (register and self.registration_technique != 'Mock') or
-            (model and self.modeling_technique != 'Mock')
+            (model and self.modeling_technique != 'Mock' and
+             self.modeling_region != 'roi')
         )
         if is_mask_required:
             has_mask = False
-            # If volumes are already staged, then check for an
-            # existing XNAT mask.
-            if not stage:
+            # If volumes are already staged or registration is
+            # pipelined with staging, then check for an existing XNAT
+            # mask.
+            if not stage or self.pipelined_registration:
                 with qixnat.connect() as xnat:
                     has_mask = _scan_file_exists(
                         xnat, self.project, scan_input, MASK_RESOURCE,
@@ -620,6 +786,8 @@ class QIPipelineWorkflow(WorkflowBase):
                 crop_posterior = self.collection.crop_posterior
                 mask_opts = self._child_options()
                 mask_opts['crop_posterior'] = crop_posterior
+                if 'mask' in self.force_stages:
+                    mask_opts['force'] = True
                 mask_inputs = ['subject', 'session', 'scan', 'time_series',
                                'opts']
                 mask_xfc = Function(input_names=mask_inputs,
@@ -663,7 +831,9 @@ class QIPipelineWorkflow(WorkflowBase):
         is_scan_modeling = (
             model and not register and not self.registration_resource
         )
-        need_scan_ts = mask or roi or is_scan_modeling
+        # Non-mock modeling requires the scan time series bolus arrival.
+        need_scan_ts = (mask or roi or is_scan_modeling or
+                        (model and self.modeling_technique != 'Mock'))
         if need_scan_ts:
             if stage:
                 scan_ts = stage
@@ -749,10 +919,11 @@ class QIPipelineWorkflow(WorkflowBase):
         bolus_arrival = None
         if is_bolus_arrival_required:
             # Compute the bolus arrival from the scan time series.
-            bolus_arv_xfc = Function(input_names=['time_series'],
+            bolus_arv_xfc = Function(input_names=['time_series', 'force'],
                                      output_names=['volume'],
                                      function=_bolus_arrival)
             bolus_arrival = pe.Node(bolus_arv_xfc, name='bolus_arrival')
+            bolus_arrival.inputs.force = 'bolus_arrival' in self.force_stages
             exec_wf.connect(scan_ts, 'time_series',
                             bolus_arrival, 'time_series')
             self.logger.debug('Connected the scan time series to the bolus'
@@ -798,6 +969,38 @@ class QIPipelineWorkflow(WorkflowBase):
                     self.logger.debug('Connected bolus arrival to the'
                                       ' registration reference.')
 
+            # Register each volume as soon as it is staged, if
+            # possible. Pipelining requires a reference volume which is
+            # known in advance and a mask which does not depend on the
+            # staged time series.
+            if self.pipelined_registration and stage:
+                pipelinable = (
+                    register.inputs.reference and
+                    not self.recursive_registration and
+                    'register' not in self.force_stages and
+                    (not mask or mask.name == 'download_mask')
+                )
+                if pipelinable:
+                    # The Function input is copied, since the template
+                    # options are shared.
+                    stg_opts = dict(stage.inputs.opts)
+                    stg_opts['registration'] = dict(
+                        reference=register.inputs.reference,
+                        opts=register.inputs.opts
+                    )
+                    stage.inputs.opts = stg_opts
+                    if mask:
+                        exec_wf.connect(mask, 'out_file', stage, 'mask')
+                    self.logger.debug('Pipelined registration with'
+                                      ' staging.')
+                else:
+                    self.logger.info(
+                        "Registration is not pipelined with staging, since"
+                        " pipelining requires a registration reference"
+                        " option or ROI, a previously uploaded mask and a"
+                        " non-recursive, non-forced registration."
+                    )
+
         # If the modeling workflow is enabled, then model the scan or
         # realigned images.
         if model:
@@ -805,7 +1008,40 @@ class QIPipelineWorkflow(WorkflowBase):
             exec_wf.connect(input_spec, 'session', model, 'session')
             exec_wf.connect(input_spec, 'scan', model, 'scan')
             # The mask input.
-            if mask:
+            if self.modeling_region == 'roi':
+                # Make the modeling mask from the new or previously
+                # uploaded ROI masks.
+                roi_mask_xfc = Function(input_names=['in_files', 'margin'],
+                                        output_names=['out_file'],
+                                        function=_roi_mask)
+                roi_mask = pe.Node(roi_mask_xfc, name='roi_mask')
+                roi_mask.inputs.margin = self.roi_margin
+                if roi:
+                    exec_wf.connect(roi, 'out_files', roi_mask, 'in_files')
+                else:
+                    with qixnat.connect() as xnat:
+                        has_roi = _scan_file_exists(
+                            xnat, self.project, scan_input, ROI_RESOURCE,
+                            'lesion\d+\.nii\.gz'
+                        )
+                    if not has_roi:
+                        raise PipelineError(
+                            "ROI modeling requires the %s %s scan %d %s"
+                            " resource lesion mask files" %
+                            (scan_input.subject, scan_input.session,
+                             scan_input.scan, ROI_RESOURCE)
+                        )
+                    dl_roi_xfc = XNATDownload(project=self.project,
+                                              resource=ROI_RESOURCE,
+                                              file=ROI_FILE_PAT)
+                    dl_roi = pe.Node(dl_roi_xfc, name='download_roi')
+                    exec_wf.connect(input_spec, 'subject', dl_roi, 'subject')
+                    exec_wf.connect(input_spec, 'session', dl_roi, 'session')
+                    exec_wf.connect(input_spec, 'scan', dl_roi, 'scan')
+                    exec_wf.connect(dl_roi, 'out_files', roi_mask, 'in_files')
+                exec_wf.connect(roi_mask, 'out_file', model, 'mask')
+                self.logger.debug('Connected the ROI mask to modeling.')
+            elif mask:
                 exec_wf.connect(mask, 'out_file', model, 'mask')
                 self.logger.debug('Connected the mask to modeling.')
             # The bolus arrival input.
@@ -972,26 +1208,38 @@ def exclude_files(in_files, exclusions):
             if os.path.split(f)[1] not in exclusions]
 
 
-def _bolus_arrival(time_series):
+def _bolus_arrival(time_series, force=False):
     """
     Determines the bolus uptake volume number. If it could not
     be determined, then the first time point is taken to be the
     uptake volume.
 
     :param time_series: the 4D time series image
+    :param force: flag indicating whether to ignore a
+        :mod:`qipipe.helpers.stage_cache` result for the same
+        time series
     :return: the bolus arrival volume number, or 1 if the arrival
         cannot be calculated
     """
+    from qipipe.helpers import stage_cache
     from qipipe.helpers.bolus_arrival import (bolus_arrival_index,
                                               BolusArrivalError)
 
+    cache_key = stage_cache.stage_key('bolus_arrival', [time_series], {})
+    cached = None if force else stage_cache.lookup('bolus_arrival',
+                                                   cache_key)
+    if cached:
+        return cached
     try:
-        return bolus_arrival_index(time_series) + 1
+        volume = bolus_arrival_index(time_series) + 1
     except BolusArrivalError:
-        return 1
+        volume = 1
+    stage_cache.store('bolus_arrival', cache_key, volume)
+
+    return volume
 
 
-def _stage(subject, session, scan, in_dirs, opts):
+def _stage(subject, session, scan, in_dirs, opts, mask=None):
     """
     Runs the staging workflow on the given session scan images.
 
@@ -1000,9 +1248,17 @@ def _stage(subject, session, scan, in_dirs, opts):
     :param scan: the scan number
     :param in_dirs: the input DICOM directories
     :param opts: the :meth:`qipipe.pipeline.staging.run` keyword options
+    :param mask: the pipelined registration mask file
     :return: the :meth:`qipipe.staging.run` result
     """
     from qipipe.pipeline import staging
+    from nipype.interfaces.traits_extension import isdefined
+
+    # The pipelined registration mask is a node input rather than a
+    # staging option, since it is an upstream node output.
+    reg_opts = opts.get('registration')
+    if reg_opts and isdefined(mask) and mask:
+        opts = dict(opts, registration=dict(reg_opts, mask=mask))
 
     return staging.run(subject, session, scan, *in_dirs, **opts)
 
@@ -1019,7 +1275,7 @@ def _roi(subject, session, scan, time_series, in_rois, opts):
     :param time_series: the scan 4D time series
     :param in_rois: the :meth:`qipipe.pipeline.roi.run` input ROI specs
     :param opts: the :meth:`qipipe.pipeline.roi.run` keyword options
-    :return: the ROI mask file
+    :return: the lesion ROI mask files
     """
     from qipipe.pipeline import roi
     from qipipe.helpers.logging import logger
@@ -1087,6 +1343,23 @@ def _mask(subject, session, scan, time_series, opts):
     return mask.run(subject, session, scan, time_series, **opts)
 
 
+def _roi_mask(in_files, margin=0):
+    """
+    Makes the ``roi`` region modeling mask, as described in
+    :meth:`qipipe.helpers.mask.roi_mask`.
+
+    :param in_files: the lesion ROI mask files
+    :param margin: the number of voxels to dilate the ROI union
+    :return: the ROI modeling mask file path
+    """
+    import os
+    from qipipe.helpers.mask import roi_mask
+
+    out_file = os.path.join(os.getcwd(), 'roi_mask.nii.gz')
+
+    return roi_mask(in_files, out_file, margin=margin)
+
+
 def _model(subject, session, scan, time_series, opts,
            bolus_arrival=1, mask=None):
     """
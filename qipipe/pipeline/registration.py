@@ -13,17 +13,19 @@ if not on_rtd:
         from nipype.interfaces.utility import (
             IdentityInterface, Function, Merge
         )
-        from nipype.interfaces.ants import (
-            AverageImages, Registration, ApplyTransforms
-        )
+        from nipype.interfaces.ants import (AverageImages, Registration)
+        from nipype.interfaces.ants.base import ANTSCommand
         from nipype.interfaces import fsl
-        from nipype.interfaces.dcmstack import (MergeNifti, CopyMeta)
-import qiutil
+        from nipype.interfaces.dcmstack import MergeNifti
+        from nipype.interfaces.traits_extension import isdefined
+import qixnat
 from ..helpers.logging import logger
 from ..helpers.constants import VOLUME_FILE_PAT
-from ..helpers import bolus_arrival
-from ..interfaces import (StickyIdentityInterface, Copy, XNATUpload)
-from ..interfaces.ants import AffineInitializer
+from ..helpers import (bolus_arrival, stage_cache, thread_budget)
+from ..interfaces import (
+    StickyIdentityInterface, Copy, CopyHeaderMeta, XNATUpload
+)
+from ..interfaces.ants import (AffineInitializer, ApplyTransforms)
 from .workflow_base import WorkflowBase
 from .pipeline_error import PipelineError
 
@@ -45,6 +47,43 @@ ANTS_INITIALIZER_CONF_SECTION = 'ants.AffineInitializer'
 FSL_CONF_SECTIONS = ['fsl.FLIRT', 'fsl.FNIRT']
 """The FSL registration configuration sections."""
 
+CHAINED_CONF_SECTION = 'chained_registration'
+"""
+The configuration section which overrides the ``ants.Registration``
+settings for a chained registration, as described in
+:class:`RegisterScanWorkflow`.
+"""
+
+CHAINED_TECHNIQUES = ['ants', 'mock']
+"""The techniques which support chained registration."""
+
+CROP_CONF_SECTION = 'crop'
+"""The mask bounding box crop configuration section."""
+
+THREAD_BUDGET_CONF_SECTION = 'thread_budget'
+"""The local thread budget configuration section."""
+
+RESOURCE_DIGEST_LENGTH = 12
+"""The number of content digest characters in the resource name."""
+
+VOLUME_CACHE_STAGE = 'registration_volume'
+"""The :mod:`qipipe.helpers.stage_cache` volume registration stage."""
+
+QUICK_CONF_SECTION = 'quick_registration'
+"""
+The configuration section which overrides the ``ants.Registration``
+settings for a :class:`QuickLookWorkflow` registration.
+"""
+
+MOTION_CONF_SECTION = 'motion'
+"""The quick-look motion triage configuration section."""
+
+DEF_MOTION_THRESHOLD = 1.0
+"""
+The default RMS displacement in millimeters above which the full
+registration is recommended.
+"""
+
 
 def run(subject, session, scan, in_files, **opts):
     """
@@ -59,6 +98,9 @@ def run(subject, session, scan, in_files, **opts):
         as the following keyword option:
     :keyword reference: the volume number of the image to register
          against (default is the first image)
+    :keyword force: flag indicating whether to register the images
+         even if there is a prior registration of the same input, as
+         described in :meth:`RegisterScanWorkflow.run` (default False)
     :return: the 4D registration time series
     """
     # The fixed reference volume number.
@@ -73,15 +115,65 @@ def run(subject, session, scan, in_files, **opts):
 
     # The mask option is a run parameter.
     mask = opts.pop('mask', None)
+    force = opts.pop('force', False)
     # Make the workflow.
     workflow = RegisterScanWorkflow(reference=reference, **opts)
     # Execute the workflow.
-    time_series = workflow.run(subject, session, scan, non_ref_vols, mask)
+    time_series = workflow.run(subject, session, scan, non_ref_vols, mask,
+                               force=force)
 
     # Return the registration result 4D time series.
     return time_series
 
 
+def register_volume(in_file, reference, **opts):
+    """
+    Registers one volume with
+    :meth:`RegisterScanWorkflow.register_volume`.
+
+    :param in_file: the input volume image file
+    :param reference: the fixed reference image file path
+    :param opts: the :class:`RegisterScanWorkflow` initializer
+        options as well as the following keyword options:
+    :keyword mask: the optional image mask file path
+    :keyword num_threads: the ANTs thread count
+    :return: the realigned volume file path
+    """
+    mask = opts.pop('mask', None)
+    num_threads = opts.pop('num_threads', None)
+    # The force option applies to the scan registration.
+    opts.pop('force', None)
+    workflow = RegisterScanWorkflow(reference=reference, **opts)
+
+    return workflow.register_volume(in_file, mask, num_threads=num_threads)
+
+
+def quick_look(in_files, **opts):
+    """
+    Estimates the scan motion with the :class:`QuickLookWorkflow`.
+
+    :param in_files: the input session scan 3D NIfTI images
+    :param opts: the :class:`QuickLookWorkflow` initializer options
+        as well as the following keyword options:
+    :keyword reference: the volume number of the image to register
+         against (default is the first image)
+    :keyword mask: the optional image mask file path
+    :return: the :meth:`QuickLookWorkflow.run` result
+    """
+    # The fixed reference volume number.
+    ref_vol_nbr = opts.pop('reference', 1)
+    # The input scan files sorted by volume number.
+    volumes = sorted(in_files, key=_extract_volume_number)
+    ref_ndx = ref_vol_nbr - 1
+    reference = volumes[ref_ndx]
+    # The images to register.
+    non_ref_vols = volumes[:ref_ndx] + volumes[ref_vol_nbr:]
+    mask = opts.pop('mask', None)
+    workflow = QuickLookWorkflow(reference=reference, **opts)
+
+    return workflow.run(non_ref_vols, mask)
+
+
 def _extract_volume_number(in_file):
     """
     :param in_file: the 3D NIfTI volume file
@@ -131,7 +223,54 @@ class RegisterScanWorkflow(WorkflowBase):
 
     - ``fsl.FNIRT``: the FSL `FNIRT interface`_ options
 
-    .. Note:: Since the XNAT *resource* name is unique, a
+    - ``chained_registration``: the ``ants.Registration`` overrides
+      for a chained registration
+
+    - ``crop``: the mask bounding box *margin* for the *crop* option
+
+    - ``thread_budget``: the *cpu_budget* per-volume *job_memory* in
+      GB and optional fixed *threads_per_job*
+
+    - ``measure_quality``: the quality metric mutual information
+      histogram *bins*
+
+    If the *recursive* option is set, then the volumes are registered
+    in two chains which expand outward from the reference volume, one
+    chain for the volumes acquired before the reference and one for
+    the volumes acquired after the reference. The volume adjacent to
+    the reference is registered from scratch. Each subsequent ANTs
+    registration is initialized with the composite transform of the
+    time-adjacent volume in the chain and runs the reduced iteration
+    schedule in the ``chained_registration`` configuration section.
+    The two chains run in parallel.
+
+    If the workflow is not distributable and the *cpu_budget* option
+    is set, then the volume registrations run concurrently on the
+    local host with the Nipype ``MultiProc`` plug-in. The CPU budget
+    is divided among the concurrent registrations, as described in
+    :meth:`qipipe.helpers.thread_budget.schedule`. Each ANTs node
+    thread count is set accordingly.
+
+    Each realigned volume is compared to the reference by the
+    :mod:`qipipe.helpers.similarity` quality metrics. The metrics
+    table is uploaded to the registration resource as
+    _resource_``_qa.csv``, so that a poor registration can be found
+    without viewing the images.
+
+    The XNAT registration *resource* name is derived from the
+    registration input content, as described in :meth:`resource_name`.
+    A rerun on the same input reuses the registration time series
+    which was uploaded to that resource. Otherwise, each volume whose
+    realigned image and transform were cached by a prior registration
+    with the same reference, mask and settings is not registered
+    again. Each volume registration is cached as soon as it completes
+    rather than after the entire scan is registered. If some volume
+    registrations fail, then the successful registrations are
+    therefore retained, and a rerun registers only the failed or
+    missing volumes. A cached volume whose files do not match the
+    recorded checksums is registered again.
+
+    .. Note:: Since the XNAT *resource* name is set by :meth:`run`, a
         :class:`qipipe.pipeline.registration.RegisterScanWorkflow`
         instance can be used for only one registration workflow.
         Different registration inputs require different
@@ -158,6 +297,10 @@ class RegisterScanWorkflow(WorkflowBase):
             following keyword arguments:
         :keyword technique: the optional registration :attr:`technique`
             (default :const:`DEF_TECHNIQUE`)
+        :keyword recursive: flag indicating whether to perform the
+            chained :attr:`recursive` registration (default False)
+        :keyword crop: the :class:`RegisterImageWorkflow` *crop* flag
+        :keyword cpu_budget: the local :attr:`cpu_budget`
         """
         super(RegisterScanWorkflow, self).__init__(__name__, **opts)
 
@@ -173,23 +316,39 @@ class RegisterScanWorkflow(WorkflowBase):
             self.logger.debug("Registering with the default technique %s" %
                               technique)
         self.technique = technique.lower()
-
-        # Make the XNAT resource name.
         """
         The registration technique (default :const:`DEF_TECHNIQUE`).
         """
-        self.resource = _generate_resource_name()
 
+        self.recursive = opts.pop('recursive', False)
+        """
+        Flag indicating whether to perform chained registration, as
+        described in :class:`RegisterScanWorkflow`.
+        """
+        if self.recursive and self.technique not in CHAINED_TECHNIQUES:
+            raise PipelineError("The %s registration technique does not"
+                                " support recursive registration" %
+                                self.technique)
+
+        self.crop = opts.pop('crop', False)
+        """The :class:`RegisterImageWorkflow` *crop* flag."""
+
+        self.cpu_budget = opts.pop('cpu_budget', None)
         """
-        The unique XNAT registration resource name. Uniqueness permits
-        more than one registration to be stored for a given session
-        without a name conflict.
+        The number of local CPUs shared by the concurrent volume
+        registrations, as described in :class:`RegisterScanWorkflow`.
+        """
+
+        self.resource = None
+        """
+        The XNAT registration :meth:`resource_name`, which is set when
+        the workflow is run.
         """
 
         self.workflow = self._create_workflow(**opts)
         """The registration workflow."""
 
-    def run(self, subject, session, scan, in_files, mask=None):
+    def run(self, subject, session, scan, in_files, mask=None, force=False):
         """
         Runs the registration workflow on the given session scan images.
 
@@ -198,6 +357,8 @@ class RegisterScanWorkflow(WorkflowBase):
         :param scan: the scan number
         :param in_files: the input session scan volume image files
         :param mask: the optional image mask file path
+        :param force: flag indicating whether to register every volume
+            even if there is a prior registration of the same input
         :return: the realigned 4D time series file path
         """
         # Set the execution workflow inputs.
@@ -207,17 +368,56 @@ class RegisterScanWorkflow(WorkflowBase):
         input_spec.inputs.scan = scan
         if mask:
             input_spec.inputs.mask = mask
-
-        # Iterate over the input images.
-        iter_input = self.workflow.get_node('iter_input')
-        iter_input.iterables = ('in_file', in_files)
+        self._set_resource(self.resource_name(in_files, mask))
+
+        # Reuse the prior registration of the same input, if possible.
+        reuse = not (self.dry_run or force)
+        if reuse:
+            time_series = self._download_time_series(subject, session, scan)
+            if time_series:
+                return time_series
+        # The volume cache keys.
+        keys = {location: self._volume_key(location, mask)
+                for location in in_files}
+        # The volumes which were realigned by a prior registration.
+        cached = self._cached_volumes(keys) if reuse else {}
+        if cached:
+            collect_volumes = self.workflow.get_node('collect_volumes')
+            collect_volumes.inputs.in3 = [cached[location]['out_file']
+                                          for location in in_files
+                                          if location in cached]
+        # The volumes to register.
+        uncached = [location for location in in_files
+                    if location not in cached]
+
+        if self.recursive:
+            # Chain the input images.
+            self._connect_chains(in_files, keys, cached)
+        elif uncached:
+            # Iterate over the input images.
+            iter_input = self.workflow.get_node('iter_input')
+            iter_input.iterables = ('in_file', uncached)
+            cache_volume = self.workflow.get_node('cache_volume')
+            cache_volume.inputs.volume_keys = keys
+        else:
+            # There is nothing to register.
+            reg_nodes = [self.workflow.get_node(name)
+                         for name in ['iter_input', self.technique,
+                                      'cache_volume', 'collect_realigned']]
+            self.workflow.remove_nodes(reg_nodes)
+
+        # Divide the local thread budget, if necessary.
+        if self.cpu_budget and not self.is_distributable:
+            local_opts = self._budget_threads(len(uncached))
+        else:
+            local_opts = {}
 
         # Execute the workflow.
         self.logger.debug(
             "Registering %d %s %s images against the reference image"
             " %s..." % (len(in_files), subject, session, self.reference)
         )
-        wf_res = self._run_workflow()
+        wf_res = self._run_workflow(**local_opts)
         # If dry_run is set, then there is no result.
         if not wf_res:
             return None
@@ -227,11 +427,144 @@ class RegisterScanWorkflow(WorkflowBase):
         time_series = output_res.inputs.get()['time_series']
         self.logger.debug(
             "Registered %d %s %s scan %d images as time series %s." %
-            (len(in_files), subject, session, scan, time_series)
+            (len(uncached), subject, session, scan, time_series)
         )
 
         return time_series
 
+    def register_volume(self, in_file, mask=None, num_threads=None):
+        """
+        Registers one volume against the :attr:`reference` outside of
+        the scan workflow. The result is cached as a prior volume
+        registration, so that a subsequent :meth:`run` on the scan
+        reuses it. This permits a volume to be registered as soon as
+        it is staged, as described in
+        :class:`qipipe.pipeline.staging.ScanStagingWorkflow`.
+
+        The :attr:`cpu_budget` does not apply, since the concurrent
+        volume registrations are run by the caller. The caller divides
+        the CPU budget and sets the *num_threads* accordingly.
+
+        :param in_file: the input volume image file
+        :param mask: the optional image mask file path
+        :param num_threads: the ANTs thread count (default the ANTs
+            default)
+        :return: the realigned volume file path
+        :raise PipelineError: if the :attr:`recursive` flag is set
+        """
+        if self.recursive:
+            raise PipelineError("A recursive registration volume cannot be"
+                                " registered independently: %s" % in_file)
+        keys = {in_file: self._volume_key(in_file, mask)}
+        cached = self._cached_volumes(keys)
+        if cached:
+            return cached[in_file]['out_file']
+        reg_opts = self._child_options()
+        reg_opts['crop'] = self.crop
+        reg_wf = RegisterImageWorkflow(self.technique, **reg_opts)
+        if num_threads:
+            _set_ants_threads(reg_wf.workflow, num_threads)
+        result = reg_wf.run(in_file, self.reference, mask=mask)
+        if not result:
+            return None
+        out_file, transform = result
+        _cache_volume(in_file, keys, out_file, transform)
+
+        return out_file
+
+    def resource_name(self, in_files, mask=None):
+        """
+        Makes the XNAT registration resource name from a digest of
+        the technique, the registration configuration and options, the
+        reference, the input volumes and the mask. The configuration
+        excludes the execution settings, as described in
+        :meth:`qipipe.helpers.stage_cache.stage_key`. The same input
+        and settings therefore always have the same resource name.
+
+        :param in_files: the input volume image files
+        :param mask: the optional image mask file path
+        :return: the resource name
+        """
+        locations = [self.reference] + sorted(in_files)
+        if mask:
+            locations.append(mask)
+        key = stage_cache.stage_key('registration', locations,
+                                    self.configuration, self.technique,
+                                    self.recursive, bool(self.crop))
+
+        return REG_PREFIX + key[:RESOURCE_DIGEST_LENGTH]
+
+    def _set_resource(self, resource):
+        """
+        Sets the :attr:`resource` and the workflow inputs which depend
+        on the resource name.
+
+        :param resource: the XNAT resource name
+        """
+        self.resource = resource
+        self.workflow.get_node('input_spec').inputs.resource = resource
+        merge = self.workflow.get_node('merge_volumes')
+        merge.inputs.out_format = resource + '_ts'
+
+    def _download_time_series(self, subject, session, scan):
+        """
+        :param subject: the subject name
+        :param session: the session name
+        :param scan: the scan number
+        :return: the :attr:`resource` time series downloaded from XNAT,
+            or None if XNAT does not have the time series
+        """
+        ts_name = self.resource + '_ts.nii.gz'
+        dest = os.path.join(self.base_dir, self.resource)
+        with qixnat.connect() as xnat:
+            rsc = xnat.find_one(self.project, subject, session, scan=scan,
+                                resource=self.resource)
+            if not rsc or ts_name not in rsc.files().get():
+                return None
+            time_series = xnat.download(self.project, subject, session,
+                                        scan=scan, resource=self.resource,
+                                        file=ts_name, dest=dest)[0]
+        self.logger.debug("Reusing the %s %s scan %d registration time"
+                          " series %s." % (subject, session, scan,
+                                           time_series))
+
+        return time_series
+
+    def _volume_key(self, in_file, mask):
+        """
+        :param in_file: the input volume image file
+        :param mask: the optional image mask file path
+        :return: the :mod:`qipipe.helpers.stage_cache` volume key
+        """
+        locations = [self.reference, in_file]
+        if mask:
+            locations.append(mask)
+
+        return stage_cache.stage_key(VOLUME_CACHE_STAGE, locations,
+                                     self.configuration, self.technique,
+                                     self.recursive, bool(self.crop))
+
+    def _cached_volumes(self, keys):
+        """
+        Finds the prior volume registrations. A prior registration
+        whose cached files were modified is not reused.
+
+        :param keys: the {input file: :meth:`_volume_key`} dictionary
+        :return: the {input file: {'out_file': realigned file,
+            'transform': transform file}} dictionary of the
+            volumes realigned by a prior registration
+        """
+        cached = {}
+        for in_file, key in keys.iteritems():
+            result = stage_cache.lookup(VOLUME_CACHE_STAGE, key, verify=True)
+            if result:
+                cached[in_file] = result
+        if cached:
+            self.logger.debug("Reusing %d of %d prior volume"
+                              " registrations." % (len(cached), len(keys)))
+
+        return cached
+
     def _create_workflow(self, **opts):
         """
         Makes the Nipype registration workflow. The workflow input
@@ -256,6 +589,13 @@ class RegisterScanWorkflow(WorkflowBase):
 
         -  the 3D image files to realign
 
+        Each realigned volume is cached by the ``cache_volume`` node
+        before it is collected.
+
+        If the :attr:`recursive` flag is set, then there is no
+        ``iter_input`` node. The chained volume registrations are
+        connected by :meth:`run` instead.
+
         :param reference: the initial fixed reference image
         :return: the execution workflow
         """
@@ -263,11 +603,6 @@ class RegisterScanWorkflow(WorkflowBase):
         self.logger.debug("Building the %s workflow..." % REG_SCAN_WF_NAME)
         workflow = pe.Workflow(name=REG_SCAN_WF_NAME, base_dir=self.base_dir)
 
-        # The child realignment workflow.
-        reg_image_wf_opts = self._child_options()
-        reg_image_wf = RegisterImageWorkflow(self.technique,
-                                             **reg_image_wf_opts)
-
         # The registration workflow input.
         input_fields = ['subject', 'session', 'scan', 'mask',
                         'reference', 'resource']
@@ -275,30 +610,66 @@ class RegisterScanWorkflow(WorkflowBase):
                              name='input_spec')
         # The initial fixed reference image.
         input_spec.inputs.reference = self.reference
-        # The registration resource name.
-        input_spec.inputs.resource = self.resource
-        # The registration mask.
-        workflow.connect(input_spec, 'mask',
-                         reg_image_wf.workflow, 'input_spec.mask')
-        # The fixed reference image.
-        workflow.connect(input_spec, 'reference',
-                         reg_image_wf.workflow, 'input_spec.reference')
-
-        # The realignment child workflow iterator.
-        iter_reg_fields = ['in_file']
-        iter_input = pe.Node(IdentityInterface(fields=iter_reg_fields),
-                             name='iter_input')
-        workflow.connect(iter_input, 'in_file',
-                         reg_image_wf.workflow, 'input_spec.in_file')
-
-        # Collect the realigned images.
-        collect_realigned_xfc = IdentityInterface(fields=['realigned_files'])
-        collect_realigned = pe.JoinNode(
-            collect_realigned_xfc, joinsource='iter_input',
-            joinfield='realigned_files', name='collect_realigned'
-        )
-        workflow.connect(reg_image_wf.workflow, 'output_spec.out_file',
-                         collect_realigned, 'realigned_files')
+
+        # Collect the fixed reference, the registration result and
+        # the prior cached registration result into one volume list.
+        collect_volumes = pe.Node(Merge(3), name='collect_volumes')
+        workflow.connect(input_spec, 'reference', collect_volumes, 'in1')
+        # Sort the volumes into acquisition order.
+        sort_volumes_xfc = Function(input_names=['in_files'],
+                                    output_names=['out_files'],
+                                    function=_sort_volumes)
+        sort_volumes = pe.Node(sort_volumes_xfc, name='sort_volumes')
+        workflow.connect(collect_volumes, 'out', sort_volumes, 'in_files')
+
+        if not self.recursive:
+            # The child realignment workflow.
+            reg_image_wf_opts = self._child_options()
+            reg_image_wf_opts['crop'] = self.crop
+            reg_image_wf = RegisterImageWorkflow(self.technique,
+                                                 **reg_image_wf_opts)
+            # The registration mask.
+            workflow.connect(input_spec, 'mask',
+                             reg_image_wf.workflow, 'input_spec.mask')
+            # The fixed reference image.
+            workflow.connect(input_spec, 'reference',
+                             reg_image_wf.workflow, 'input_spec.reference')
+
+            # The realignment child workflow iterator.
+            iter_reg_fields = ['in_file']
+            iter_input = pe.Node(IdentityInterface(fields=iter_reg_fields),
+                                 name='iter_input')
+            workflow.connect(iter_input, 'in_file',
+                             reg_image_wf.workflow, 'input_spec.in_file')
+
+            # Cache each volume registration as soon as it completes.
+            # The volume cache keys are set by run.
+            cache_volume = pe.Node(_cache_volume_interface(),
+                                   name='cache_volume')
+            workflow.connect(iter_input, 'in_file', cache_volume, 'in_file')
+            workflow.connect(reg_image_wf.workflow, 'output_spec.out_file',
+                             cache_volume, 'out_file')
+            if self.technique == 'ants':
+                workflow.connect(reg_image_wf.workflow,
+                                 'output_spec.transform',
+                                 cache_volume, 'transform')
+
+            # Collect the realigned images and ANTs transforms.
+            collect_fields = ['realigned_files']
+            if self.technique == 'ants':
+                collect_fields.append('transforms')
+            collect_realigned_xfc = IdentityInterface(fields=collect_fields)
+            collect_realigned = pe.JoinNode(
+                collect_realigned_xfc, joinsource='iter_input',
+                joinfield=collect_fields, name='collect_realigned'
+            )
+            workflow.connect(cache_volume, 'out_file',
+                             collect_realigned, 'realigned_files')
+            if self.technique == 'ants':
+                workflow.connect(cache_volume, 'transform',
+                                 collect_realigned, 'transforms')
+            workflow.connect(collect_realigned, 'realigned_files',
+                             collect_volumes, 'in2')
 
         # Make the profile.
         cr_prf_fields = ['technique', 'configuration', 'sections',
@@ -307,41 +678,48 @@ class RegisterScanWorkflow(WorkflowBase):
                               output_names=['out_file'],
                               function=_create_profile)
         cr_prf = pe.Node(cr_prf_xfc, name='create_profile')
-        cr_prf.inputs.resource = self.resource
         cr_prf.inputs.technique = self.technique
         workflow.connect(input_spec, 'reference', cr_prf, 'reference')
+        workflow.connect(input_spec, 'resource', cr_prf, 'resource')
         cr_prf.inputs.configuration = self.configuration
         # The profile sections depend on the technique.
         if self.technique == 'ants':
-            profile_sections = ANTS_CONF_SECTIONS
+            profile_sections = list(ANTS_CONF_SECTIONS)
             if opts.get('initialize'):
                 profile_sections.append(ANTS_INITIALIZER_CONF_SECTION)
+            if self.recursive:
+                profile_sections.append(CHAINED_CONF_SECTION)
+            if self.crop:
+                profile_sections.append(CROP_CONF_SECTION)
         elif self.technique == 'fsl':
             profile_sections = FSL_CONF_SECTIONS
         elif self.technique == 'mock':
             profile_sections = []
         cr_prf.inputs.sections = profile_sections
-        # The profile file name.
-        cr_prf.inputs.dest = "%s.cfg" % self.resource
-
-        # Collect the fixed reference and registration result into
-        # one volume list.
-        collect_volumes = pe.Node(Merge(2), name='collect_volumes')
-        workflow.connect(input_spec, 'reference', collect_volumes, 'in1')
-        workflow.connect(collect_realigned, 'realigned_files',
-                         collect_volumes, 'in2')
 
         # Merge the fixed and realigned images into a 4D time series.
-        reg_ts_name = self.resource + '_ts'
-        merge_xfc = MergeNifti(out_format=reg_ts_name)
-        merge = pe.Node(merge_xfc, name='merge_volumes')
-        workflow.connect(collect_volumes, 'out', merge, 'in_files')
-
-        # Collect the profile, volumes and time series into one list.
-        collect_uploads = pe.Node(Merge(3), name='collect_uploads')
-        workflow.connect(collect_volumes, 'out', collect_uploads, 'in1')
+        # The time series name is set from the resource name by run.
+        merge = pe.Node(MergeNifti(), name='merge_volumes')
+        workflow.connect(sort_volumes, 'out_files', merge, 'in_files')
+
+        # Measure the registration quality of each realigned volume.
+        measure_flds = ['reference', 'in_files', 'mask', 'resource', 'bins']
+        measure_xfc = Function(input_names=measure_flds,
+                               output_names=['out_file'],
+                               function=_measure_quality)
+        measure = pe.Node(measure_xfc, name='measure_quality')
+        workflow.connect(input_spec, 'reference', measure, 'reference')
+        workflow.connect(sort_volumes, 'out_files', measure, 'in_files')
+        workflow.connect(input_spec, 'mask', measure, 'mask')
+        workflow.connect(input_spec, 'resource', measure, 'resource')
+
+        # Collect the profile, volumes, time series and quality table
+        # into one list.
+        collect_uploads = pe.Node(Merge(4), name='collect_uploads')
+        workflow.connect(sort_volumes, 'out_files', collect_uploads, 'in1')
         workflow.connect(merge, 'out_file', collect_uploads, 'in2')
         workflow.connect(cr_prf, 'out_file', collect_uploads, 'in3')
+        workflow.connect(measure, 'out_file', collect_uploads, 'in4')
 
         # Upload the registration result into the XNAT registration
         # resource.
@@ -365,6 +743,118 @@ class RegisterScanWorkflow(WorkflowBase):
 
         return workflow
 
+    def _budget_threads(self, volume_cnt):
+        """
+        Sets the ANTs node thread counts from the :attr:`cpu_budget`.
+
+        :param volume_cnt: the number of volumes to register
+        :return: the local Nipype ``MultiProc`` run options
+        """
+        budget_cfg = self.configuration.get(THREAD_BUDGET_CONF_SECTION, {})
+        # A recursive registration runs at most one volume per chain
+        # at a time.
+        jobs = min(volume_cnt, 2) if self.recursive else volume_cnt
+        concurrency, threads = thread_budget.schedule(
+            jobs, cpus=self.cpu_budget,
+            job_memory=budget_cfg.get('job_memory'),
+            threads_per_job=budget_cfg.get('threads_per_job')
+        )
+        _set_ants_threads(self.workflow, threads)
+        self.logger.debug("Running %d concurrent volume registrations with"
+                          " %d threads each within the %d CPU budget." %
+                          (concurrency, threads, self.cpu_budget))
+
+        return dict(plugin='MultiProc', plugin_args=dict(n_procs=concurrency))
+
+    def _connect_chains(self, in_files, keys, cached=None):
+        """
+        Connects the chained volume registrations described in
+        :class:`RegisterScanWorkflow`. Each volume registration is
+        cached as soon as it completes. The realigned volumes are
+        collected in volume number order. A volume which follows a
+        cached volume in the chain is initialized from the cached
+        transform.
+
+        :param in_files: the input session scan volume image files
+        :param keys: the {input file: :meth:`_volume_key`} dictionary
+        :param cached: the :meth:`_cached_volumes` result
+        """
+        if cached is None:
+            cached = {}
+        workflow = self.workflow
+        input_spec = workflow.get_node('input_spec')
+        # The registration from scratch template.
+        child_opts = self._child_options()
+        child_opts['crop'] = self.crop
+        start_wf = RegisterImageWorkflow(self.technique, **child_opts).workflow
+        # The template for a registration initialized from the
+        # adjacent volume.
+        chained_wf = RegisterImageWorkflow(self.technique, chained=True,
+                                           **child_opts).workflow
+
+        # Each chain volume registration is a copy of the template.
+        ref_nbr = _extract_volume_number(self.reference)
+        cache_nodes = {}
+        for chain in _chain_volumes(in_files, ref_nbr):
+            prior = None
+            # The prior cached volume transform.
+            prior_xfm = None
+            for in_file in chain:
+                if in_file in cached:
+                    prior = None
+                    prior_xfm = cached[in_file]['transform']
+                    continue
+                vol_nbr = _extract_volume_number(in_file)
+                template = chained_wf if prior or prior_xfm else start_wf
+                reg_wf = template.clone("%s_%d" % (template.name, vol_nbr))
+                reg_input = reg_wf.get_node('input_spec')
+                reg_input.inputs.in_file = in_file
+                workflow.connect(input_spec, 'mask',
+                                 reg_wf, 'input_spec.mask')
+                workflow.connect(input_spec, 'reference',
+                                 reg_wf, 'input_spec.reference')
+                # The mock technique does not make a transform.
+                if prior_xfm:
+                    reg_input.inputs.initial_transform = prior_xfm
+                elif prior and self.technique == 'ants':
+                    workflow.connect(prior, 'output_spec.transform',
+                                     reg_wf, 'input_spec.initial_transform')
+                # Cache the volume registration.
+                cache_volume = pe.Node(_cache_volume_interface(),
+                                       name="cache_volume_%d" % vol_nbr)
+                cache_volume.inputs.in_file = in_file
+                cache_volume.inputs.volume_keys = keys
+                workflow.connect(reg_wf, 'output_spec.out_file',
+                                 cache_volume, 'out_file')
+                if self.technique == 'ants':
+                    workflow.connect(reg_wf, 'output_spec.transform',
+                                     cache_volume, 'transform')
+                cache_nodes[vol_nbr] = cache_volume
+                prior = reg_wf
+                prior_xfm = None
+        if not cache_nodes:
+            return
+
+        # Collect the realigned images and ANTs transforms in volume
+        # order.
+        collect_fields = ['realigned_files']
+        if self.technique == 'ants':
+            collect_fields.append('transforms')
+        collect_realigned = pe.Node(IdentityInterface(fields=collect_fields),
+                                    name='collect_realigned')
+        for field, output in zip(collect_fields, ['out_file', 'transform']):
+            merge = pe.Node(Merge(len(cache_nodes)), name='merge_' + output)
+            for i, vol_nbr in enumerate(sorted(cache_nodes)):
+                workflow.connect(cache_nodes[vol_nbr], output,
+                                 merge, "in%d" % (i + 1))
+            workflow.connect(merge, 'out', collect_realigned, field)
+        collect_volumes = workflow.get_node('collect_volumes')
+        workflow.connect(collect_realigned, 'realigned_files',
+                         collect_volumes, 'in2')
+        self.logger.debug("Connected %d chained %s volume registrations." %
+                          (len(cache_nodes), self.technique))
+
+
 class RegisterImageWorkflow(WorkflowBase):
     """
     The RegisterImageWorkflow registers an input NIfTI scan image
@@ -419,6 +909,11 @@ class RegisterImageWorkflow(WorkflowBase):
             initializer options, as well as the following keyword arguments:
         :keyword initialize: flag indicating whether to create an initial
             affine transform (ANTs only, default false)
+        :keyword chained: flag indicating whether the registration is
+            initialized with the *initial_transform* input, as described
+            in :class:`RegisterScanWorkflow` (ANTs only, default false)
+        :keyword crop: flag indicating whether to register the images
+            cropped to the mask bounding box (ANTs only, default false)
         """
         super(RegisterImageWorkflow, self).__init__(__name__, **opts)
 
@@ -428,23 +923,32 @@ class RegisterImageWorkflow(WorkflowBase):
         include ``ants``, `fnirt`` and ``mock``.
         """
 
-        self.workflow = self._create_workflow(**opts)
+        # Make the workflow from the technique template.
+        initialize = opts.get('initialize')
+        chained = opts.get('chained')
+        crop = opts.get('crop')
+        self.workflow = self._cached_workflow(
+            lambda: self._create_workflow(**opts), technique,
+            bool(initialize), bool(chained), bool(crop)
+        )
         """The realignment workflow."""
 
     def run(self, in_file, reference, **opts):
         """
         Runs the realignment workflow on the given session scan image.
 
-        :param reference: the volume to register against
         :param in_file: the input session scan volume image file
+        :param reference: the volume to register against
         :param opts: the following keyword arguments:
         :option mask: the image mask file path
-        :return: the realigned output file paths
+        :return: the (realigned output file path, ANTs transform file
+            path) tuple, where the transform is None for a non-ANTs
+            technique, or None if the :attr:`dry_run` flag is set
         """
-
         # Set the workflow inputs.
         input_spec = self.workflow.get_node('input_spec')
         input_spec.inputs.in_file = in_file
+        input_spec.inputs.reference = reference
         mask = opts.get('mask')
         if mask:
             input_spec.inputs.mask = mask
@@ -452,15 +956,18 @@ class RegisterImageWorkflow(WorkflowBase):
         # Execute the workflow.
         self.logger.debug("Executing the %s workflow on %s..." %
                           (self.workflow.name, in_file))
-        self._run_workflow()
+        wf_res = self._run_workflow()
         self.logger.debug("Executed the %s workflow on %s." %
                           (self.workflow.name, in_file))
+        if not wf_res:
+            return None
 
         # The magic incantation to get the Nipype workflow result.
         output_res = next(n for n in wf_res.nodes() if n.name == 'output_spec')
-        results = output_res.inputs.get()['out_file']
+        outputs = output_res.inputs.get()
+        transform = outputs.get('transform')
 
-        return out_file
+        return outputs['out_file'], transform if isdefined(transform) else None
 
     def _create_workflow(self, **opts):
         """
@@ -474,24 +981,42 @@ class RegisterImageWorkflow(WorkflowBase):
 
         - *mask*: the optional mask to apply to the images
 
+        - *initial_transform*: the adjacent volume transform, if the
+          *chained* option is set
+
+        The workflow output is the *output_spec* node consisting of
+        the *out_file* realigned image and, for ANTs, the *transform*
+        composite transform.
+
         :param opts: the following keyword arguments:
         :keyword initialize: flag indicating whether to create an initial
             affine transform (ANTs only, default false)
+        :keyword chained: flag indicating whether the registration is
+            initialized with the *initial_transform* input (ANTs only,
+            default false)
+        :keyword crop: flag indicating whether to register the images
+            cropped to the mask bounding box plus the ``crop`` node
+            *margin*. The transform is applied to the full input image,
+            so the output geometry is unchanged. (ANTs only, default
+            false)
         :return: the Nipypye Workflow object
         """
         # The workflow.
         self.logger.debug("Building the %s image registration workflow..." %
                           self.technique)
         workflow = pe.Workflow(name=self.technique, base_dir=self.base_dir)
+        chained = opts.get('chained')
 
         # The workflow input.
         in_fields = ['in_file', 'reference', 'mask']
+        if chained:
+            in_fields.append('initial_transform')
         input_spec = pe.Node(IdentityInterface(fields=in_fields),
                              name='input_spec')
 
         # Copy the DICOM meta-data. The copy target is set by the
         # technique node defined below.
-        copy_meta = pe.Node(CopyMeta(), name='copy_meta')
+        copy_meta = pe.Node(CopyHeaderMeta(), name='copy_meta')
         workflow.connect(input_spec, 'in_file', copy_meta, 'src_file')
 
         # The input file name without directory.
@@ -514,24 +1039,36 @@ class RegisterImageWorkflow(WorkflowBase):
 
             # Register the images to create the rigid, affine and SyN
             # ANTS transformations. The float option is set to reduce
-            # the output image size by app. 4x.
-            #
-            # Note: The float option has no effect. The work-around
-            # is to change the data type from float to short in the
-            # downsize node defined below.
-            # TODO - isolate and fix this Nipype defect.
+            # the registration memory footprint. The realigned image
+            # data type is set by the apply_xfm node defined below.
             reg_xfc = Registration(float=True, **metric_inputs)
             register = pe.Node(reg_xfc, name='register')
-            workflow.connect(input_spec, 'reference', register, 'fixed_image')
-            workflow.connect(input_spec, 'in_file', register, 'moving_image')
-            workflow.connect(input_spec, 'mask',
+            # The images to register are either the inputs or the
+            # inputs cropped to the mask bounding box.
+            if opts.get('crop'):
+                crop_flds = ['in_file', 'reference', 'mask', 'margin']
+                crop_xfc = Function(input_names=crop_flds,
+                                    output_names=['in_file', 'reference',
+                                                  'mask'],
+                                    function=_crop)
+                reg_input = pe.Node(crop_xfc, name='crop')
+                workflow.connect(input_spec, 'in_file', reg_input, 'in_file')
+                workflow.connect(input_spec, 'reference',
+                                 reg_input, 'reference')
+                workflow.connect(input_spec, 'mask', reg_input, 'mask')
+            else:
+                reg_input = input_spec
+            workflow.connect(reg_input, 'reference', register, 'fixed_image')
+            workflow.connect(reg_input, 'in_file', register, 'moving_image')
+            workflow.connect(reg_input, 'mask',
                                register, 'moving_image_mask')
-            workflow.connect(input_spec, 'mask',
+            workflow.connect(reg_input, 'mask',
                                register, 'fixed_image_mask')
 
             # If the initialize option is set, then make an initial
-            # transform.
-            initialize = opts.get('initialize')
+            # transform. A chained registration is initialized with
+            # the adjacent volume transform instead.
+            initialize = opts.get('initialize') and not chained
             # Nipype bug work-around:
             # Setting the registration metric and metric_weight inputs
             # after the node is created results in a Nipype input trait
@@ -544,11 +1081,11 @@ class RegisterImageWorkflow(WorkflowBase):
             if initialize:
                 aff_xfc = AffineInitializer()
                 init_xfm = pe.Node(aff_xfc, name='initialize_affine')
-                workflow.connect(input_spec, 'reference',
+                workflow.connect(reg_input, 'reference',
                                    init_xfm, 'fixed_image')
-                workflow.connect(input_spec, 'in_file',
+                workflow.connect(reg_input, 'in_file',
                                    init_xfm, 'moving_image')
-                workflow.connect(input_spec, 'mask',
+                workflow.connect(reg_input, 'mask',
                                    init_xfm, 'image_mask')
                 workflow.connect(init_xfm, 'affine_transform',
                                    register, 'initial_moving_transform')
@@ -571,8 +1108,15 @@ class RegisterImageWorkflow(WorkflowBase):
                 #   the usedefault option. The work-around is to explicitly
                 #   set the invert_initial_moving_transform field to False.
                 register.inputs.invert_initial_moving_transform = False
+            elif chained:
+                workflow.connect(input_spec, 'initial_transform',
+                                 register, 'initial_moving_transform')
+                # The Nipype bug work-around described above.
+                register.inputs.invert_initial_moving_transform = False
 
-            # Apply the transforms to the input image.
+            # Apply the transforms to the full input image. The
+            # realigned image is written with the input image data
+            # type under the input file name in one step.
             apply_xfm = pe.Node(ApplyTransforms(), name='apply_xfm')
             workflow.connect(input_spec, 'reference',
                                apply_xfm, 'reference_image')
@@ -581,28 +1125,8 @@ class RegisterImageWorkflow(WorkflowBase):
             workflow.connect(register, 'forward_transforms',
                                apply_xfm, 'transforms')
 
-            # Work-around for Nipype bug described in the TODO comment
-            # above.
-            # Downsize the data type to a signed short int.
-            #
-            # Note: Nipype fsl.maths.ChangeDataType appends a suffix to
-            # the output file and does not support an interface field
-            # that changes that. The work-around work-around is to
-            # make a symlink to the downsize result with the correct
-            # base name.
-            downsize_xfc = fsl.maths.ChangeDataType(output_datatype='short')
-            downsize = pe.Node(downsize_xfc, name='downsize')
-            workflow.connect(apply_xfm, 'output_image', downsize, 'in_file')
-            symlink_xfc = Function(input_names=['in_file', 'link_name'],
-                                   output_names=['out_file'],
-                                   function=_symlink_in_place)
-            symlink = pe.Node(symlink_xfc, name='restore_volume_file_name')
-            workflow.connect(downsize, 'out_file', symlink, 'in_file')
-            workflow.connect(base_name, 'out_file', symlink, 'link_name')
-            # End of work-around.
-
             # Copy the meta-data.
-            workflow.connect(symlink, 'out_file', copy_meta, 'dest_file')
+            workflow.connect(apply_xfm, 'output_image', copy_meta, 'dest_file')
 
         elif self.technique == 'fsl':
             # Make the affine transformation.
@@ -638,12 +1162,21 @@ class RegisterImageWorkflow(WorkflowBase):
             raise PipelineError("Registration technique not recognized: %s" %
                                 self.technique)
 
-        # The output is the realigned image.
-        output_spec = pe.Node(IdentityInterface(fields=['out_file']),
+        # The output is the realigned image and the ANTs transform.
+        output_spec = pe.Node(IdentityInterface(fields=['out_file',
+                                                        'transform']),
                               name='output_spec')
         workflow.connect(copy_meta, 'dest_file', output_spec, 'out_file')
+        if self.technique == 'ants':
+            workflow.connect(register, 'composite_transform',
+                             output_spec, 'transform')
 
         self._configure_nodes(workflow)
+        # A chained registration starts from a nearby solution, and
+        # therefore runs the reduced schedule.
+        chained_cfg = self.configuration.get(CHAINED_CONF_SECTION)
+        if chained and chained_cfg and self.technique == 'ants':
+            self._set_node_inputs(register, **chained_cfg)
 
         self.logger.debug("Created the %s workflow." % workflow.name)
         # If debug is set, then diagram the workflow graph.
@@ -653,16 +1186,217 @@ class RegisterImageWorkflow(WorkflowBase):
         return workflow
 
 
+class QuickLookWorkflow(WorkflowBase):
+    """
+    The QuickLookWorkflow estimates the scan motion for triage in a
+    fraction of the :class:`RegisterScanWorkflow` time. Each volume
+    is registered against the reference with a single low-resolution
+    ANTs affine stage, as specified in the ``quick_registration``
+    configuration section. The images are downsampled by the ANTs
+    registration shrink factors. No realigned image, time series or
+    XNAT resource is created.
+
+    The volume motion is the affine transform RMS displacement of a
+    sphere centered on the reference image, as described in
+    :mod:`qipipe.helpers.motion`. The scan motion score is the
+    largest volume displacement. The full registration is recommended
+    if the score exceeds the ``motion`` configuration section
+    *threshold*.
+
+    The ``qipipe --quick-look`` command runs this workflow on staged
+    XNAT scans, as described in
+    :meth:`qipipe.pipeline.qipipeline.quick_look`.
+    """
+
+    def __init__(self, reference, **opts):
+        """
+        :param reference: the fixed reference image file path
+        :param opts: the :class:`qipipe.pipeline.workflow_base.WorkflowBase`
+            initializer keyword arguments
+        """
+        super(QuickLookWorkflow, self).__init__(__name__, **opts)
+
+        self.reference = reference
+        """The fixed reference image file path."""
+
+        self.workflow = self._create_workflow()
+        """The quick-look execution workflow."""
+
+    def run(self, in_files, mask=None):
+        """
+        Runs the quick-look workflow on the given volume images.
+
+        :param in_files: the input volume image files
+        :param mask: the optional image mask file path
+        :return: the dictionary with the following items:
+
+            - *displacements*: the {volume number: RMS displacement}
+              dictionary
+
+            - *score*: the scan motion score
+
+            - *register*: flag indicating whether the full registration
+              is recommended
+
+            or None if the :attr:`dry_run` flag is set
+        """
+        input_spec = self.workflow.get_node('input_spec')
+        if mask:
+            input_spec.inputs.mask = mask
+        iter_input = self.workflow.get_node('iter_input')
+        iter_input.iterables = ('in_file', in_files)
+
+        wf_res = self._run_workflow()
+        if not wf_res:
+            return None
+        collect_res = next(n for n in wf_res.nodes()
+                           if n.name == 'collect_displacements')
+        collected = collect_res.inputs.get()
+
+        return self._motion_summary(collected['in_files'],
+                                    collected['displacements'])
+
+    def _motion_summary(self, in_files, displacements):
+        """
+        :param in_files: the registered volume image files
+        :param displacements: the corresponding volume RMS
+            displacements
+        :return: the :meth:`run` result dictionary
+        """
+        vol_displacements = {
+            _extract_volume_number(location): displacement
+            for location, displacement in zip(in_files, displacements)
+        }
+        if vol_displacements:
+            score = max(vol_displacements.itervalues())
+        else:
+            score = 0.0
+        motion_cfg = self.configuration.get(MOTION_CONF_SECTION, {})
+        threshold = motion_cfg.get('threshold', DEF_MOTION_THRESHOLD)
+        self.logger.debug("The %d volume quick-look motion score is %.2f"
+                          " mm." % (len(vol_displacements), score))
+
+        return dict(displacements=vol_displacements, score=score,
+                    register=score > threshold)
+
+    def _create_workflow(self):
+        """
+        Makes the Nipype quick-look workflow. The workflow input is the
+        *input_spec* node consisting of the *reference* and optional
+        *mask* fields. The ``iter_input`` node *in_file* field
+        iterates over the volumes. The volume displacements are
+        collected in the ``collect_displacements`` node *in_files*
+        and *displacements* fields.
+
+        :return: the Nipype workflow
+        """
+        workflow = pe.Workflow(name='quick_look', base_dir=self.base_dir)
+        input_spec = pe.Node(IdentityInterface(fields=['reference', 'mask']),
+                             name='input_spec')
+        input_spec.inputs.reference = self.reference
+        iter_input = pe.Node(IdentityInterface(fields=['in_file']),
+                             name='iter_input')
+
+        # The quick settings override the ants.Registration settings.
+        reg_cfg = dict(self._interface_configuration(Registration))
+        quick_cfg = self.configuration.get(QUICK_CONF_SECTION, {})
+        reg_cfg.update(quick_cfg)
+        # The Nipype metric work-around described in
+        # RegisterImageWorkflow.
+        metric_inputs = {field: reg_cfg[field]
+                         for field in ['metric', 'metric_weight']
+                         if field in reg_cfg}
+        register = pe.Node(Registration(float=True, **metric_inputs),
+                           name='register')
+        workflow.connect(input_spec, 'reference', register, 'fixed_image')
+        workflow.connect(iter_input, 'in_file', register, 'moving_image')
+        workflow.connect(input_spec, 'mask', register, 'moving_image_mask')
+        workflow.connect(input_spec, 'mask', register, 'fixed_image_mask')
+
+        # Measure the affine transform displacement.
+        measure_xfc = Function(input_names=['transforms', 'reference',
+                                            'radius'],
+                               output_names=['displacement'],
+                               function=_measure_motion)
+        measure = pe.Node(measure_xfc, name='measure_motion')
+        motion_cfg = self.configuration.get(MOTION_CONF_SECTION, {})
+        if 'radius' in motion_cfg:
+            measure.inputs.radius = motion_cfg['radius']
+        workflow.connect(register, 'forward_transforms',
+                         measure, 'transforms')
+        workflow.connect(input_spec, 'reference', measure, 'reference')
+
+        # Collect the volume displacements.
+        collect_fields = ['in_files', 'displacements']
+        collect_xfc = IdentityInterface(fields=collect_fields)
+        collect = pe.JoinNode(collect_xfc, joinsource='iter_input',
+                              joinfield=collect_fields,
+                              name='collect_displacements')
+        workflow.connect(iter_input, 'in_file', collect, 'in_files')
+        workflow.connect(measure, 'displacement', collect, 'displacements')
+
+        self._configure_nodes(workflow)
+        if quick_cfg:
+            self._set_node_inputs(register, **quick_cfg)
+
+        self.logger.debug("Created the %s workflow." % workflow.name)
+        # If debug is set, then diagram the workflow graph.
+        if self.logger.level <= logging.DEBUG:
+            self.depict_workflow(workflow)
+
+        return workflow
+
+
+def _set_ants_threads(workflow, threads):
+    """
+    :param workflow: the workflow whose ANTs nodes are set
+    :param threads: the ANTs node thread count
+    """
+    for name in workflow.list_node_names():
+        node = workflow.get_node(name)
+        if isinstance(node.interface, ANTSCommand):
+            node.inputs.num_threads = threads
+
+
 ### Utility functions called by the workflow nodes. ###
 
-def _generate_resource_name():
+def _sort_volumes(in_files):
+    """
+    :param in_files: the volume image files
+    :return: the files sorted by volume number
     """
-    Makes a resource name unique within the scope of the session
-    up to one registration per session per hour.
+    from qipipe.pipeline.registration import _extract_volume_number
 
-    :return: the resource name
+    return sorted(in_files, key=_extract_volume_number)
+
+
+def _cache_volume_interface():
+    """
+    :return: the :meth:`_cache_volume` Function interface
+    """
+    return Function(input_names=['in_file', 'volume_keys', 'out_file',
+                                 'transform'],
+                    output_names=['out_file', 'transform'],
+                    function=_cache_volume)
+
+
+def _cache_volume(in_file, volume_keys, out_file, transform=None):
+    """
+    Caches the given volume registration result.
+
+    :param in_file: the input volume image file
+    :param volume_keys: the {input file: volume cache key} dictionary
+    :param out_file: the realigned image file
+    :param transform: the ANTs transform file
+    :return: the (out_file, transform) tuple
     """
-    return REG_PREFIX + qiutil.uid.generate_string_uid(modulo='h')
+    from qipipe.helpers import stage_cache
+    from qipipe.pipeline.registration import VOLUME_CACHE_STAGE
+
+    result = dict(out_file=out_file, transform=transform)
+    stage_cache.store(VOLUME_CACHE_STAGE, volume_keys[in_file], result)
+
+    return out_file, transform
 
 
 def _create_profile(technique, configuration, sections, reference, resource):
@@ -704,29 +1438,79 @@ def _create_profile(technique, configuration, sections, reference, resource):
     return metadata.create_profile(prf_cfg, sections, dest=cfg_base_name)
 
 
-def _symlink_in_place(in_file, link_name):
+def _crop(in_file, reference, mask=None, margin=None):
+    """
+    Crops the given images to the mask bounding box, as described in
+    :mod:`qipipe.helpers.crop`.
+
+    :param in_file: the moving image file path
+    :param reference: the fixed image file path
+    :param mask: the mask file path
+    :param margin: the bounding box margin (default
+        :const:`qipipe.helpers.crop.DEF_MARGIN`)
+    :return: the (moving, fixed, mask) file paths
+    :raise ValueError: if there is no mask
     """
-    Creates a symlink from *in_file* to the target *link_name*
-    within the same parent directory, e.g. for current directory
-    ``/a/b/``::
+    import os
+    from qipipe.helpers import crop
 
-        >>  _symlink_in_place('c/d/src.txt', 'tgt.txt')
-        "/a/b/c/d/tgt.txt"
+    if not mask:
+        raise ValueError("Registration cropping requires a mask")
+    if margin is None:
+        margin = crop.DEF_MARGIN
+    bounds = crop.bounding_box(mask, margin)
+    outputs = []
+    for prefix, location in [('moving', in_file), ('fixed', reference),
+                             ('mask', mask)]:
+        out_file = os.path.abspath("%s_%s" % (prefix,
+                                               os.path.basename(location)))
+        outputs.append(crop.crop(location, bounds, out_file))
 
-    where the link source is ``src.txt``.
+    return tuple(outputs)
 
-    :param in_file: the input file path
-    :param link_name: the link base name
-    :return: the absolute link file path
+
+def _measure_quality(reference, in_files, resource, mask=None, bins=None):
+    """
+    Makes the :mod:`qipipe.helpers.similarity` registration quality
+    table. The output file base name is _resource_``_qa.csv``.
+
+    :param reference: the fixed reference image file path
+    :param in_files: the registration volume image files
+    :param resource: the registration resource name
+    :param mask: the optional mask file path
+    :param bins: the mutual information histogram bin count (default
+        :const:`qipipe.helpers.similarity.DEF_BINS`)
+    :return: the quality table file path
     """
     import os
+    from qipipe.helpers import similarity
 
-    in_file = os.path.abspath(in_file)
-    in_dir, in_base_name = os.path.split(in_file)
-    dest_file = os.path.join(in_dir, link_name)
-    os.symlink(in_base_name, dest_file)
+    if bins is None:
+        bins = similarity.DEF_BINS
+    # The reference is not compared to itself.
+    volumes = [location for location in in_files if location != reference]
+    results = similarity.measure_volumes(reference, volumes, mask, bins)
+    dest = os.path.abspath("%s_qa.csv" % resource)
 
-    return dest_file
+    return similarity.write_table(results, dest)
+
+
+def _measure_motion(transforms, reference, radius=None):
+    """
+    :param transforms: the ANTs registration forward transforms
+    :param reference: the fixed reference image file path
+    :param radius: the displacement sphere radius (default
+        :const:`qipipe.helpers.motion.DEF_RADIUS`)
+    :return: the final affine transform RMS displacement of the
+        sphere centered on the reference image
+    """
+    from qipipe.helpers import motion
+
+    if radius is None:
+        radius = motion.DEF_RADIUS
+    origin = motion.image_center(reference)
+
+    return motion.transform_displacement(transforms[-1], origin, radius)
 
 
 def _base_name(in_file):
@@ -751,23 +1535,20 @@ def _copy_files(in_files, dest):
             for in_file in in_files]
 
 
-def _recurse(workflow, input_nodes, output_nodes, reference):
+def _chain_volumes(in_files, reference):
     """
-    Sets the given workflow input *reference*. The reference
-    for the first input node is the *reference* file.
-    The reference for each subsequent node is the prior
-    registration result.
+    Splits the given volumes into the chains described in
+    :class:`RegisterScanWorkflow`. Each chain is ordered by
+    distance from the reference volume.
 
-    :param workflow: the workflow delegate which connects nodes
-    :param input_nodes: the iterable expansion input scan image nodes
-    :param output_nodes: the iterable expansion registration output
-        nodes
-    :param reference: the starting reference input node
+    :param in_files: the input volume image files
+    :param reference: the reference volume number
+    :return: the (before, after) chain lists
     """
-    # The reference for the first node is the initial reference.
-    input_nodes[0].inputs.reference = reference
-    # The reference for the remaining nodes is the previous
-    # registration result.
-    for i in range(1, node_cnt - 1):
-        workflow.connect(output_nodes[i], 'out_file',
-                         input_nodes[i + 1], 'reference')
+    volumes = sorted(in_files, key=_extract_volume_number)
+    before = [location for location in reversed(volumes)
+              if _extract_volume_number(location) < reference]
+    after = [location for location in volumes
+             if _extract_volume_number(location) > reference]
+
+    return before, after
@@ -5,14 +5,12 @@
 import os
 import re
 import logging
+from collections import defaultdict
 from nipype.pipeline import engine as pe
-from nipype.interfaces.dcmstack import MergeNifti
 from nipype.interfaces.utility import (IdentityInterface, Function)
 import qiutil
 from ..helpers.logging import logger
-from ..interfaces import (
-    StickyIdentityInterface, ConvertBoleroMask, ReorderBoleroMask, XNATUpload
-)
+from ..interfaces import (StickyIdentityInterface, XNATUpload)
 from .workflow_base import WorkflowBase
 from .pipeline_error import PipelineError
 
@@ -47,7 +45,7 @@ class ROIWorkflow(WorkflowBase):
     The ROIWorkflow class builds and executes the ROI workflow which
     converts the BOLERO mask ``.bqf`` files to NIfTI.
 
-    The ROI workflow input consists of the *input_spec* and *iter_slice*
+    The ROI workflow input consists of the *input_spec* and *iter_lesion*
     nodes. The *input_spec* contains the following input fields:
 
     - *subject*: the subject name
@@ -58,15 +56,18 @@ class ROIWorkflow(WorkflowBase):
 
     - *time_series*: the 4D time series file path
 
-    - *lesion*: the lesion number
+    The *iter_lesion* contains the following input fields:
 
-    The *iter_slice* contains the following input fields:
+    - *lesion*: the lesion number
 
-    - *slice_sequence_number*: the one-based slice sequence number
+    - *slices*: the lesion (slice sequence number, ``.bqf`` file)
+      tuples
 
-    - *in_file*: the ROI mask``.bqf`` file to convert
+    The ``.bqf`` slice files of each lesion are rasterized in-process
+    into one 3D mask, as described in
+    :meth:`qipipe.helpers.roi.bolero_mask`.
 
-    The output is the 3D mask NIfTI file location. The file name
+    The output is the 3D mask NIfTI file locations. The file name
     is *lesion*\ ``.nii.gz``.
     """
 
@@ -94,7 +95,7 @@ class ROIWorkflow(WorkflowBase):
         :param inputs: the input
             (lesion number, slice sequence number, in_file)
             tuples to convert
-        :return: the XNAT converted ROI resource name, or None if
+        :return: the converted 3D lesion mask files, or None if
             there were no inputs
         """
         if not inputs:
@@ -113,14 +114,14 @@ class ROIWorkflow(WorkflowBase):
 
         # The magic incantation to get the Nipype workflow result.
         output_res = next(n for n in wf_res.nodes() if n.name == 'output_spec')
-        out_file = output_res.inputs.get()['out_file']
+        out_files = output_res.inputs.get()['out_files']
         self.logger.debug(
             "Executed the %s workflow on the %s %s scan %d to create"
-            " the 3D ROI mask file %s." %
-            (self.workflow.name, subject, session, scan, out_file)
+            " the 3D ROI mask files %s." %
+            (self.workflow.name, subject, session, scan, out_files)
         )
 
-        return out_file
+        return out_files
 
     def _set_inputs(self, subject, session, scan, time_series, *inputs):
         """
@@ -140,18 +141,16 @@ class ROIWorkflow(WorkflowBase):
         input_spec.inputs.scan = scan
         input_spec.inputs.time_series = time_series
 
-        # Unpack and roll up the ROI inputs into separate iterable
-        # lists.
-        lesions = [roi.lesion for roi in inputs]
-        slice_seq_nbrs = [roi.slice for roi in inputs]
-        in_files = [roi.location for roi in inputs]
-        iter_dict = dict(lesion=lesions, slice_sequence_number=slice_seq_nbrs,
-                         in_file=in_files)
-        iterables = iter_dict.items()
-        iter_slice = self.workflow.get_node('iter_slice')
-        iter_slice.iterables = iterables
-        # Iterate over the ROI input fields in lock-step.
-        iter_slice.synchronize = True
+        # Group the ROI slices by lesion.
+        lesion_slices = defaultdict(list)
+        for roi in inputs:
+            lesion_slices[roi.lesion].append((roi.slice, roi.location))
+        lesions = sorted(lesion_slices)
+        slices = [sorted(lesion_slices[lesion]) for lesion in lesions]
+        iter_lesion = self.workflow.get_node('iter_lesion')
+        iter_lesion.iterables = [('lesion', lesions), ('slices', slices)]
+        # Iterate over the lesion input fields in lock-step.
+        iter_lesion.synchronize = True
 
     def _create_workflow(self, **opts):
         """
@@ -169,8 +168,7 @@ class ROIWorkflow(WorkflowBase):
         - *time_series*: the 4D scan time series
 
         In addition, the workflow runner has the responsibility of setting the
-        ``iter_slice`` synchronized (lesion, slice_sequence_number, in_file)
-        iterables.
+        ``iter_lesion`` synchronized (lesion, slices) iterables.
 
         :param opts: the workflow creation options:
         :return: the execution workflow
@@ -185,35 +183,26 @@ class ROIWorkflow(WorkflowBase):
                              name='input_spec')
         input_spec.inputs.resource = ROI_RESOURCE
 
-        # The input ROI tuples are iterable.
-        iter_slice_fields = ['lesion', 'slice_sequence_number', 'in_file']
-        iter_slice = pe.Node(IdentityInterface(fields=iter_slice_fields),
-                             name='iter_slice')
-
-        # The merged 3D output file base name.
-        basename_xfc = Function(input_names=['lesion'],
-                                output_names=['basename'],
-                                function=base_name)
-        basename = pe.Node(basename_xfc, name='basename')
-        workflow.connect(iter_slice, 'lesion', basename, 'lesion')
-
-        # Convert the input file.
-        convert = pe.Node(ConvertBoleroMask(), name='convert')
-        workflow.connect(iter_slice, 'in_file', convert, 'in_file')
-        workflow.connect(iter_slice, 'slice_sequence_number',
-                         convert, 'slice_sequence_number')
+        # The input lesion slices are iterable.
+        iter_lesion_fields = ['lesion', 'slices']
+        iter_lesion = pe.Node(IdentityInterface(fields=iter_lesion_fields),
+                              name='iter_lesion')
+
+        # Convert the lesion slice files into one 3D mask.
+        convert_xfc = Function(input_names=['time_series', 'lesion',
+                                            'slices'],
+                               output_names=['out_file'],
+                               function=convert_lesion)
+        convert = pe.Node(convert_xfc, name='convert')
         workflow.connect(input_spec, 'time_series', convert, 'time_series')
-        workflow.connect(basename, 'basename', convert, 'out_base')
-
-        # Reorder the mask slice.
-        reorder = pe.Node(ReorderBoleroMask(), name='reorder')
-        workflow.connect(convert, 'out_file', reorder, 'in_file')
+        workflow.connect(iter_lesion, 'lesion', convert, 'lesion')
+        workflow.connect(iter_lesion, 'slices', convert, 'slices')
 
-        # Merge the slices.
-        merge = pe.JoinNode(MergeNifti(), joinsource='iter_slice',
-                            joinfield='in_files', name='merge_slices')
-        workflow.connect(reorder, 'out_file', merge, 'in_files')
-        workflow.connect(basename, 'basename', merge, 'out_format')
+        # Collect the lesion masks.
+        collect_xfc = IdentityInterface(fields=['out_files'])
+        collect = pe.JoinNode(collect_xfc, joinsource='iter_lesion',
+                              joinfield='out_files', name='collect_lesions')
+        workflow.connect(convert, 'out_file', collect, 'out_files')
 
         # Upload the ROI result into the XNAT ROI resource.
         upload_roi_xfc = XNATUpload(project=self.project,
@@ -222,12 +211,12 @@ class ROIWorkflow(WorkflowBase):
         workflow.connect(input_spec, 'subject', upload_roi, 'subject')
         workflow.connect(input_spec, 'session', upload_roi, 'session')
         workflow.connect(input_spec, 'scan', upload_roi, 'scan')
-        workflow.connect(merge, 'out_file', upload_roi, 'in_files')
+        workflow.connect(collect, 'out_files', upload_roi, 'in_files')
 
-        # The output is the 3D ROI overlay.
-        output_xfc = StickyIdentityInterface(fields=['out_file'])
+        # The output is the 3D ROI overlays.
+        output_xfc = StickyIdentityInterface(fields=['out_files'])
         output_spec = pe.Node(output_xfc, name='output_spec')
-        workflow.connect(merge, 'out_file', output_spec, 'out_file')
+        workflow.connect(collect, 'out_files', output_spec, 'out_files')
 
         self._configure_nodes(workflow)
 
@@ -249,3 +238,23 @@ def base_name(lesion):
     from qipipe.pipeline.roi import ROI_FNAME_PAT
 
     return ROI_FNAME_PAT % lesion
+
+
+def convert_lesion(time_series, lesion, slices):
+    """
+    Makes the lesion 3D mask, as described in
+    :meth:`qipipe.helpers.roi.bolero_mask`.
+
+    :param time_series: the 4D time series file path
+    :param lesion: the lesion number
+    :param slices: the (slice sequence number, ``.bqf`` file) tuples
+    :return: the lesion mask file path
+    """
+    import os
+    from qipipe.helpers import roi
+    from qipipe.pipeline.roi import base_name
+
+    out_file = os.path.abspath(base_name(lesion) + '.nii.gz')
+    roi.bolero_mask(time_series, slices, out_file=out_file)
+
+    return out_file
@@ -11,7 +11,9 @@ if not on_rtd:
     with warnings.catch_warnings():
         warnings.simplefilter(action='ignore', category=FutureWarning)
         from nipype.pipeline import engine as pe
-        from nipype.interfaces.utility import (IdentityInterface, Function)
+        from nipype.interfaces.utility import (
+            IdentityInterface, Function, Merge
+        )
         from nipype.interfaces.dcmstack import (DcmStack, MergeNifti)
 import qixnat
 from ..interfaces import (StickyIdentityInterface, FixDicom, Compress)
@@ -20,6 +22,7 @@ from ..helpers.constants import (
     SCAN_TS_BASE, SCAN_TS_FILE, VOLUME_DIR_PAT, VOLUME_FILE_PAT
 )
 from ..helpers.logging import logger
+from ..helpers import thread_budget
 from ..staging import (iterator, image_collection)
 from ..staging.ohsu import MULTI_VOLUME_SCAN_NUMBERS
 from ..staging.sort import sort
@@ -111,6 +114,22 @@ class ScanStagingWorkflow(WorkflowBase):
     of the following output field:
 
     - *out_file*: the 3D volume stack NIfTI image file
+
+    If the *registration* option is set, then each volume is
+    registered as soon as it and the reference volume are staged,
+    concurrently with the staging of the other volumes and the scan
+    time series merge and upload. In that case, the reference volume
+    is staged first by the *stage_reference* node, and the
+    *iter_volume* node iterates over the remaining volumes. The
+    volume registrations are cached as described in
+    :meth:`qipipe.pipeline.registration.RegisterScanWorkflow.register_volume`.
+    The subsequent scan registration reuses the cached volume
+    registrations and only merges and uploads the result. The
+    registration *cpu_budget* option, or all local CPUs if that
+    option is not set, is divided among the concurrent volume
+    registrations as described in
+    :meth:`qipipe.helpers.thread_budget.schedule`, using the
+    registration ``thread_budget`` configuration.
     """
 
     def __init__(self, is_multi_volume=True, **opts):
@@ -118,17 +137,47 @@ class ScanStagingWorkflow(WorkflowBase):
         :param is_multi_volume: flag indicating whether to include
             volume merge tasks
         :param opts: the :class:`qipipe.pipeline.workflow_base.WorkflowBase`
-            initializer keyword arguments
+            initializer keyword arguments, as well as the following
+            keyword option:
+        :keyword registration: the pipelined volume registration
+            {*reference*, *mask*, *opts*} dictionary, where *reference*
+            is the one-based reference volume position, *mask* is the
+            optional mask file and *opts* is the
+            :meth:`qipipe.pipeline.registration.register_volume`
+            keyword options
         """
+        registration = opts.pop('registration', None)
         super(ScanStagingWorkflow, self).__init__(__name__, **opts)
 
-        # Make the workflow.
-        self.workflow = self._create_workflow(is_multi_volume)
+        self.registration = registration if is_multi_volume else None
+        """The pipelined volume registration options."""
+
+        # Make the workflow from the scan staging template.
+        pipelined = bool(self.registration)
+        self.workflow = self._cached_workflow(
+            lambda: self._create_workflow(is_multi_volume, pipelined),
+            is_multi_volume, pipelined
+        )
         """
         The scan staging workflow sequence described in
         :class:`qipipe.pipeline.staging.StagingWorkflow`.
         """
 
+        # Reset the template inputs which depend on this workflow
+        # instance.
+        stage = self.workflow.get_node('stage_volume')
+        stage.inputs.opts = self._child_options()
+        upload = self.workflow.get_node('upload')
+        upload.inputs.project = self.project
+        if pipelined:
+            stage_ref = self.workflow.get_node('stage_reference')
+            stage_ref.inputs.opts = self._child_options()
+            register = self.workflow.get_node('register_volume')
+            register.inputs.opts = self.registration.get('opts', {})
+            mask = self.registration.get('mask')
+            if mask:
+                register.inputs.mask = mask
+
     def run(self, collection, subject, session, scan, vol_dcm_dict, dest):
         """
         Executes this scan staging workflow.
@@ -159,6 +208,12 @@ class ScanStagingWorkflow(WorkflowBase):
 
         # Prime the volume iterator.
         in_volumes = sorted(vol_dcm_dict.iterkeys())
+        if self.registration:
+            # Stage the reference volume separately.
+            ref_volume = in_volumes.pop(self.registration['reference'] - 1)
+            stage_ref = self.workflow.get_node('stage_reference')
+            stage_ref.inputs.volume = ref_volume
+            stage_ref.inputs.in_files = vol_dcm_dict[ref_volume]
         dcm_files = [vol_dcm_dict[v] for v in in_volumes]
         iter_dict = dict(volume=in_volumes, in_files=dcm_files)
         iterables = iter_dict.items()
@@ -168,8 +223,14 @@ class ScanStagingWorkflow(WorkflowBase):
         # in lock-step.
         iter_volume.synchronize = True
 
-        # Execute the workflow.
-        wf_res = self._run_workflow()
+        # Execute the workflow. The pipelined volume registrations
+        # overlap with staging on the local host only if the nodes
+        # run concurrently.
+        if self.registration:
+            local_opts = self._budget_registration(len(in_volumes))
+        else:
+            local_opts = {}
+        wf_res = self._run_workflow(**local_opts)
         # If dry_run, then _run_workflow is a no-op.
         if not wf_res:
             return
@@ -189,13 +250,42 @@ class ScanStagingWorkflow(WorkflowBase):
         # Return the (time series, volume files) result.
         return time_series, volume_files
 
-    def _create_workflow(self, is_multi_volume=True):
+    def _budget_registration(self, volume_cnt):
+        """
+        Sets the pipelined volume registration ANTs thread count from
+        the registration CPU budget, as described in
+        :class:`ScanStagingWorkflow`.
+
+        :param volume_cnt: the number of volumes to register
+        :return: the local Nipype ``MultiProc`` run options
+        """
+        from .registration import THREAD_BUDGET_CONF_SECTION
+
+        reg_opts = self.registration.get('opts', {})
+        reg_cfg = self._load_configuration('registration')
+        budget_cfg = reg_cfg.get(THREAD_BUDGET_CONF_SECTION, {})
+        concurrency, threads = thread_budget.schedule(
+            volume_cnt, cpus=reg_opts.get('cpu_budget'),
+            job_memory=budget_cfg.get('job_memory'),
+            threads_per_job=budget_cfg.get('threads_per_job')
+        )
+        register = self.workflow.get_node('register_volume')
+        register.inputs.opts = dict(reg_opts, num_threads=threads)
+        self.logger.debug("Running %d concurrent pipelined volume"
+                          " registrations with %d threads each." %
+                          (concurrency, threads))
+
+        return dict(plugin='MultiProc', plugin_args=dict(n_procs=concurrency))
+
+    def _create_workflow(self, is_multi_volume=True, pipelined=False):
         """
         Makes the staging workflow described in
         :class:`qipipe.pipeline.staging.StagingWorkflow`.
 
         :param is_multi_volume: flag indicating whether to include
             volume merge tasks
+        :param pipelined: flag indicating whether to register each
+            volume after it is staged
         :return: the new workflow
         """
         self.logger.debug('Building the scan staging workflow...')
@@ -238,6 +328,29 @@ class ScanStagingWorkflow(WorkflowBase):
         )
         workflow.connect(stage, 'out_file', collect_vols, 'volume_files')
 
+        # The staged volumes node and field.
+        if pipelined:
+            # Stage the reference volume before the other volumes.
+            stage_ref = pe.Node(stg_xfc, name='stage_reference')
+            stage_ref.inputs.opts = self._child_options()
+            for fld in stg_fields:
+                workflow.connect(input_spec, fld, stage_ref, fld)
+            # Register each volume against the staged reference.
+            reg_xfc = Function(input_names=['in_file', 'reference', 'mask',
+                                            'opts'],
+                               output_names=['out_file'],
+                               function=_register_volume)
+            register = pe.Node(reg_xfc, name='register_volume')
+            workflow.connect(stage, 'out_file', register, 'in_file')
+            workflow.connect(stage_ref, 'out_file', register, 'reference')
+            # Add the reference volume to the staged volumes.
+            all_vols = pe.Node(Merge(2), name='all_volumes')
+            workflow.connect(stage_ref, 'out_file', all_vols, 'in1')
+            workflow.connect(collect_vols, 'volume_files', all_vols, 'in2')
+            staged, staged_fld = all_vols, 'out'
+        else:
+            staged, staged_fld = collect_vols, 'volume_files'
+
         # Upload the processed DICOM and NIfTI files.
         # The upload out_files output is the volume files.
         upload_fields = (
@@ -253,15 +366,14 @@ class ScanStagingWorkflow(WorkflowBase):
         workflow.connect(input_spec, 'session', upload, 'session')
         workflow.connect(input_spec, 'scan', upload, 'scan')
         workflow.connect(input_spec, 'dest', upload, 'dcm_dir')
-        workflow.connect(collect_vols, 'volume_files', upload, 'volume_files')
+        workflow.connect(staged, staged_fld, upload, 'volume_files')
         if is_multi_volume:
             # Merge the volumes.
             merge_xfc = MergeNifti(out_format=SCAN_TS_BASE)
             merge = pe.Node(merge_xfc, name='merge')
             workflow.connect(input_spec, 'volume_tag',
                              merge, 'sort_order')
-            workflow.connect(collect_vols, 'volume_files',
-                             merge, 'in_files')
+            workflow.connect(staged, staged_fld, merge, 'in_files')
             workflow.connect(merge, 'out_file',
                              upload, 'time_series')
             self.logger.debug('Connected staging to scan time series merge.')
@@ -273,8 +385,7 @@ class ScanStagingWorkflow(WorkflowBase):
         output_fields = ['time_series', 'volume_files']
         output_spec = pe.Node(StickyIdentityInterface(fields=output_fields),
                               name='output_spec')
-        workflow.connect(collect_vols, 'volume_files',
-                         output_spec, 'volume_files')
+        workflow.connect(staged, staged_fld, output_spec, 'volume_files')
         if is_multi_volume:
             workflow.connect(merge, 'out_file', output_spec, 'time_series')
         else:
@@ -392,8 +503,8 @@ class VolumeStagingWorkflow(WorkflowBase):
         """
         super(VolumeStagingWorkflow, self).__init__(__name__, **opts)
 
-        # Make the workflow.
-        self.workflow = self._create_workflow()
+        # Make the workflow from the volume staging template.
+        self.workflow = self._cached_workflow(self._create_workflow)
         """
         The staging workflow sequence described in
         :class:`qipipe.pipeline.staging.StagingWorkflow`.
@@ -563,6 +674,33 @@ def stage_volume(collection, subject, session, scan, volume, in_files,
     return out_file
 
 
+def _register_volume(in_file, reference, opts, mask=None):
+    """
+    Registers the given staged volume as described in
+    :meth:`qipipe.pipeline.registration.register_volume`. The
+    registration runs in the node directory, since the volumes are
+    registered concurrently.
+
+    :param in_file: the staged 3D NIfTI volume file
+    :param reference: the staged 3D NIfTI reference volume file
+    :param opts: the :meth:`qipipe.pipeline.registration.register_volume`
+        keyword options
+    :param mask: the optional mask file
+    :return: the realigned volume file
+    """
+    import os
+    from nipype.interfaces.traits_extension import isdefined
+    from qipipe.pipeline import registration
+
+    # Transform a Nipype undefined to the default value.
+    if not isdefined(mask):
+        mask = None
+    reg_opts = dict(opts, base_dir=os.getcwd())
+
+    return registration.register_volume(in_file, reference, mask=mask,
+                                        **reg_opts)
+
+
 def _upload(project, subject, session, scan, dcm_dir, volume_files,
             time_series=None):
     """
@@ -1,15 +1,30 @@
 import os
 import re
+import copy
 import pprint
+import logging
 import networkx as nx
 import qixnat
 from ..helpers.logging import logger
+from ..helpers import cache
 from qiutil.collections import EMPTY_DICT
 from qiutil.ast_config import read_config
 from ..helpers.constants import CONF_DIR
 from ..helpers.distributable import DISTRIBUTABLE
 from .pipeline_error import PipelineError
 
+_configurations = {}
+"""
+The {configuration files signature: configuration} cache described
+in :meth:`WorkflowBase._load_configuration`.
+"""
+
+_templates = {}
+"""
+The {template key: workflow} built workflow template cache described
+in :meth:`WorkflowBase._cached_workflow`.
+"""
+
 
 class WorkflowBase(object):
     """
@@ -122,13 +137,16 @@ class WorkflowBase(object):
         """The workflow node inputs configuration directory."""
 
         cfg_name = name.split('.')[-1]
+        self._config_name = cfg_name
         self.configuration = self._load_configuration(cfg_name)
         """The workflow node inputs configuration."""
 
-        config_s = pprint.pformat(self.configuration)
-        self.logger.debug("Pipeline configuration:")
-        for line in config_s.split("\n"):
-            self.logger.debug(line)
+        # Format the configuration only if it will be logged.
+        if self.logger.level <= logging.DEBUG:
+            config_s = pprint.pformat(self.configuration)
+            self.logger.debug("Pipeline configuration:")
+            for line in config_s.split("\n"):
+                self.logger.debug(line)
 
         # The distributable option is only set if the qipipe command
         # option --no-submit is set. In that case, distributable is
@@ -199,10 +217,49 @@ class WorkflowBase(object):
 
         return opts
 
+    def _cached_workflow(self, factory, *key):
+        """
+        Returns a copy of the workflow built by the given factory.
+        The built workflow is retained as a template in this process,
+        keyed by this workflow class, the configuration files and
+        their modification times, the cluster submission setting and
+        the given *key* values. A later workflow with the same template
+        key is a copy of the template rather than a new build. The
+        caller then only sets the inputs and iterables which vary
+        between executions.
+
+        The copy :attr:`base_dir` is set to this workflow's base
+        directory.
+
+        :param factory: the callable which builds the workflow
+        :param key: the additional values which determine the workflow
+            graph and the node inputs set by the *factory*
+        :return: the new workflow
+        """
+        cfg_files = (self._configuration_files('default') +
+                     self._configuration_files(self._config_name))
+        template_key = ((self.__class__.__name__, self.is_distributable,
+                         self.plug_in, cache.file_signature(*cfg_files)) +
+                        key)
+        template = _templates.get(template_key)
+        if template:
+            self.logger.debug("Copying the %s workflow template..." %
+                              template.name)
+        else:
+            template = factory()
+            _templates[template_key] = template
+        workflow = copy.deepcopy(template)
+        workflow.base_dir = self.base_dir
+
+        return workflow
+
     def _load_configuration(self, name):
         """
         Loads the workflow configuration, as described in
-        :class:`WorkflowBase`.
+        :class:`WorkflowBase`. The configuration files are read once
+        per process for a given set of configuration file locations
+        and modification times. Each call returns a copy of the cached
+        configuration, since the caller is free to modify the result.
 
         :param name: the configuration file base name without extension
         :return: the configuration dictionary
@@ -219,12 +276,16 @@ class WorkflowBase(object):
         # All path configuration files.
         cfg_files = def_cfg_files + wf_cfg_files
 
-        # Load the configuration.
-        self.logger.debug("Loading the %s configuration files %s..." %
-                          (name, cfg_files))
-        cfg = read_config(*cfg_files)
+        # Load the configuration, if necessary.
+        cfg_key = cache.file_signature(*cfg_files)
+        cfg = _configurations.get(cfg_key)
+        if cfg is None:
+            self.logger.debug("Loading the %s configuration files %s..." %
+                              (name, cfg_files))
+            cfg = dict(read_config(*cfg_files))
+            _configurations[cfg_key] = cfg
 
-        return dict(cfg)
+        return copy.deepcopy(cfg)
 
     def _configuration_files(self, name):
         """
@@ -261,10 +322,47 @@ class WorkflowBase(object):
         """
         return xnat.download(self.project, subject, session, dest=dest)
 
-    def _run_workflow(self):
+    def _restore_resource(self, subject, session, scan, resource, in_files):
+        """
+        Uploads the given files to the XNAT scan resource, if they
+        are not already there. A stage cache hit stands for a prior
+        upload, which is missing if the session was deleted or staged
+        again in the meantime.
+
+        :param subject: the XNAT subject label
+        :param session: the XNAT session label
+        :param scan: the scan number
+        :param resource: the XNAT resource name
+        :param in_files: the cached resource files
+        :return: the uploaded file paths
+        """
+        with qixnat.connect() as xnat:
+            rsc = xnat.find_one(self.project, subject, session, scan=scan,
+                                resource=resource)
+            xnat_files = set(rsc.files().get()) if rsc else set()
+            missing = [location for location in in_files
+                       if os.path.basename(location) not in xnat_files]
+            if missing:
+                if not rsc:
+                    # The modality is required to create the scan.
+                    rsc = xnat.find_or_create(self.project, subject, session,
+                                              scan=scan, resource=resource,
+                                              modality='MR')
+                xnat.upload(rsc, *missing)
+        if missing:
+            self.logger.debug("Uploaded %d cached %s %s scan %d %s files"
+                              " to XNAT." % (len(missing), subject, session,
+                                             scan, resource))
+
+        return missing
+
+    def _run_workflow(self, **local_opts):
         """
         Executes the Nipype workflow.
 
+        :param local_opts: the Nipype workflow run options, e.g. a
+            local ``MultiProc`` plug-in, which apply if the workflow
+            is not distributable
         :return: the workflow execution result graph
         """
         # If the workflow can be distributed, then get the plugin
@@ -276,7 +374,7 @@ class WorkflowBase(object):
         if self.is_distributable:
             opts = self._configure_plugin()
         else:
-            opts = {}
+            opts = local_opts
 
         # Set the base directory to an absolute path.
         if self.workflow.base_dir:
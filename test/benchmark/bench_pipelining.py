@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Measures the end-to-end staging and registration wall time of the
+:mod:`qipipe.pipeline.qipipeline` on the synthetic staging fixtures
+with and without the pipelined registration described in
+:class:`qipipe.pipeline.staging.ScanStagingWorkflow`. Each run stages
+into a fresh work area and stage cache, and the test subjects are
+deleted from XNAT before each run. The benchmark requires XNAT and,
+for a technique other than ``mock``, the registration tools.
+
+Usage::
+
+    python test/benchmark/bench_pipelining.py [--collection Breast]
+        [--technique mock] [--reference 1] [--repeat N]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import qixnat
+from qipipe.pipeline import qipipeline
+from qipipe.helpers.cache import CACHE_DIR_ENV_VAR
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+"""The test parent directory."""
+
+FIXTURES = os.path.join(ROOT, 'fixtures', 'staging')
+"""The synthetic staging fixtures directory."""
+
+# The test package precedes the standard library test package.
+sys.path.insert(0, os.path.dirname(ROOT))
+from test import (PROJECT, CONF_DIR)
+from test.helpers.staging import subject_sources
+
+
+def main(argv=sys.argv):
+    opts = _parse_arguments()
+    fixture = os.path.join(FIXTURES, opts.collection.lower())
+    sbj_dir_dict = subject_sources(opts.collection, fixture)
+    for label, pipelined in [('sequential', False), ('pipelined', True)]:
+        times = []
+        for _ in range(opts.repeat):
+            times.append(_run(opts, sbj_dir_dict, pipelined))
+        times.sort()
+        print("%s: min %.1f seconds, median %.1f seconds" %
+              (label, times[0], times[len(times) // 2]))
+
+    return 0
+
+
+def _run(opts, sbj_dir_dict, pipelined):
+    """
+    :return: the pipeline wall time in seconds
+    """
+    work = tempfile.mkdtemp()
+    cache_dir_opt = os.environ.get(CACHE_DIR_ENV_VAR)
+    # A fresh stage cache prevents reuse of the prior run.
+    os.environ[CACHE_DIR_ENV_VAR] = os.path.join(work, 'cache')
+    try:
+        with qixnat.connect() as xnat:
+            for sbj in sbj_dir_dict:
+                xnat.delete(PROJECT, sbj)
+        start = time.time()
+        qipipeline.run(*sbj_dir_dict.values(), project=PROJECT,
+                       collection=opts.collection, config_dir=CONF_DIR,
+                       actions=['stage', 'register'],
+                       base_dir=os.path.join(work, 'work'),
+                       dest=os.path.join(work, 'data'),
+                       registration_technique=opts.technique,
+                       registration_reference=opts.reference,
+                       pipelined_registration=pipelined)
+        return time.time() - start
+    finally:
+        if cache_dir_opt is None:
+            del os.environ[CACHE_DIR_ENV_VAR]
+        else:
+            os.environ[CACHE_DIR_ENV_VAR] = cache_dir_opt
+        with qixnat.connect() as xnat:
+            for sbj in sbj_dir_dict:
+                xnat.delete(PROJECT, sbj)
+        shutil.rmtree(work, True)
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--collection', default='Breast',
+                        help='the fixture collection (default Breast)')
+    parser.add_argument('--technique', default='mock',
+                        help='the registration technique (default mock)')
+    parser.add_argument('--reference', type=int, default=1,
+                        help='the registration reference volume'
+                             ' (default 1)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of runs per mode (default 3)')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
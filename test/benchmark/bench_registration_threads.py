@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Measures the local ANTs scan registration throughput for a sweep of
+threads per registration within a fixed CPU budget. Each setting
+registers the given volumes against the reference with the
+``registration.cfg`` ANTs settings, running as many registrations
+concurrently as the :mod:`qipipe.helpers.thread_budget` schedule
+allows. The benchmark requires ANTs.
+
+Usage::
+
+    python test/benchmark/bench_registration_threads.py \\
+        --reference FIXED [--cpus N] [--threads 1,2,4] MOVING [MOVING ...]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from multiprocessing.pool import ThreadPool
+from nipype.interfaces.ants import Registration
+from qiutil.ast_config import read_config
+from qipipe.helpers.constants import CONF_DIR
+from qipipe.helpers import thread_budget
+
+
+def main(argv=sys.argv):
+    opts = _parse_arguments()
+    cfg_file = os.path.join(CONF_DIR, 'registration.cfg')
+    reg_cfg = dict(read_config(cfg_file)['ants.Registration'])
+    reg_cfg.pop('plugin_args', None)
+    reg_cfg.pop('num_threads', None)
+    cpus = opts.cpus or thread_budget.available_cpus()
+    work = tempfile.mkdtemp()
+    try:
+        for threads_opt in opts.threads:
+            concurrency, threads = thread_budget.schedule(
+                len(opts.moving), cpus=cpus, threads_per_job=threads_opt
+            )
+            dest = os.path.join(work, "threads%d" % threads)
+            os.mkdir(dest)
+
+            def register(moving):
+                # The registration outputs are written to a volume
+                # subdirectory.
+                out_dir = os.path.join(dest, os.path.basename(moving))
+                os.mkdir(out_dir)
+                reg_opts = dict(reg_cfg)
+                reg_opts['output_transform_prefix'] = os.path.join(
+                    out_dir, 'xfm'
+                )
+                reg_opts['output_warped_image'] = os.path.join(
+                    out_dir, 'warp.nii.gz'
+                )
+                Registration(fixed_image=opts.reference, moving_image=moving,
+                             num_threads=threads, **reg_opts).run()
+
+            pool = ThreadPool(concurrency)
+            start = time.time()
+            pool.map(register, opts.moving)
+            elapsed = time.time() - start
+            pool.close()
+            print("%d threads x %d concurrent: %.1f seconds,"
+                  " %.2f volumes/min" %
+                  (threads, concurrency, elapsed,
+                   len(opts.moving) * 60 / elapsed))
+    finally:
+        shutil.rmtree(work, True)
+
+    return 0
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reference', required=True,
+                        help='the 3D NIfTI fixed reference volume')
+    parser.add_argument('--cpus', type=int,
+                        help='the CPU budget (default all CPUs)')
+    parser.add_argument('--threads', default='1,2,4,8',
+                        type=lambda s: [int(n) for n in s.split(',')],
+                        help='the comma-separated threads per registration'
+                             ' to sweep (default 1,2,4,8)')
+    parser.add_argument('moving', nargs='+',
+                        help='the 3D NIfTI volumes to register')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Compares the per-volume registration resampling time of the
+:class:`qipipe.interfaces.ants.ApplyTransforms` single step with the
+prior ApplyTransforms, fslmaths data type conversion and symlink
+chain. The benchmark requires ANTs and FSL.
+
+Usage::
+
+    python test/benchmark/bench_resample.py --image MOVING \\
+        --reference FIXED --transform XFM [--repeat N]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from nipype.interfaces import (ants, fsl)
+from qipipe.interfaces.ants import ApplyTransforms
+
+
+def main(argv=sys.argv):
+    opts = _parse_arguments()
+    work = tempfile.mkdtemp()
+    try:
+        for label, resample in [('chained', _chained), ('fused', _fused)]:
+            times = []
+            for i in range(opts.repeat):
+                dest = os.path.join(work, "%s%d" % (label, i))
+                os.mkdir(dest)
+                start = time.time()
+                resample(opts, dest)
+                times.append(time.time() - start)
+            times.sort()
+            print("%s: min %.2f seconds, median %.2f seconds per volume"
+                  % (label, times[0], times[len(times) // 2]))
+    finally:
+        shutil.rmtree(work, True)
+
+    return 0
+
+
+def _chained(opts, dest):
+    """Resamples with the prior three step chain."""
+    base_name = os.path.basename(opts.image)
+    apply_xfm = ants.ApplyTransforms(
+        input_image=opts.image, reference_image=opts.reference,
+        transforms=[opts.transform],
+        output_image=os.path.join(dest, base_name)
+    )
+    warped = apply_xfm.run().outputs.output_image
+    downsize = fsl.maths.ChangeDataType(in_file=warped,
+                                        output_datatype='short')
+    downsize.inputs.out_file = os.path.join(dest, 'downsized.nii.gz')
+    downsized = downsize.run().outputs.out_file
+    link = os.path.join(dest, 'realigned_' + base_name)
+    os.symlink(os.path.basename(downsized), link)
+
+
+def _fused(opts, dest):
+    """Resamples with the single step interface."""
+    base_name = os.path.basename(opts.image)
+    ApplyTransforms(
+        input_image=opts.image, reference_image=opts.reference,
+        transforms=[opts.transform],
+        output_image=os.path.join(dest, base_name)
+    ).run()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', required=True,
+                        help='the 3D NIfTI volume to resample')
+    parser.add_argument('--reference', required=True,
+                        help='the 3D NIfTI reference volume')
+    parser.add_argument('--transform', required=True,
+                        help='the ANTs registration composite transform')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='the number of runs per method (default 5)')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
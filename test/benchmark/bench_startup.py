@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Measures the ``qipipe`` command line startup time, i.e. the elapsed
+time of ``bin/qipipe --help`` and of importing
+:mod:`qipipe.staging` in a fresh Python process.
+
+Usage::
+
+    python test/benchmark/bench_startup.py [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+"""The top-level source directory."""
+
+QIPIPE = os.path.join(ROOT, 'bin', 'qipipe')
+"""The qipipe command path."""
+
+COMMANDS = [
+    ('qipipe --help', [sys.executable, QIPIPE, '--help']),
+    ('import qipipe.staging', [sys.executable, '-c', 'import qipipe.staging'])
+]
+"""The (label, command) startup measurements."""
+
+
+def main(argv=sys.argv):
+    opts = _parse_arguments()
+    env = dict(os.environ)
+    path = env.get('PYTHONPATH')
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, path]) if path else ROOT
+    with open(os.devnull, 'w') as devnull:
+        for label, cmd in COMMANDS:
+            times = []
+            for _ in range(opts.repeat):
+                start = time.time()
+                subprocess.check_call(cmd, env=env, stdout=devnull)
+                times.append(time.time() - start)
+            times.sort()
+            print("%s: min %.3f seconds, median %.3f seconds over %d runs"
+                  % (label, times[0], times[len(times) // 2], opts.repeat))
+
+    return 0
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='the number of runs per command (default 10)')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
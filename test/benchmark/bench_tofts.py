@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Measures the :mod:`qipipe.helpers.tofts` extended Tofts fit
+throughput in voxels per second on synthetic concentration curves.
+
+Usage::
+
+    python test/benchmark/bench_tofts.py [--voxels N] [--times N]
+"""
+import sys
+import time
+import argparse
+import numpy as np
+from qipipe.helpers import tofts
+
+AIF_PARAMS = [0.4, 2.2, 0.23, 1.3, 0.09, 0.0013, 0.0]
+"""The modeling.cfg AIF parameters."""
+
+
+def main(argv=sys.argv):
+    opts = _parse_arguments()
+    rand = np.random.RandomState(opts.seed)
+    # The acquisition times in minutes.
+    times = np.arange(opts.times) * opts.delta_t / tofts.SECONDS_PER_MINUTE
+    cp = tofts.aif(times, AIF_PARAMS, scale=0.674, shift=times[4])
+    # The synthetic voxel parameters and noisy concentrations.
+    k_trans = rand.uniform(0.01, 1.0, opts.voxels)
+    v_e = rand.uniform(0.1, 0.6, opts.voxels)
+    v_p = rand.uniform(0.0, 0.1, opts.voxels)
+    conc = tofts.ext_tofts(times, cp, k_trans, k_trans / v_e, v_p)
+    conc += rand.normal(0, opts.noise * conc.max(), conc.shape)
+
+    start = time.time()
+    fitted = tofts.fit_ext_tofts(times, cp, conc)
+    elapsed = time.time() - start
+
+    error = np.median(np.abs(fitted['k_trans'] - k_trans) / k_trans)
+    print("Fit %d voxels with %d time points in %.2f seconds: %.0f voxels/s"
+          % (opts.voxels, opts.times, elapsed, opts.voxels / elapsed))
+    print("Median Ktrans relative error: %.3f" % error)
+
+    return 0
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--voxels', type=int, default=100000,
+                        help='the number of voxels to fit (default 100000)')
+    parser.add_argument('--times', type=int, default=60,
+                        help='the number of time points (default 60)')
+    parser.add_argument('--delta-t', type=float, default=6.0,
+                        help='the time point interval in seconds'
+                             ' (default 6)')
+    parser.add_argument('--noise', type=float, default=0.01,
+                        help='the noise standard deviation as a fraction'
+                             ' of the maximum concentration (default 0.01)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='the random seed (default 0)')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import os
+import shutil
+from nose.tools import (assert_equal, assert_is_none, assert_is_not_none,
+                        assert_not_equal, assert_true)
+from qipipe.helpers import cache
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'cache')
+"""The test results directory."""
+
+CACHE_DIR = os.path.join(RESULTS, 'cache')
+"""The test cache directory."""
+
+
+class TestCache(object):
+    """On-disk cache unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        self._saved_env = os.environ.get(cache.CACHE_DIR_ENV_VAR)
+        os.environ[cache.CACHE_DIR_ENV_VAR] = CACHE_DIR
+        self.in_file = os.path.join(RESULTS, 'small.txt')
+        with open(self.in_file, 'w') as f:
+            f.write('small')
+
+    def tearDown(self):
+        if self._saved_env is None:
+            del os.environ[cache.CACHE_DIR_ENV_VAR]
+        else:
+            os.environ[cache.CACHE_DIR_ENV_VAR] = self._saved_env
+        shutil.rmtree(RESULTS, True)
+
+    def test_store_and_lookup(self):
+        key = cache.digest(cache.file_signature(self.in_file), 1)
+        assert_is_none(cache.lookup('test', key, '.txt'),
+                       'The cache is not initially empty')
+        cached = cache.store(self.in_file, 'test', key, '.txt')
+        assert_is_not_none(cached, 'The file was not cached')
+        assert_equal(cache.lookup('test', key, '.txt'), cached,
+                     'The cached file was not found')
+        with open(cached) as f:
+            assert_equal(f.read(), 'small', 'The cached content is incorrect')
+
+    def test_disabled(self):
+        os.environ[cache.CACHE_DIR_ENV_VAR] = ''
+        assert_is_none(cache.store(self.in_file, 'test', 'key'),
+                       'The file was cached with caching disabled')
+
+    def test_digest(self):
+        assert_equal(cache.digest('a', 1), cache.digest('a', 1),
+                     'The digest is not deterministic')
+        assert_not_equal(cache.digest('a', 1), cache.digest('a', 2),
+                         'The digest does not distinguish the values')
+        checksum = cache.file_checksum(self.in_file)
+        assert_true(len(checksum) == 40, "The checksum is not a SHA-1 digest:"
+                                         " %s" % checksum)
+
+    def test_input_checksum(self):
+        checksum = cache.input_checksum(self.in_file)
+        assert_equal(checksum, cache.file_checksum(self.in_file),
+                     'The input checksum differs from the file checksum')
+        assert_equal(cache.input_checksum(self.in_file), checksum,
+                     'The memoized input checksum is incorrect')
+        # A modified input is read again.
+        with open(self.in_file, 'w') as f:
+            f.write('modified')
+        assert_not_equal(cache.input_checksum(self.in_file), checksum,
+                         'The modified input checksum is not recomputed')
+
+    def test_evict(self):
+        # Cache three five-byte files with increasing use times.
+        cached = [cache.store(self.in_file, 'test', str(i), '.txt')
+                  for i in range(3)]
+        for i, location in enumerate(cached):
+            os.utime(location, (1000 + i, 1000 + i))
+        # A lookup marks the oldest file as recently used.
+        cache.lookup('test', '0', '.txt')
+        assert_equal(cache.evict(10), 1, 'The evicted count is incorrect')
+        assert_is_none(cache.lookup('test', '1', '.txt'),
+                       'The least recently used file was not evicted')
+        for key in ['0', '2']:
+            assert_is_not_none(cache.lookup('test', key, '.txt'),
+                               "The recently used file %s was evicted" % key)
+        # The size limit applies to a store.
+        os.environ[cache.CACHE_SIZE_ENV_VAR] = '0'
+        try:
+            cache.store(self.in_file, 'test', '3', '.txt')
+        finally:
+            del os.environ[cache.CACHE_SIZE_ENV_VAR]
+        assert_equal(os.listdir(os.path.join(CACHE_DIR, 'test')), [],
+                     'The store does not enforce the size limit')
+
+    def test_clear(self):
+        cache.store(self.in_file, 'test', 'key', '.txt')
+        cache.clear('test')
+        assert_is_none(cache.lookup('test', 'key', '.txt'),
+                       'The cleared file was found')
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
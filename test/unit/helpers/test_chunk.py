@@ -0,0 +1,72 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_equal, assert_true)
+from qipipe.helpers import chunk
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'chunk')
+"""The test results directory."""
+
+
+class TestChunk(object):
+    """Voxel chunking utility unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_chunk_mask(self):
+        in_mask = np.zeros((4, 5, 6), dtype=bool)
+        in_mask[1:3, 1:4, :] = True
+        chunks = [chunk.chunk_mask(in_mask, i, 4) for i in range(4)]
+        # The chunks partition the mask.
+        total = np.sum(chunks, axis=0)
+        assert_true(np.array_equal(total, in_mask),
+                    'The chunks do not partition the mask')
+        # The chunk sizes are balanced.
+        sizes = [np.count_nonzero(c) for c in chunks]
+        assert_true(max(sizes) - min(sizes) <= 1,
+                    "The chunk sizes are unbalanced: %s" % sizes)
+        # The chunks are ordered by slice.
+        slices = [np.nonzero(c)[2] for c in chunks]
+        for prev, succ in zip(slices[:-1], slices[1:]):
+            assert_true(prev.max() <= succ.min(),
+                        'The chunks are not slice-ordered')
+
+    def test_stitch_chunks(self):
+        shape = (4, 5, 6)
+        data = np.arange(np.prod(shape), dtype=np.float32).reshape(shape)
+        ts = nib.Nifti1Image(np.zeros(shape + (2,), dtype=np.int16), np.eye(4))
+        ts_file = os.path.join(RESULTS, 'scan_ts.nii.gz')
+        nib.save(ts, ts_file)
+        in_files = []
+        masks = []
+        for i in range(3):
+            mask = os.path.join(RESULTS, "chunk_%d_mask.nii.gz" % i)
+            chunk.make_chunk_mask(ts_file, i, 3, mask)
+            masks.append(mask)
+            # A chunk map is only valid within the chunk mask.
+            in_mask = nib.load(mask).get_data() != 0
+            chunk_data = np.where(in_mask, data, -1).astype(np.float32)
+            in_file = os.path.join(RESULTS, "chunk_%d_map.nii.gz" % i)
+            nib.save(nib.Nifti1Image(chunk_data, np.eye(4)), in_file)
+            in_files.append(in_file)
+        out_file = os.path.join(RESULTS, 'k_trans_map.nii.gz')
+        chunk.stitch_chunks(in_files, masks, out_file)
+        stitched = nib.load(out_file).get_data()
+        assert_equal(stitched.shape, shape,
+                     "The stitched map shape is incorrect: %s" %
+                     str(stitched.shape))
+        assert_true(np.array_equal(stitched, data),
+                    'The stitched map data is incorrect')
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
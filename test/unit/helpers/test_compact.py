@@ -0,0 +1,65 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_equal, assert_true)
+from qipipe.helpers import compact
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'compact')
+"""The test results directory."""
+
+
+class TestCompact(object):
+    """Mask-compacted image utility unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        rand = np.random.RandomState(0)
+        data = rand.randint(0, 1000, (4, 5, 3, 6)).astype(np.int16)
+        img = nib.Nifti1Image(data, np.eye(4))
+        img.header.set_slope_inter(2.0, 1.0)
+        self.time_series = os.path.join(RESULTS, 'scan_ts.nii.gz')
+        nib.save(img, self.time_series)
+        mask_data = np.zeros((4, 5, 3), dtype=np.uint8)
+        mask_data[1:3, 2:4, 1] = 1
+        self.mask = os.path.join(RESULTS, 'mask.nii.gz')
+        nib.save(nib.Nifti1Image(mask_data, np.eye(4)), self.mask)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_compact(self):
+        location = os.path.join(RESULTS, 'compact.npy')
+        compact.compact(self.time_series, location, mask=self.mask)
+        data, index = compact.load(location)
+        assert_equal(data.shape, (4, 6),
+                     "The compacted shape is incorrect: %s" % str(data.shape))
+        # The compacted voxels are the scaled masked voxels.
+        full = np.asanyarray(nib.load(self.time_series).dataobj)
+        expected = full.reshape((-1, 6), order='F')[index]
+        assert_true(np.allclose(data, expected),
+                    'The compacted data is incorrect')
+
+    def test_expand(self):
+        location = os.path.join(RESULTS, 'compact.npy')
+        compact.compact(self.time_series, location, mask=self.mask)
+        out_file = os.path.join(RESULTS, 'expanded.nii.gz')
+        compact.expand_file(location, self.time_series, out_file)
+        expanded = nib.load(out_file).get_data()
+        full = np.asanyarray(nib.load(self.time_series).dataobj)
+        in_mask = nib.load(self.mask).get_data() != 0
+        assert_equal(expanded.shape, full.shape,
+                     "The expanded shape is incorrect: %s" %
+                     str(expanded.shape))
+        assert_true(np.allclose(expanded[in_mask], full[in_mask]),
+                    'The expanded masked data is incorrect')
+        assert_true(not expanded[~in_mask].any(),
+                    'The expanded unmasked data is not zero')
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
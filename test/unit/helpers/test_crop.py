@@ -0,0 +1,74 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_equal, assert_raises, assert_true)
+from qipipe.helpers import crop
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'crop')
+"""The test results directory."""
+
+AFFINE = np.array([[0.7, 0, 0, -50], [0, 0.7, 0, -30], [0, 0, 2.5, 10],
+                   [0, 0, 0, 1]])
+"""The test image affine."""
+
+
+class TestCrop(object):
+    """Mask bounding box cropping unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        self.mask = os.path.join(RESULTS, 'mask.nii.gz')
+        data = np.zeros((40, 30, 10), dtype=np.uint8)
+        data[10:20, 5:9, 3:6] = 1
+        nib.save(nib.Nifti1Image(data, AFFINE), self.mask)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_bounding_box(self):
+        bounds = crop.bounding_box(self.mask, 2)
+        assert_equal(bounds, [(8, 22), (3, 11), (1, 8)],
+                     "The bounding box is incorrect: %s" % bounds)
+        # The box is clipped to the image extent.
+        bounds = crop.bounding_box(self.mask, 20)
+        assert_equal(bounds, [(0, 40), (0, 29), (0, 10)],
+                     "The clipped bounding box is incorrect: %s" % bounds)
+
+    def test_empty_mask(self):
+        empty = os.path.join(RESULTS, 'empty.nii.gz')
+        nib.save(nib.Nifti1Image(np.zeros((4, 4, 4), dtype=np.uint8),
+                                 AFFINE), empty)
+        with assert_raises(ValueError):
+            crop.bounding_box(empty)
+
+    def test_crop(self):
+        in_file = os.path.join(RESULTS, 'image.nii.gz')
+        data = np.random.RandomState(0).rand(40, 30, 10, 3)
+        nib.save(nib.Nifti1Image(data.astype(np.float32), AFFINE), in_file)
+        bounds = crop.bounding_box(self.mask, 2)
+        out_file = crop.crop(in_file, bounds,
+                             os.path.join(RESULTS, 'cropped.nii.gz'))
+        cropped = nib.load(out_file)
+        assert_equal(cropped.shape, (14, 8, 7, 3),
+                     "The cropped shape is incorrect: %s" %
+                     (cropped.shape,))
+        # A cropped voxel has the same value and scanner coordinate
+        # as the corresponding input voxel.
+        offset = np.array([start for start, _ in bounds])
+        voxel = np.array([3, 4, 1])
+        src_voxel = voxel + offset
+        assert_true(np.allclose(cropped.get_data()[tuple(voxel)],
+                                data[tuple(src_voxel)]),
+                    'The cropped voxel value is incorrect')
+        assert_true(np.allclose(cropped.affine.dot(np.append(voxel, 1)),
+                                AFFINE.dot(np.append(src_voxel, 1))),
+                    'The cropped affine is incorrect')
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_equal, assert_true)
+from dcmstack.dcmmeta import NiftiWrapper
+from qipipe.helpers import header
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'header')
+"""The test results directory."""
+
+
+class TestHeader(object):
+    """NIfTI header-only utility unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        data = np.zeros((4, 5, 3, 2), dtype=np.int16)
+        nw = NiftiWrapper(nib.Nifti1Image(data, np.eye(4)), make_empty=True)
+        const_meta = nw.meta_ext.get_class_dict(('global', 'const'))
+        const_meta['AcquisitionTime'] = '101010.000000'
+        self.location = os.path.join(RESULTS, 'scan_ts.nii.gz')
+        nib.save(nw.nii_img, self.location)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_load_header(self):
+        hdr = header.load_header(self.location)
+        assert_equal(hdr.get_data_shape(), (4, 5, 3, 2),
+                     "The header shape is incorrect: %s" %
+                     str(hdr.get_data_shape()))
+        assert_true(len(hdr.extensions) > 0, 'The header extension is missing')
+
+    def test_wrap_header(self):
+        nw = header.wrap_header(self.location)
+        acq_time = nw.get_meta('AcquisitionTime', (0, 0, 0, 1))
+        assert_equal(acq_time, '101010.000000',
+                     "The acquisition time is incorrect: %s" % acq_time)
+
+    def test_copy_meta(self):
+        data = np.arange(120, dtype=np.float32).reshape((4, 5, 3, 2))
+        dest = os.path.join(RESULTS, 'r1_series.nii.gz')
+        nib.save(nib.Nifti1Image(data, np.eye(4)), dest)
+        out_file = os.path.join(RESULTS, 'r1_series_meta.nii.gz')
+        header.copy_meta(self.location, dest, out_file,
+                         include_classes=[('global', 'const')])
+        # The meta-data is copied.
+        nw = NiftiWrapper(nib.load(out_file))
+        acq_time = nw.get_meta('AcquisitionTime')
+        assert_equal(acq_time, '101010.000000',
+                     "The copied acquisition time is incorrect: %s" % acq_time)
+        # The image data is unchanged.
+        assert_true(np.array_equal(nw.nii_img.get_data(), data),
+                    'The copied image data is incorrect')
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
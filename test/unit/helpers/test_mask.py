@@ -0,0 +1,78 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_equal, assert_true)
+from qipipe.helpers import mask
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'mask')
+"""The test results directory."""
+
+
+class TestMask(object):
+    """In-process mask creation unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        # A dark 4D time series with a bright tissue block.
+        data = np.zeros((20, 20, 6, 3), dtype=np.int16)
+        data[5:15, 4:16, 1:5, :] = 100
+        self.tissue = np.zeros(data.shape[:3], dtype=np.uint8)
+        self.tissue[5:15, 4:16, 1:5] = 1
+        self.time_series = os.path.join(RESULTS, 'scan_ts.nii.gz')
+        nib.save(nib.Nifti1Image(data, np.eye(4)), self.time_series)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_create_mask(self):
+        out_file = os.path.join(RESULTS, 'mask.nii.gz')
+        result = mask.create_mask(self.time_series, out_file, max_thresh=10,
+                                  min_voxels=100)
+        assert_equal(result, out_file, "The mask file is incorrect: %s" %
+                                       result)
+        actual = nib.load(out_file).get_data()
+        assert_true(np.array_equal(actual, self.tissue),
+                    "The mask does not match the tissue")
+
+    def test_min_voxels(self):
+        out_file = os.path.join(RESULTS, 'mask.nii.gz')
+        mask.create_mask(self.time_series, out_file, max_thresh=10,
+                         min_voxels=100000)
+        actual = nib.load(out_file).get_data()
+        assert_true(actual.all(), "The small background cluster was not"
+                                  " discarded")
+
+    def test_roi_mask(self):
+        rois = []
+        for i, x in enumerate([3, 12]):
+            roi = np.zeros((20, 20, 6), dtype=np.uint8)
+            roi[x, 10, 3] = 1
+            roi_file = os.path.join(RESULTS, "lesion%d.nii.gz" % (i + 1))
+            nib.save(nib.Nifti1Image(roi, np.eye(4)), roi_file)
+            rois.append(roi_file)
+        out_file = os.path.join(RESULTS, 'roi_mask.nii.gz')
+        mask.roi_mask(rois, out_file)
+        actual = nib.load(out_file).get_data()
+        assert_equal(np.count_nonzero(actual), 2,
+                     "The ROI union voxel count is incorrect: %d" %
+                     np.count_nonzero(actual))
+        # A one-voxel margin adds the six face neighbors of each ROI voxel.
+        mask.roi_mask(rois, out_file, margin=1)
+        actual = nib.load(out_file).get_data()
+        assert_equal(np.count_nonzero(actual), 14,
+                     "The dilated ROI voxel count is incorrect: %d" %
+                     np.count_nonzero(actual))
+
+    def test_center_of_gravity(self):
+        cog = mask.center_of_gravity(self.tissue.astype(np.float64))
+        assert_equal(cog, (9.5, 9.5, 2.5),
+                     "The center of gravity is incorrect: %s" % str(cog))
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
@@ -0,0 +1,65 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_almost_equal, assert_true)
+from numpy.testing import assert_array_almost_equal
+from qipipe.helpers import motion
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'motion')
+"""The test results directory."""
+
+
+class TestMotion(object):
+    """Affine transform motion estimate unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_identity(self):
+        disp = motion.rms_displacement(np.eye(3), np.zeros(3))
+        assert_almost_equal(disp, 0, msg="The identity displacement is"
+                                         " incorrect: %f" % disp)
+
+    def test_translation(self):
+        disp = motion.rms_displacement(np.eye(3), [3, 0, 4])
+        assert_almost_equal(disp, 5, msg="The translation displacement is"
+                                         " incorrect: %f" % disp)
+
+    def test_rotation(self):
+        theta = np.radians(1)
+        rotation = np.array([[np.cos(theta), -np.sin(theta), 0],
+                             [np.sin(theta), np.cos(theta), 0],
+                             [0, 0, 1]])
+        disp = motion.rms_displacement(rotation, np.zeros(3), radius=80)
+        # The mean squared displacement is 2/5 r^2 2(1 - cos(theta)).
+        expected = np.sqrt(0.8 * 80 ** 2 * (1 - np.cos(theta)))
+        assert_almost_equal(disp, expected,
+                            msg="The rotation displacement is incorrect:"
+                                " %f" % disp)
+        # A sphere away from the center of rotation moves further.
+        far = motion.rms_displacement(rotation, np.zeros(3),
+                                      origin=[100, 0, 0], radius=80)
+        assert_true(far > disp, "The off-center rotation displacement %f"
+                                " does not exceed the centered displacement"
+                                " %f" % (far, disp))
+
+    def test_image_center(self):
+        location = os.path.join(RESULTS, 'image.nii.gz')
+        affine = np.diag([2, 2, 3, 1.0])
+        affine[:3, 3] = [-10, 20, 5]
+        nib.save(nib.Nifti1Image(np.zeros((11, 21, 5)), affine), location)
+        center = motion.image_center(location)
+        # The RAS center (0, 40, 11) is flipped to LPS.
+        assert_array_almost_equal(center, [0, -40, 11])
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
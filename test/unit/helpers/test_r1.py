@@ -0,0 +1,89 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from dcmstack.dcmmeta import NiftiWrapper
+from nose.tools import (assert_equal, assert_is_not_none, assert_true)
+from qipipe.helpers import (cache, r1)
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'r1')
+"""The test results directory."""
+
+CACHE_DIR = os.path.join(RESULTS, 'cache')
+"""The test cache directory."""
+
+PDW_PARAMS = (4.2, 2.0)
+"""The PDW (repetition time, flip angle) acquisition parameters."""
+
+T1W_PARAMS = (4.2, 10.0)
+"""The T1-weighted (repetition time, flip angle) acquisition parameters."""
+
+
+class TestR1(object):
+    """R1_0 map utility unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        self._saved_env = os.environ.get(cache.CACHE_DIR_ENV_VAR)
+        os.environ[cache.CACHE_DIR_ENV_VAR] = CACHE_DIR
+
+    def tearDown(self):
+        if self._saved_env is None:
+            del os.environ[cache.CACHE_DIR_ENV_VAR]
+        else:
+            os.environ[cache.CACHE_DIR_ENV_VAR] = self._saved_env
+        shutil.rmtree(RESULTS, True)
+
+    def test_lookup_table(self):
+        lut = r1.lookup_table(PDW_PARAMS, T1W_PARAMS, 5.0)
+        assert_true(np.all(np.diff(lut[0]) > 0),
+                    'The lookup table ratios are not increasing')
+        # The table is cached.
+        key = cache.digest(PDW_PARAMS, T1W_PARAMS, 5.0, r1.DEF_R1_STEP)
+        cached = cache.lookup(r1.LUT_CACHE, key, '.npy')
+        assert_is_not_none(cached, 'The lookup table is not cached')
+        assert_true(np.array_equal(r1.lookup_table(PDW_PARAMS, T1W_PARAMS,
+                                                   5.0), lut),
+                    'The cached lookup table is incorrect')
+
+    def test_make_r1_0_map(self):
+        rand = np.random.RandomState(0)
+        shape = (4, 5, 3)
+        expected = rand.uniform(0.5, 2.0, shape)
+        m0 = rand.uniform(500, 1500, shape)
+        pdw_file = self._save(m0 * r1.spgr_signal(expected, *PDW_PARAMS),
+                              PDW_PARAMS, 'pdw.nii.gz')
+        t1w_file = self._save(m0 * r1.spgr_signal(expected, *T1W_PARAMS),
+                              T1W_PARAMS, 't1w.nii.gz')
+        mask_data = np.zeros(shape, dtype=np.uint8)
+        mask_data[1:3, 1:4, :] = 1
+        mask = os.path.join(RESULTS, 'mask.nii.gz')
+        nib.save(nib.Nifti1Image(mask_data, np.eye(4)), mask)
+        out_file = os.path.join(RESULTS, 'r1_0_map.nii.gz')
+        r1.make_r1_0_map(pdw_file, t1w_file, out_file, 5.0, mask=mask)
+        r1_0 = nib.load(out_file).get_data()
+        assert_equal(r1_0.shape, shape,
+                     "The R1_0 map shape is incorrect: %s" % str(r1_0.shape))
+        in_mask = mask_data != 0
+        assert_true(np.allclose(r1_0[in_mask], expected[in_mask], atol=1e-3),
+                    'The R1_0 map values are incorrect')
+        assert_true(np.all(r1_0[~in_mask] == 0),
+                    'The R1_0 map values outside of the mask are not zero')
+
+    def _save(self, data, params, name):
+        nw = NiftiWrapper(nib.Nifti1Image(data.astype(np.float32), np.eye(4)),
+                          make_empty=True)
+        meta = nw.meta_ext.get_class_dict(('global', 'const'))
+        meta['RepetitionTime'], meta['FlipAngle'] = params
+        location = os.path.join(RESULTS, name)
+        nib.save(nw.nii_img, location)
+
+        return location
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
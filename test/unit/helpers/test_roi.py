@@ -1,5 +1,10 @@
 import os
-from nose.tools import (assert_equal, assert_not_equal, assert_is_not_none)
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_equal, assert_not_equal, assert_is_not_none,
+                        assert_raises)
+from numpy.testing import assert_array_equal
 from qiutil.collections import tuplize
 from qipipe.helpers import roi
 from ... import ROOT
@@ -8,6 +13,13 @@ FIXTURE = os.path.join(ROOT, 'fixtures', 'staged', 'breast', 'Breast003',
                        'Session01', 'scans', '1', 'resources', 'roi',
                        'roi.nii.gz')
 
+BQF_FIXTURE = os.path.join(ROOT, 'fixtures', 'staging', 'sarcoma', 'Subj_1',
+                           'Visit_1', 'results', 'ROI_average', 'taui_d001',
+                           'slice20', 'Tissue_ROI_092809DCE MRI_1_0001.bqf')
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'roi')
+"""The test results directory."""
+
 
 class TestROI(object):
     
@@ -51,6 +63,65 @@ class TestROI(object):
            self.roi.extent.show()
 
 
+class TestBoleroMask(object):
+    """Bolero ROI ``.bqf`` conversion unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        # A 6 x 4 x 3 time series with two volumes.
+        self.time_series = os.path.join(RESULTS, 'series.nii.gz')
+        affine = np.diag([2, 2, 3, 1.0])
+        nib.save(nib.Nifti1Image(np.zeros((6, 4, 3, 2)), affine),
+                 self.time_series)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_read(self):
+        indexes = roi.read_bolero_mask(BQF_FIXTURE)
+        assert_equal(len(indexes), 5983, "The Bolero ROI pixel count is"
+                                         " incorrect: %d" % len(indexes))
+        assert_equal(indexes[0], 46331, "The first Bolero ROI pixel index"
+                                        " is incorrect: %d" % indexes[0])
+
+    def test_conversion(self):
+        # The displayed (row, column) ROI pixels of each slice.
+        pixels = {1: [(0, 0), (0, 1), (2, 5)], 3: [(3, 2)]}
+        slices = []
+        expected = np.zeros((6, 4, 3), dtype=np.uint8)
+        for slice_seq_nbr, points in pixels.iteritems():
+            # The Bolero file lists the one-based row-major indexes.
+            location = os.path.join(RESULTS, "slice%d.bqf" % slice_seq_nbr)
+            with open(location, 'w') as f:
+                for row, column in points:
+                    f.write("  %.7e\r\n" % (row * 6 + column + 1))
+            slices.append((slice_seq_nbr, location))
+            # The bolero_mask_conv slice is indexed by [row, column].
+            converted = np.zeros((4, 6, 1), dtype=np.uint8)
+            for row, column in points:
+                converted[row, column, 0] = 1
+            conv_file = os.path.join(RESULTS,
+                                     "converted%d.nii.gz" % slice_seq_nbr)
+            nib.save(nib.Nifti1Image(converted, np.eye(4)), conv_file)
+            reordered = roi.reorder_bolero_mask(conv_file)
+            expected[:, :, slice_seq_nbr - 1] = reordered[:, :, 0]
+        out_file = os.path.join(RESULTS, 'lesion1.nii.gz')
+        data = roi.bolero_mask(self.time_series, slices, out_file=out_file)
+        assert_array_equal(data, expected)
+        # The mask conforms to the time series.
+        out_img = nib.load(out_file)
+        assert_equal(out_img.shape, (6, 4, 3), "The Bolero mask shape is"
+                                               " incorrect: %s" %
+                                               str(out_img.shape))
+        assert_array_equal(out_img.affine, nib.load(self.time_series).affine)
+
+    def test_out_of_bounds(self):
+        # The sarcoma ROI was drawn on a larger slice.
+        with assert_raises(ValueError):
+            roi.bolero_mask(self.time_series, [(1, BQF_FIXTURE)])
+
+
 if __name__ == "__main__":
     import nose
     
@@ -0,0 +1,82 @@
+import os
+import csv
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_almost_equal, assert_equal, assert_true)
+from qipipe.helpers import similarity
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'similarity')
+"""The test results directory."""
+
+AFFINE = np.diag([2, 2, 3, 1.0])
+"""The test image affine."""
+
+
+class TestSimilarity(object):
+    """Registration quality metric unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        # The reference is a bright block on a noisy background.
+        rand = np.random.RandomState(0)
+        data = rand.uniform(0, 5, (30, 30, 10))
+        data[10:20, 10:20, 3:7] += 100
+        self.reference = self._save('reference.nii.gz', data)
+        # The same image shifted by two voxels along the first axis.
+        self.shifted = self._save('shifted.nii.gz', np.roll(data, 2, axis=0))
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_identical(self):
+        ref = similarity.Reference(self.reference)
+        metrics = similarity.measure(ref, self.reference)
+        assert_almost_equal(metrics['ncc'], 1, msg="The identical volume NCC"
+                                                   " is incorrect: %f" %
+                                                   metrics['ncc'])
+        assert_almost_equal(metrics['dice'], 1, msg="The identical volume"
+                                                    " overlap is incorrect:"
+                                                    " %f" % metrics['dice'])
+        assert_almost_equal(metrics['shift'], 0, msg="The identical volume"
+                                                     " shift is incorrect:"
+                                                     " %f" % metrics['shift'])
+
+    def test_shifted(self):
+        ref = similarity.Reference(self.reference)
+        same = similarity.measure(ref, self.reference)
+        metrics = similarity.measure(ref, self.shifted)
+        for metric in ['mi', 'ncc', 'dice']:
+            assert_true(metrics[metric] < same[metric],
+                        "The shifted volume %s %f is not less than the"
+                        " identical volume %s %f" %
+                        (metric, metrics[metric], metric, same[metric]))
+        # The foreground moved two 2 mm voxels.
+        assert_almost_equal(metrics['shift'], 4, places=1,
+                            msg="The shifted volume shift is incorrect: %f" %
+                                metrics['shift'])
+
+    def test_table(self):
+        results = similarity.measure_volumes(self.reference, [self.shifted])
+        dest = os.path.join(RESULTS, 'qa.csv')
+        similarity.write_table(results, dest)
+        with open(dest) as f:
+            rows = list(csv.reader(f))
+        assert_equal(rows[0], ['volume'] + similarity.METRICS,
+                     "The table header is incorrect: %s" % rows[0])
+        assert_equal(rows[1][0], 'shifted.nii.gz',
+                     "The table volume is incorrect: %s" % rows[1][0])
+
+    def _save(self, name, data):
+        location = os.path.join(RESULTS, name)
+        nib.save(nib.Nifti1Image(data, AFFINE), location)
+
+        return location
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
@@ -0,0 +1,119 @@
+import os
+import shutil
+from nose.tools import (assert_equal, assert_is_none, assert_is_not_none,
+                        assert_not_equal, assert_true)
+from qipipe.helpers import (cache, stage_cache)
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'stage_cache')
+"""The test results directory."""
+
+CACHE_DIR = os.path.join(RESULTS, 'cache')
+"""The test cache directory."""
+
+CONFIGURATION = {'R1': {'r1_0_val': 0.8},
+                 'fastfit': {'plugin_args': {'qsub_args': '-l mf=1G'}}}
+"""The test stage configuration."""
+
+
+class TestStageCache(object):
+    """Stage result cache unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        self._saved_env = os.environ.get(cache.CACHE_DIR_ENV_VAR)
+        os.environ[cache.CACHE_DIR_ENV_VAR] = CACHE_DIR
+        self.in_file = os.path.join(RESULTS, 'time_series.nii.gz')
+        with open(self.in_file, 'w') as f:
+            f.write('time series')
+
+    def tearDown(self):
+        if self._saved_env is None:
+            del os.environ[cache.CACHE_DIR_ENV_VAR]
+        else:
+            os.environ[cache.CACHE_DIR_ENV_VAR] = self._saved_env
+        shutil.rmtree(RESULTS, True)
+
+    def test_stage_key(self):
+        key = stage_cache.stage_key('modeling', [self.in_file], CONFIGURATION)
+        # The cluster submission options do not affect the key.
+        cfg = dict(CONFIGURATION,
+                   fastfit={'plugin_args': {'qsub_args': '-l mf=2G'}})
+        assert_equal(stage_cache.stage_key('modeling', [self.in_file], cfg),
+                     key, 'The plug-in arguments affect the key')
+        # The modeling options affect the key.
+        cfg = dict(CONFIGURATION, R1={'r1_0_val': 0.7})
+        assert_not_equal(stage_cache.stage_key('modeling', [self.in_file],
+                                               cfg),
+                         key, 'The R1 options do not affect the key')
+        # The input file content affects the key.
+        with open(self.in_file, 'w') as f:
+            f.write('changed')
+        assert_not_equal(stage_cache.stage_key('modeling', [self.in_file],
+                                               CONFIGURATION),
+                         key, 'The input file content does not affect the key')
+
+    def test_store_and_lookup(self):
+        key = stage_cache.stage_key('modeling', [self.in_file], CONFIGURATION)
+        assert_is_none(stage_cache.lookup('modeling', key),
+                       'The result is cached before it is stored')
+        result = dict(fxl_k_trans=self.in_file, volume=4)
+        stage_cache.store('modeling', key, result)
+        # The result file is removed from the work area.
+        os.remove(self.in_file)
+        cached = stage_cache.lookup('modeling', key)
+        assert_is_not_none(cached, 'The result is not cached')
+        assert_equal(cached['volume'], 4,
+                     "The cached value is incorrect: %s" % cached['volume'])
+        cached_file = cached['fxl_k_trans']
+        assert_equal(os.path.basename(cached_file), 'time_series.nii.gz',
+                     "The cached file name is incorrect: %s" % cached_file)
+        with open(cached_file) as f:
+            assert_equal(f.read(), 'time series',
+                         'The cached file content is incorrect')
+
+    def test_replace(self):
+        key = stage_cache.stage_key('modeling', [self.in_file], CONFIGURATION)
+        stage_cache.store('modeling', key, dict(volume=4))
+        # A forced recomputation replaces the prior result.
+        stage_cache.store('modeling', key, dict(volume=5))
+        cached = stage_cache.lookup('modeling', key)
+        assert_is_not_none(cached, 'The replaced result is not cached')
+        assert_equal(cached['volume'], 5,
+                     "The replaced value is incorrect: %s" % cached['volume'])
+        entries = os.listdir(os.path.join(CACHE_DIR, 'stage_modeling'))
+        assert_equal(entries, [key],
+                     "The stage cache entries are incorrect: %s" % entries)
+
+    def test_verify(self):
+        key = stage_cache.stage_key('registration', [self.in_file],
+                                    CONFIGURATION)
+        stage_cache.store('registration', key, dict(out_file=self.in_file))
+        assert_is_not_none(stage_cache.lookup('registration', key,
+                                              verify=True),
+                           'The unmodified result is not verified')
+        # Corrupt the cached file.
+        cached_file = stage_cache.lookup('registration', key)['out_file']
+        with open(cached_file, 'w') as f:
+            f.write('truncated')
+        assert_is_none(stage_cache.lookup('registration', key, verify=True),
+                       'The modified result is verified')
+        assert_is_not_none(stage_cache.lookup('registration', key),
+                           'The unverified lookup rejects the modified'
+                           ' result')
+        # The recomputed result replaces the modified result.
+        with open(self.in_file, 'w') as f:
+            f.write('realigned')
+        stage_cache.store('registration', key, dict(out_file=self.in_file))
+        cached = stage_cache.lookup('registration', key, verify=True)
+        assert_is_not_none(cached, 'The recomputed result is not verified')
+        with open(cached['out_file']) as f:
+            assert_equal(f.read(), 'realigned',
+                         'The recomputed cached file content is incorrect')
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
@@ -0,0 +1,38 @@
+from nose.tools import assert_equal
+from qipipe.helpers import thread_budget
+
+
+class TestThreadBudget(object):
+    """Local thread budget scheduling unit tests."""
+
+    def test_even_split(self):
+        # Fewer jobs than CPUs share the budget.
+        plan = thread_budget.schedule(4, cpus=16)
+        assert_equal(plan, (4, 4), "The schedule is incorrect: %s" %
+                                   (plan,))
+        # More jobs than CPUs run one thread each.
+        plan = thread_budget.schedule(40, cpus=16)
+        assert_equal(plan, (16, 1), "The schedule is incorrect: %s" %
+                                    (plan,))
+
+    def test_threads_per_job(self):
+        plan = thread_budget.schedule(40, cpus=16, threads_per_job=4)
+        assert_equal(plan, (4, 4), "The schedule is incorrect: %s" %
+                                   (plan,))
+        # The concurrency is at least one.
+        plan = thread_budget.schedule(40, cpus=2, threads_per_job=4)
+        assert_equal(plan, (1, 4), "The schedule is incorrect: %s" %
+                                   (plan,))
+
+    def test_memory(self):
+        # The memory limits the concurrency, and the remaining
+        # threads are given to the concurrent jobs.
+        plan = thread_budget.schedule(40, cpus=16, job_memory=4, memory=18)
+        assert_equal(plan, (4, 4), "The schedule is incorrect: %s" %
+                                   (plan,))
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
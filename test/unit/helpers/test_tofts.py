@@ -0,0 +1,151 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import assert_true
+from qipipe.helpers import (compact, tofts)
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'helpers', 'tofts')
+"""The test results directory."""
+
+AIF_PARAMS = [0.4, 2.2, 0.23, 1.3, 0.09, 0.0013, 0.0]
+"""The test AIF parameters."""
+
+
+class TestTofts(object):
+    """Extended Tofts modeling unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_signal_to_r1(self):
+        # Simulate the signal for known R1 values.
+        expected = np.array([[0.8, 0.8, 1.5, 2.0]])
+        tr, flip_angle = 4.0, 10.0
+        e1 = np.exp(-tr * expected / 1000)
+        angle = np.radians(flip_angle)
+        signal = 1000 * np.sin(angle) * (1 - e1) / (1 - np.cos(angle) * e1)
+        r1, valid = tofts.signal_to_r1(signal, 0.8, 2, tr, flip_angle)
+        assert_true(valid.all(), 'The R1 conversion is invalid')
+        assert_true(np.allclose(r1, expected),
+                    "The R1 values are incorrect: %s" % r1)
+
+    def test_fit(self):
+        rand = np.random.RandomState(0)
+        times = np.arange(40) * 0.1
+        cp = tofts.aif(times, AIF_PARAMS, scale=0.674, shift=times[4])
+        k_trans = rand.uniform(0.05, 1.0, 50)
+        v_e = rand.uniform(0.1, 0.6, 50)
+        v_p = rand.uniform(0.0, 0.1, 50)
+        conc = tofts.ext_tofts(times, cp, k_trans, k_trans / v_e, v_p)
+        fitted = tofts.fit_ext_tofts(times, cp, conc)
+        assert_true(np.allclose(fitted['k_trans'], k_trans, rtol=1e-2),
+                    'The fitted Ktrans is incorrect')
+        assert_true(np.allclose(fitted['v_e'], v_e, rtol=1e-2),
+                    'The fitted v_e is incorrect')
+
+    def test_warm_start(self):
+        rand = np.random.RandomState(0)
+        times = np.arange(40) * 0.1
+        cp = tofts.aif(times, AIF_PARAMS, scale=0.674, shift=times[4])
+        k_trans = rand.uniform(0.05, 1.0, 50)
+        v_e = rand.uniform(0.1, 0.6, 50)
+        v_p = rand.uniform(0.0, 0.1, 50)
+        conc = tofts.ext_tofts(times, cp, k_trans, k_trans / v_e, v_p)
+        # A nearby prior fit converges in a few iterations.
+        prior = np.column_stack([k_trans, k_trans / v_e, v_p])
+        prior *= rand.uniform(0.95, 1.05, prior.shape)
+        fitted = tofts.fit_ext_tofts(times, cp, conc, initial=prior,
+                                     max_iter=5)
+        assert_true(np.allclose(fitted['k_trans'], k_trans, rtol=1e-2),
+                    'The warm start fitted Ktrans is incorrect')
+        # The default starting point does not converge as quickly.
+        fitted = tofts.fit_ext_tofts(times, cp, conc, max_iter=5)
+        assert_true(not np.allclose(fitted['k_trans'], k_trans, rtol=1e-2),
+                    'The cold start fit converged unexpectedly quickly')
+
+    def test_fit_blocks(self):
+        rand = np.random.RandomState(0)
+        shape = (5, 4, 3)
+        voxel_cnt = int(np.prod(shape))
+        times = np.arange(40) * 6.0
+        minutes = times / tofts.SECONDS_PER_MINUTE
+        cp = tofts.aif(minutes, AIF_PARAMS, scale=0.674, shift=minutes[4])
+        k_trans = rand.uniform(0.05, 1.0, voxel_cnt)
+        v_e = rand.uniform(0.1, 0.6, voxel_cnt)
+        v_p = rand.uniform(0.0, 0.1, voxel_cnt)
+        conc = tofts.ext_tofts(minutes, cp, k_trans, k_trans / v_e, v_p)
+        r1 = 0.8 + 3.8 * conc
+        # A voxel which could not be converted to R1.
+        r1[7] = 0
+        location = os.path.join(RESULTS, 'r1_series.npy')
+        compact.save(r1.astype(np.float32), np.arange(voxel_cnt), location)
+        reference = os.path.join(RESULTS, 'reference.nii.gz')
+        nib.save(nib.Nifti1Image(np.zeros(shape, dtype=np.float32),
+                                 np.eye(4)), reference)
+        fitted = {}
+        for block_size in [16, voxel_cnt]:
+            out_files = {param: os.path.join(RESULTS, "%s_%d.nii.gz" %
+                                             (param, block_size))
+                         for param in ['k_trans', 'v_e', 'v_p', 'chisq']}
+            tofts.fit_r1_series(location, reference, times, 0.8, 3.8,
+                                AIF_PARAMS, out_files, aif_scale=0.674,
+                                aif_shift=times[4], block_size=block_size)
+            data = nib.load(out_files['k_trans']).get_data()
+            fitted[block_size] = data.ravel(order='F')
+        assert_true(np.allclose(fitted[16], fitted[voxel_cnt]),
+                    'The block fit differs from the single block fit')
+        assert_true(fitted[16][7] == 0,
+                    'The unconverted voxel Ktrans is not zero')
+        valid = np.arange(voxel_cnt) != 7
+        assert_true(np.allclose(fitted[16][valid], k_trans[valid], rtol=1e-2),
+                    'The block fit Ktrans is incorrect')
+
+    def test_initial_parameters(self):
+        shape = (3, 4, 2)
+        values = dict(k_trans=0.2, v_e=0.4, v_p=0.05)
+        prior_maps = {}
+        for param, value in values.iteritems():
+            data = np.empty(shape, dtype=np.float32)
+            data.fill(value)
+            if param == 'v_e':
+                # A voxel without a prior fit.
+                data[0, 0, 0] = 0
+            location = os.path.join(RESULTS, "fxl_%s.nii.gz" % param)
+            nib.save(nib.Nifti1Image(data, np.eye(4)), location)
+            prior_maps[param] = location
+        initial = tofts.initial_parameters(prior_maps, np.array([0, 5]))
+        assert_true(np.allclose(initial[0], tofts.DEF_INITIAL),
+                    "The missing prior voxel starting point is incorrect: %s" %
+                    initial[0])
+        assert_true(np.allclose(initial[1], (0.2, 0.5, 0.05)),
+                    "The prior voxel starting point is incorrect: %s" %
+                    initial[1])
+
+    def test_initial_parameters_without_v_p(self):
+        # A standard Tofts prior fit has no v_p map.
+        shape = (3, 4, 2)
+        values = dict(k_trans=0.2, v_e=0.4)
+        prior_maps = {}
+        for param, value in values.iteritems():
+            data = np.empty(shape, dtype=np.float32)
+            data.fill(value)
+            location = os.path.join(RESULTS, "fxl_%s.nii.gz" % param)
+            nib.save(nib.Nifti1Image(data, np.eye(4)), location)
+            prior_maps[param] = location
+        initial = tofts.initial_parameters(prior_maps, np.array([0, 5]))
+        expected = (0.2, 0.5, tofts.DEF_INITIAL[2])
+        assert_true(np.allclose(initial, expected),
+                    "The prior voxel starting point is incorrect: %s" %
+                    initial)
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
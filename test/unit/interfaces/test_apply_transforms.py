@@ -0,0 +1,71 @@
+import os
+import shutil
+import numpy as np
+import nibabel as nib
+from nose.tools import (assert_true, assert_false)
+from qipipe.interfaces.ants import ApplyTransforms
+from ... import ROOT
+
+RESULTS = os.path.join(ROOT, 'results', 'interfaces', 'apply_transforms')
+"""The test results directory."""
+
+
+class TestApplyTransforms(object):
+    """ANTs ApplyTransforms interface unit tests."""
+
+    def setUp(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        self.transform = os.path.join(RESULTS, 'transform.mat')
+        with open(self.transform, 'w') as f:
+            f.write('transform')
+
+    def tearDown(self):
+        shutil.rmtree(RESULTS, True)
+
+    def test_input_data_type(self):
+        cmdline = self._cmdline('int16')
+        assert_true('--output-data-type short' in cmdline,
+                    "The output data type is not the input data type: %s" %
+                    cmdline)
+
+    def test_unsigned_data_type(self):
+        # The DICOM-derived unsigned 16-bit volumes retain their size.
+        cmdline = self._cmdline('uint16')
+        assert_true('--output-data-type short' in cmdline,
+                    "The unsigned 16-bit output data type is not short: %s" %
+                    cmdline)
+
+    def test_unsupported_data_type(self):
+        cmdline = self._cmdline('uint32')
+        assert_true('--output-data-type default' in cmdline,
+                    "The unsupported input data type output is not the"
+                    " ANTs default: %s" % cmdline)
+
+    def test_output_data_type(self):
+        cmdline = self._cmdline('int16', output_data_type='float')
+        assert_true('--output-data-type float' in cmdline,
+                    "The output data type option is ignored: %s" % cmdline)
+        assert_false('--output-data-type short' in cmdline,
+                     "The output data type option does not override the"
+                     " input data type: %s" % cmdline)
+
+    def _cmdline(self, dtype, **opts):
+        """
+        :param dtype: the input image data type name
+        :param opts: the additional interface inputs
+        :return: the antsApplyTransforms command line
+        """
+        in_file = os.path.join(RESULTS, "%s.nii.gz" % dtype)
+        data = np.zeros((2, 2, 2), dtype=dtype)
+        nib.save(nib.Nifti1Image(data, np.eye(4)), in_file)
+        xfm = ApplyTransforms(input_image=in_file, reference_image=in_file,
+                              transforms=[self.transform], **opts)
+
+        return xfm.cmdline
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)
@@ -6,6 +6,7 @@ from nose.tools import (assert_true, assert_equal, assert_is_not_none)
 import nipype.pipeline.engine as pe
 import qixnat
 from qixnat.helpers import xnat_path
+from qipipe.helpers import cache
 from qipipe.pipeline import registration
 from ... import (ROOT, PROJECT, CONF_DIR)
 from ...helpers.logging import logger
@@ -40,6 +41,114 @@ class TestRegistrationWorkflow(VolumeTestBase):
         for args in self.stage('Sarcoma'):
             self._test_workflow('mock', *args)
 
+    def test_chain_volumes(self):
+        volumes = ["/tmp/volume%03d.nii.gz" % i for i in [4, 1, 5, 2]]
+        before, after = registration._chain_volumes(volumes, 3)
+        assert_equal(before, [volumes[3], volumes[1]],
+                     "The volumes before the reference are incorrect: %s" %
+                     before)
+        assert_equal(after, [volumes[0], volumes[2]],
+                     "The volumes after the reference are incorrect: %s" %
+                     after)
+
+    def test_quick_look_summary(self):
+        workflow = registration.QuickLookWorkflow(
+            reference='/tmp/volume001.nii.gz', project=PROJECT,
+            config_dir=CONF_DIR, base_dir=self.base_dir
+        )
+        volumes = ["/tmp/volume%03d.nii.gz" % i for i in [3, 2]]
+        result = workflow._motion_summary(volumes, [2.5, 0.4])
+        assert_equal(result['displacements'], {2: 0.4, 3: 2.5},
+                     "The volume displacements are incorrect: %s" %
+                     result['displacements'])
+        assert_equal(result['score'], 2.5,
+                     "The motion score is incorrect: %s" % result['score'])
+        assert_true(result['register'],
+                    'The full registration is not recommended')
+        # A still scan does not need the full registration.
+        result = workflow._motion_summary(volumes, [0.6, 0.4])
+        assert_true(not result['register'],
+                    'The full registration is recommended for a still scan')
+
+    def test_resource_name(self):
+        for args in self.stage('Breast'):
+            project, images = args[0], args[4:]
+            reference, moving = images[0], images[1:]
+            workflow = registration.RegisterScanWorkflow(
+                reference=reference, technique='mock', project=project,
+                config_dir=CONF_DIR, base_dir=self.base_dir
+            )
+            rsc = workflow.resource_name(moving)
+            assert_true(rsc.startswith(registration.REG_PREFIX),
+                        "The resource name is incorrect: %s" % rsc)
+            # The name does not depend on the input order.
+            rerun_rsc = workflow.resource_name(list(reversed(moving)))
+            assert_equal(rerun_rsc, rsc, "The rerun resource name %s differs"
+                                         " from the original %s" %
+                                         (rerun_rsc, rsc))
+            # Different input has a different name.
+            other_rsc = workflow.resource_name(moving[:-1])
+            assert_true(other_rsc != rsc, "The resource name %s for different"
+                                          " input is not distinct" % rsc)
+
+    def test_rerun(self):
+        saved_env = os.environ.get(cache.CACHE_DIR_ENV_VAR)
+        os.environ[cache.CACHE_DIR_ENV_VAR] = os.path.join(RESULTS, 'cache')
+        try:
+            for args in self.stage('Breast'):
+                self._test_rerun(*args)
+        finally:
+            if saved_env is None:
+                del os.environ[cache.CACHE_DIR_ENV_VAR]
+            else:
+                os.environ[cache.CACHE_DIR_ENV_VAR] = saved_env
+
+    def _test_rerun(self, project, subject, session, scan, *images):
+        """
+        Verifies that a second registration of the same input reuses
+        the prior volume registrations and XNAT time series.
+
+        :param project: the input project name
+        :param subject: the input subject name
+        :param session: the input session name
+        :param scan: the input scan number
+        :param images: the input 3D NIfTI images to register
+        """
+        reference, moving = images[0], list(images[1:])
+        opts = dict(reference=reference, technique='mock', project=project,
+                    config_dir=CONF_DIR, base_dir=self.base_dir)
+        with qixnat.connect() as xnat:
+            xnat.delete(project, subject)
+            try:
+                workflow = registration.RegisterScanWorkflow(**opts)
+                time_series = workflow.run(subject, session, scan, moving)
+                # Each volume registration is cached.
+                keys = {location: workflow._volume_key(location, None)
+                        for location in moving}
+                cached = workflow._cached_volumes(keys)
+                assert_equal(set(cached), set(moving),
+                             "The cached %s %s scan %d volumes are"
+                             " incorrect: %s" %
+                             (subject, session, scan, cached.keys()))
+                # The rerun has the same resource and reuses its
+                # time series.
+                rerun = registration.RegisterScanWorkflow(**opts)
+                rerun._set_resource(rerun.resource_name(moving))
+                assert_equal(rerun.resource, workflow.resource,
+                             "The rerun resource %s differs from the"
+                             " original %s" %
+                             (rerun.resource, workflow.resource))
+                reused = rerun._download_time_series(subject, session, scan)
+                assert_is_not_none(reused, "The %s %s scan %d rerun does"
+                                           " not reuse the time series" %
+                                           (subject, session, scan))
+                assert_equal(os.path.basename(reused),
+                             os.path.basename(time_series),
+                             "The reused time series is incorrect: %s" %
+                             reused)
+            finally:
+                xnat.delete(project, subject)
+
     def _test_workflow(self, technique, project, subject, session, scan,
                        *images):
         """
@@ -97,9 +206,8 @@ class TestRegistrationWorkflow(VolumeTestBase):
         rsc_files = set(rsc.files().get())
         cfg_file = "%s.cfg" % RESOURCE
         assert_true(cfg_file in rsc_files,
-                     "The XNAT registration resource %s does not contain"
-                      " the profile %s" %
-                      (xnat_path(rsc), cfg_file)
+                    "The XNAT registration resource %s does not contain"
+                    " the profile %s" % (xnat_path(rsc), cfg_file))
         assert_equal(out_dirs, set([self.dest]),
                      "The %s %s scan %d %s registration result directory"
                       " is incorrect - expected: %s, found: %s" %
@@ -1,7 +1,7 @@
 import os
 import shutil
 from glob import glob
-from nose.tools import (assert_true, assert_is_not_none)
+from nose.tools import (assert_equal, assert_true, assert_is_not_none)
 from qipipe.pipeline import staging
 from qiutil.collections import concat
 import qixnat
@@ -32,6 +32,71 @@ class TestStagingWorkflow(object):
     def test_sarcoma(self):
         self._test_collection('Sarcoma')
 
+    def test_workflow_template(self):
+        # The second volume workflow is a copy of the first.
+        base_dirs = [os.path.join(RESULTS, "volume%03d" % i) for i in [1, 2]]
+        workflows = [staging.VolumeStagingWorkflow(project=PROJECT,
+                                                   base_dir=base_dir)
+                     for base_dir in base_dirs]
+        wf1, wf2 = [stg_wf.workflow for stg_wf in workflows]
+        assert_true(wf1 is not wf2, 'The volume workflow is not a copy')
+        assert_true(wf1.get_node('input_spec') is not
+                    wf2.get_node('input_spec'),
+                    'The volume workflow nodes are not copies')
+        assert_equal(wf1.list_node_names(), wf2.list_node_names(),
+                     'The volume workflow copy nodes differ')
+        assert_equal(wf2.base_dir, base_dirs[1],
+                     "The volume workflow copy base directory is incorrect:"
+                     " %s" % wf2.base_dir)
+
+    def test_pipelined_registration(self):
+        reg_opts = dict(technique='mock', cpu_budget=4)
+        stg_wf = staging.ScanStagingWorkflow(
+            project=PROJECT, base_dir=RESULTS, config_dir=CONF_DIR,
+            dry_run=True, registration=dict(reference=2, opts=reg_opts)
+        )
+        workflow = stg_wf.workflow
+        stage, stage_ref, collect, register, all_vols = (
+            workflow.get_node(name) for name in
+            ['stage_volume', 'stage_reference', 'collect_volumes',
+             'register_volume', 'all_volumes']
+        )
+
+        def connections(src, dest):
+            edge = workflow._graph.get_edge_data(src, dest)
+            return edge['connect'] if edge else []
+
+        # Each staged volume is registered against the staged reference.
+        assert_true(('out_file', 'in_file') in connections(stage, register),
+                    'The staged volume is not registered')
+        assert_true(('out_file', 'reference') in
+                    connections(stage_ref, register),
+                    'The staged reference is not the registration reference')
+        # The reference is merged with the other staged volumes.
+        assert_true(('out_file', 'in1') in connections(stage_ref, all_vols),
+                    'The staged reference is not collected')
+        assert_true(('volume_files', 'in2') in
+                    connections(collect, all_vols),
+                    'The staged volumes are not collected')
+
+        # The reference volume is staged separately.
+        vol_dcm_dict = {volume: ["volume%d.dcm" % volume]
+                        for volume in [1, 2, 3]}
+        stg_wf.run('Breast', 'Breast001', 'Session01', 1, vol_dcm_dict,
+                   RESULTS)
+        iterables = dict(workflow.get_node('iter_volume').iterables)
+        assert_equal(iterables['volume'], [1, 3],
+                     "The iterated volumes are incorrect: %s" %
+                     iterables['volume'])
+        assert_equal(stage_ref.inputs.volume, 2,
+                     "The reference volume is incorrect: %s" %
+                     stage_ref.inputs.volume)
+        # The CPU budget is divided among the volume registrations.
+        threads = register.inputs.opts.get('num_threads')
+        assert_true(threads and threads <= 4,
+                    "The registration thread count is incorrect: %s" %
+                    threads)
+
     def _test_collection(self, collection):
         """
         Run the staging workflow on the given collection and verify
@@ -0,0 +1,64 @@
+import os
+import shutil
+from nose.tools import (assert_equal, assert_true)
+import qixnat
+from qipipe.pipeline.workflow_base import WorkflowBase
+from ... import (ROOT, PROJECT, CONF_DIR)
+
+RESULTS = os.path.join(ROOT, 'results', 'pipeline', 'workflow_base')
+"""The test results directory."""
+
+SUBJECT = 'Breast099'
+"""The test XNAT subject."""
+
+
+class TestWorkflowBase(object):
+    """Workflow base class unit tests."""
+
+    def test_configuration(self):
+        wf1 = WorkflowBase('qipipe.pipeline.modeling', project=PROJECT,
+                           config_dir=CONF_DIR)
+        wf2 = WorkflowBase('qipipe.pipeline.modeling', project=PROJECT,
+                           config_dir=CONF_DIR)
+        assert_equal(wf1.configuration, wf2.configuration,
+                     'The cached configuration differs from the original')
+        # Each workflow has its own configuration copy.
+        wf1.configuration['R1']['base_end'] = -1
+        assert_true(wf2.configuration['R1']['base_end'] != -1,
+                    'The configuration modification is shared')
+
+    def test_restore_resource(self):
+        shutil.rmtree(RESULTS, True)
+        os.makedirs(RESULTS)
+        in_file = os.path.join(RESULTS, 'mask.nii.gz')
+        with open(in_file, 'w') as f:
+            f.write('mask')
+        wf = WorkflowBase('qipipe.pipeline.mask', project=PROJECT,
+                          config_dir=CONF_DIR)
+        with qixnat.connect() as xnat:
+            xnat.delete(PROJECT, SUBJECT)
+            try:
+                # The missing resource is restored.
+                uploaded = wf._restore_resource(SUBJECT, 'Session01', 1,
+                                                'mask', [in_file])
+                assert_equal(uploaded, [in_file],
+                             "The missing file was not uploaded: %s" %
+                             uploaded)
+                rsc = xnat.find_one(PROJECT, SUBJECT, 'Session01', scan=1,
+                                    resource='mask')
+                assert_true(rsc and 'mask.nii.gz' in rsc.files().get(),
+                            'The XNAT resource was not restored')
+                # An existing resource file is not uploaded again.
+                uploaded = wf._restore_resource(SUBJECT, 'Session01', 1,
+                                                'mask', [in_file])
+                assert_equal(uploaded, [],
+                             "The existing file was uploaded: %s" % uploaded)
+            finally:
+                xnat.delete(PROJECT, SUBJECT)
+                shutil.rmtree(RESULTS, True)
+
+
+if __name__ == "__main__":
+    import nose
+
+    nose.main(defaultTest=__name__)